@@ -0,0 +1,186 @@
+from typing import TextIO, List, Tuple, Dict, Set, Optional, Container
+from collections import namedtuple
+import os
+import math
+import datetime
+
+from FanzineIssueSpecPackage import FanzineIssueInfo, FanzineCounts
+from HelpersPackage import InterpretNumber
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# Streaming consumers of fanzine issues.
+# Each one is fed issues one at a time (via Add()) as they come in from the crawl, so none of them needs the complete
+#   issue list or any particular ordering of it.  Those whose results depend on the order sort what they need when they finish.
+
+def NoNone(s: str) -> str:
+    if s is None:
+        return ""
+    return s
+
+
+# ====================================================================================
+# The reports list the issues in series-name order, not in the order the crawl happens to deliver them (which, for a
+#   budgeted crawl, changes from run to run), so their rows are collected and sorted once, when the report is written.
+# Within a series name, the issues are in order of directory URL and then page name, as they always have been.
+def ReportOrder(fz: FanzineIssueInfo) -> Tuple[str, str, str]:
+    return NoNone(fz.SeriesName).lower(), NoNone(fz.DirURL), NoNone(fz.PageName)
+
+
+# ====================================================================================
+# Write the "<year> fanac.org Fanzines.txt" dumps for the years listed in control-year.txt
+class YearDump:
+    def __init__(self, reportDir: str, years: Optional[List[str]]):
+        self._filenames: Dict[int, str]={}
+        self._rows: Dict[int, List[Tuple[Tuple[str, str, str], str]]]={}
+        self._order: List[int]=[]
+        if years is None:
+            return
+        for year in years:      # For each year in the list of years to be dumped
+            filename=os.path.join(reportDir, year+" fanac.org Fanzines.txt")
+            year=InterpretNumber(year)
+            self._filenames[year]=filename
+            self._rows[year]=[]
+            self._order.append(year)
+
+    def Add(self, fz: FanzineIssueInfo) -> None:
+        rows=self._rows.get(fz.FIS.Year)
+        if rows is not None:
+            rows.append((ReportOrder(fz), "|| "+NoNone(fz.IssueName)+" || "+NoNone(str(fz.FIS))+" || " + NoNone(fz.DirURL) +" || " + NoNone(fz.PageName) + " ||\n"))
+
+    # Write the files and return a list of tuples (selected year, count)
+    def Close(self) -> List[Tuple[int, int]]:
+        for year, filename in self._filenames.items():
+            rows=self._rows[year]
+            rows.sort(key=lambda r: r[0])
+            with OpenOutput(filename) as file:
+                for key, line in rows:
+                    file.write(line)
+        return [(year, len(self._rows[year])) for year in self._order]
+
+
+# ====================================================================================
+# Count the number of pages, issues and PDFs and also generate a report listing all fanzines for which a page count can't be located
+class IssueTally:
+    def __init__(self, noPageCountFilename: str, ignorePageCountErrors: Optional[Container[str]]):
+        self.IssueCount=0
+        self.PdfIssueCount=0
+        self.PageCount=0
+        self.PdfPageCount=0
+        self._ignore=ignorePageCountErrors
+        self._filename=noPageCountFilename
+        self._noPageCount: List[Tuple[Tuple[str, str, str], str]]=[]
+
+    def Add(self, fz: FanzineIssueInfo) -> None:
+        if fz.DirURL is not None:
+            self.IssueCount+=1
+            self.PageCount+=fz.Pagecount
+            if os.path.splitext(fz.PageName)[1].lower() == ".pdf":
+                self.PdfIssueCount+=1
+                self.PdfPageCount+=fz.Pagecount
+            if fz.Pagecount == 0 and self._ignore is not None and fz.SeriesName not in self._ignore:
+                self._noPageCount.append((ReportOrder(fz), str(fz)+"\n"))
+
+    def Close(self) -> None:
+        self._noPageCount.sort(key=lambda r: r[0])
+        with OpenOutput(self._filename) as f:
+            for key, line in self._noPageCount:
+                f.write(line)
+
+
+# ====================================================================================
+# Collapse the issues into a fanzine series list for each country
+# The result is a dictionary keyed by country code with the value being a tuple of ([FSI], FanzineCounts for country)
+# Which directory's copy of a series is counted depends on which issue is seen first, so the issues are held until
+#   Finish() and then taken in ReportOrder(), whatever order the crawl delivered them in.
+Country=namedtuple('Country', 'SeriesList SeriesCount')
+
+class CountryAggregator:
+    def __init__(self):
+        self.ByCountry: Dict[str, Country]={}     # Key is country code; value is a tuple of ([FSI], FanzineCounts for country])
+        self._issues: List[FanzineIssueInfo]=[]
+
+    def Add(self, issue: FanzineIssueInfo) -> None:
+        self._issues.append(issue)
+
+    def _Aggregate(self, issue: FanzineIssueInfo) -> None:
+        # If this is a new country, create a new, empty entry for it
+        countryName=issue.Country.lower().strip()
+        if countryName == "":
+            countryName="us"     # Joe wants fanzines with no country to be treated as US
+        self.ByCountry.setdefault(countryName, Country([], FanzineCounts()))  # If needed, add an empty country entry
+
+        serieslist=self.ByCountry[countryName].SeriesList
+        # serieslist is the list of fanzine series with counts for this country
+        # Note that we accumulate the series page and issue totals
+
+        # Is this new issue from a series that is already in the list for this country?
+        found=False
+        for i in range(len(serieslist)):
+            if issue.Series == serieslist[i]:
+                # Yes: If the directories in the DirURLs match, just add this issue to the existing series totals.
+                # If they don't match, just skip it because it's probably one of the doubly-referred-to entries and will be picked up in some other series.
+                if issue.Series.DirURL == serieslist[i].DirURL:
+                    # serieslist[loc] is a specific series in [country]
+                    # Update the series by adding the pagecount of this issue to it
+                    serieslist[i]+=issue.Pagecount
+                    self.ByCountry[countryName]=Country(self.ByCountry[countryName].SeriesList, self.ByCountry[countryName].SeriesCount+issue.Pagecount)
+                    found=True
+                break
+        # No: Add a new series entry created from this issue
+        if not found:
+            issue.Series+=issue.Pagecount
+            serieslist.append(issue.Series)
+            count=self.ByCountry[countryName].SeriesCount+issue.Pagecount
+            count.Titlecount+=1
+            self.ByCountry[countryName]=Country(self.ByCountry[countryName].SeriesList, count)
+
+    # Aggregate the issues, sort the individual country lists into order by series name and return the dictionary
+    def Finish(self) -> Dict[str, Country]:
+        self._issues.sort(key=ReportOrder)
+        for issue in self._issues:
+            self._Aggregate(issue)
+        self._issues=[]
+        for ckey, cval in self.ByCountry.items():
+            serieslist=cval[0]
+            serieslist.sort(key=lambda elem: elem.SeriesName.lower())
+            self.ByCountry[ckey]=Country(serieslist, cval[1])  # Sorts in place on fanzine name
+        return self.ByCountry
+
+
+# ====================================================================================
+# Compute counts of issues and series by decade.
+# We get the issue numbers by simply going through the list and adding one to the appropriate decade.
+# For series, we create a set of series found for that decade
+class DecadeCounter:
+    def __init__(self):
+        # issueDecadeCount and seriesDecadeCount are  dictionaries keyed by decade: 190, 191, ...199, 200...
+        # For issueDecadeCount, the value is a count for that decade
+        # For seriesDecadeCount, the value is a set of series names which we will count in the end.
+        self.issueDecadeCount: Dict[int, int]={}
+        self.seriesDecadeCount: Dict[int, Set[str]]={}
+
+    def Add(self, issue: FanzineIssueInfo) -> None:
+        year=0
+        if issue.FIS is not None and issue.FIS.Year is not None:
+            year=issue.FIS.Year
+        decade=math.floor(year/10)
+
+        self.issueDecadeCount.setdefault(decade, 0)
+        self.seriesDecadeCount.setdefault(decade, set())
+
+        self.issueDecadeCount[decade]+=1
+        self.seriesDecadeCount[decade].add(issue.SeriesName)
+
+    # Print the report
+    def Write(self, filename: str) -> None:
+        with OpenOutput(filename) as f:
+            f.write(str(datetime.date.today())+"\n")
+            f.write("Counts of fanzines and fanzine series by decade\n\n")
+            f.write(" Decade  Series  Issues\n")
+            decades=sorted([x for x in self.issueDecadeCount.keys()])
+            for decade in decades:
+                if decade == 0:
+                    print("undated   {:5}   {:5}".format(len(self.seriesDecadeCount[decade]), self.issueDecadeCount[decade]), file=f)
+                else:
+                    print("  {:3}0s   {:5}   {:5}".format(decade, len(self.seriesDecadeCount[decade]), self.issueDecadeCount[decade]), file=f)
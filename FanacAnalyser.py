@@ -4,16 +4,34 @@ import requests
 import os
 import sys
 import re
-import math
-import datetime
+import argparse
+import json
+import html
 from bs4 import BeautifulSoup
 import unidecode
-from collections import namedtuple
 
 import FanacOrgReaders
+import FanacSnapshot
+import FanacChangeFeed
+import FanacCatalog
+import FanacLinkChecker
+import FanacPdfPages
+import FanacDuplicateSeries
+import FanacControl
+import FanacExport
+import FanacSearchIndex
+import FanacSeriesPages
+from FanacLayoutProfiles import LayoutProfiles
+from FanacCheckpoint import CrawlJournal
+from FanacScheduler import CrawlSchedule
+from FanacOutput import WritePrecompressed, RemovePrecompressed, OpenOutput, LogOutputSummary
+from FanacMemoryProfile import MemoryProfiler
+from FanacEditors import EditorIndex, EditorRow, EditorSortKey
+from FanacRecords import KeysOf
+from FanacAggregators import NoNone, YearDump, IssueTally, CountryAggregator, DecadeCounter
 from FanzineIssueSpecPackage import FanzineIssueInfo, FanzineCounts
 from Log import Log, LogOpen, LogClose, LogFlush, LogFailureAndRaiseIfMissing
-from HelpersPackage import ReadList, FormatLink, InterpretNumber, UnicodeToHtml, RemoveArticles, RemoveAccents, RemoveAllHTMLTags2
+from HelpersPackage import FormatLink, UnicodeToHtml, RemoveArticles, RemoveAccents, RemoveAllHTMLTags2
 
 LogOpen("Log - Fanac Analyzer Detailed Analysis Log.txt", "Log - Fanac Analyzer Error Log.txt")
 
@@ -29,8 +47,7 @@ def ReadAllFanacFanzineMainPages() -> List[Tuple[str, str]]:
     # This is a list of fanzines on Fanac.org
     # Each item is a tuple of (compressed name,  link name,  link url)
     fanacFanzineDirectoriesList: List[Tuple[str, str]]=[]
-    directories=ReadList("control-topleveldirectories.txt")
-    for dirs in directories:
+    for dirs in FanacControl.Control().TopLevelDirectories:
         ReadModernOrClassicTable(fanacFanzineDirectoriesList, dirs)
 
     Log("----Done reading Classic and Modern tables")
@@ -40,7 +57,7 @@ def ReadAllFanacFanzineMainPages() -> List[Tuple[str, str]]:
 # ======================================================================
 # Read one of the main fanzine directory listings and append all the fanzines directories found to the dictionary
 def ReadModernOrClassicTable(fanacFanzineDirectoriesList: List[Tuple[str, str]], url: str) -> None:
-    h=requests.get(url)
+    h=requests.get(FanacOrgReaders.SiteURL(url))
     s=BeautifulSoup(h.content, "html.parser")
     # We look for the first table that does not contain a "navbar"
     tables=s.find_all("table")
@@ -78,6 +95,13 @@ def ReadFile(filename: str) -> Optional[List[str]]:
 #   fRowHeaderText and fRowBodyText are functions which pull information out of a fanzineIssue from fanzineIssueList
 #   fRowHeaderText is the item used to decide when to start a new subsection
 #   fRowBodyText is what is listed in the subsection
+#   fButtonLink turns a button's text into the link the button points to. (If None, it's an anchor within the page.)
+#   buttonList overrides the list of buttons which would otherwise be gathered from the selected fanzines
+#   If shardByButton is True, the HTML table is split into one page per button (e.g., per decade or per letter).  The page
+#       named filename then holds just the header and the button bar, which links across the shard pages.
+#   If precompress is True, each HTML page written also gets .gz and .br siblings
+#   If jsonFeed is True, the HTML table is replaced by a compact JSON feed of the same rows (written next to the page as
+#       <name>.json) which listing.js renders into the same layout in the browser
 def WriteTable(filename: str,
                fanacIssueList: List,  # The sorted input list
                fRowBodyText: Callable[[Any], str],  # Function to supply the row's body text
@@ -90,18 +114,55 @@ def WriteTable(filename: str,
                countText: Optional[str]=None,
                headerFilename: Optional[str]=None,
                fSelector: Optional[Callable[[Any], bool]]=None,
-               inAlphaOrder: bool=False)\
+               inAlphaOrder: bool=False,
+               fButtonLink: Optional[Callable[[str], str]]=None,
+               buttonList: Optional[List[str]]=None,
+               shardByButton: bool=False,
+               precompress: bool=False,
+               jsonFeed: bool=False,
+               removeStale: bool=True)\
                 -> None:
-    f: TextIO=open(filename, "w+")
-
-    #....... Header .......
     # Filename can end in ".html" or ".txt" and we output html or plain text accordingly
     html=os.path.splitext(filename)[1].lower() == ".html"
+
+    #....... Shards .......
+    # When sharding, write one complete page per button, each with the full button bar linking across the shards.
+    # Then fall through to write the top page, which has everything but the table itself.
+    if html and shardByButton and fButtonText is not None:
+        # Split the list into shards in a single pass; each shard keeps the order of the input list
+        shardLists: Dict[str, List]={}
+        for fz in fanacIssueList:
+            if fSelector is not None and not fSelector(fz):
+                continue
+            if fButtonText(fz) is not None:
+                shardLists.setdefault(fButtonText(fz), []).append(fz)
+        shards=sorted(shardLists.keys())
+        for shard in shards:
+            WriteTable(ShardFilename(filename, shard), shardLists[shard], fRowBodyText,
+                       fButtonText=fButtonText, fRowHeaderText=fRowHeaderText, fURL=fURL, fDirURL=fDirURL, fRowAnnot=fRowAnnot, fHeaderAnnot=fHeaderAnnot,
+                       countText=countText, headerFilename=headerFilename,
+                       inAlphaOrder=inAlphaOrder,
+                       fButtonLink=lambda b: os.path.basename(ShardFilename(filename, b))+"#"+b,
+                       buttonList=shards,
+                       precompress=precompress,
+                       jsonFeed=jsonFeed,
+                       removeStale=False)
+        RemoveStaleShards(filename, [ShardFilename(filename, shard) for shard in shards])
+        fButtonLink=lambda b: os.path.basename(ShardFilename(filename, b))+"#"+b
+        buttonList=shards
+        fanacIssueList=[]
+    elif html and removeStale:      # removeStale is False when this is itself a shard page
+        RemoveStaleShards(filename, [])     # Not sharded this time, so any shard pages are left over from an earlier run
+
+    f: TextIO=OpenOutput(filename)
+
+    #....... Header .......
     if html:
         # When we're generating HTML output, we need to include a header.
         # It will be a combination of the contents of "control-Header (basic).html" with headerInfoFilename
         basicHeadertext=ReadFile("control-Header (basic).html")
         if basicHeadertext is None:
+            f.close()
             return
 
         # Read the specialized control.html file for this type of report
@@ -133,21 +194,12 @@ def WriteTable(filename: str,
     # If it's alpha, the buttons are by 1st letter; if date it's by decade
     # First, we determine the potential button names.  There are two choices: Letters of the alphabet or decades
     if html:
-        headers=set()
-        for fz in fanacIssueList:
-            if fSelector is not None and not fSelector(fz):
-                continue
-            if fButtonText is not None:
-                if fButtonText(fz) is not None:
-                    headers.add(fButtonText(fz))
-
-        headerlist=list(headers)
-        headerlist.sort()
+        headerlist=buttonList if buttonList is not None else ButtonList(fanacIssueList, fButtonText, fSelector)
         buttonlist=""
         for item in headerlist:
             if len(buttonlist) > 0:
                 buttonlist=buttonlist+" &mdash; "
-            buttonlist+=FormatLink("#"+ item, item)
+            buttonlist+=FormatLink(fButtonLink(item) if fButtonLink is not None else "#"+ item, item)
 
         # Write out the button bar
         f.write(buttonlist+"<p><p>\n")
@@ -166,6 +218,27 @@ def WriteTable(filename: str,
     if html:
         f.write('<div>\n')  # Begin the main table
 
+    # In JSON feed mode, the rows go into the feed and the page gets a placeholder which the renderer fills in.
+    # Then fall through with nothing left to write into the page itself.
+    # Otherwise, a feed left over from an earlier run is deleted.
+    feedFilename=os.path.splitext(filename)[0]+".json"
+    inFeed=html and jsonFeed and len(fanacIssueList) > 0
+    if inFeed:
+        feedChanged=WriteListingFeed(feedFilename, fanacIssueList, fRowBodyText, fButtonText=fButtonText, fRowHeaderText=fRowHeaderText,
+                                     fURL=fURL, fDirURL=fDirURL, fRowAnnot=fRowAnnot, fHeaderAnnot=fHeaderAnnot, fSelector=fSelector,
+                                     inAlphaOrder=inAlphaOrder)
+        if precompress and (feedChanged or not os.path.exists(feedFilename+".gz")):
+            WritePrecompressed(feedFilename)
+        elif not precompress:
+            RemovePrecompressed(feedFilename)
+        WriteListingRenderer(os.path.join(os.path.dirname(filename), "listing.js"))
+        f.write('<div id="fanac-listing" data-feed="'+os.path.basename(feedFilename)+'"></div>\n<script src="listing.js"></script>\n')
+        fanacIssueList=[]
+    elif html and os.path.exists(feedFilename):
+        os.remove(feedFilename)
+        RemovePrecompressed(feedFilename)
+        Log("WriteTable: removed "+feedFilename)
+
     lastRowHeader=None
     lastButtonLinkString=None
     for fz in fanacIssueList:
@@ -237,10 +310,156 @@ def WriteTable(filename: str,
     #....... Cleanup .......
     # And end everything
     if html:
-        f.write('</div>\n</div>\n')
+        # The rows end with the last sub-box still open; in feed mode there are no rows, just the main table around the placeholder
+        f.write('</div>\n' if inFeed else '</div>\n</div>\n')
         f.writelines(ReadFile("control-Default.Footer"))
     f.close()
 
+    # Only recompress when the page has changed (or the compressed versions are missing)
+    if html and precompress and (f.Changed or not os.path.exists(filename+".gz")):
+        WritePrecompressed(filename)
+    elif html and not precompress:
+        RemovePrecompressed(filename)
+
+
+#================================================================================
+# Write the rows of a listing as a compact JSON feed.  Returns True if the feed file changed.
+# The feed is
+#   {"dirs": [URL prefixes],
+#    "groups": [[anchor or null, header HTML or null, header link or null, header annotation HTML, rows], ...]}
+# where each row is [index into dirs, rest of the URL, link HTML, HTML following the link, annotation HTML], with empty
+#   trailing fields left off.  The full URLs share a few thousand directory prefixes, so they are stored once in dirs.
+def WriteListingFeed(filename: str, fanacIssueList: List, fRowBodyText: Callable[[Any], str],
+                     fButtonText: Optional[Callable[[Any], str]]=None, fRowHeaderText: Optional[Callable[[Any], str]]=None,
+                     fURL: Optional[Callable[[Any], str]]=None, fDirURL: Optional[Callable[[Any], str]]=None,
+                     fRowAnnot: Optional[Callable[[Any], str]]=None, fHeaderAnnot: Optional[Callable[[Any], str]]=None,
+                     fSelector: Optional[Callable[[Any], bool]]=None, inAlphaOrder: bool=False) -> bool:
+    dirs: List[str]=[]
+    dirIndex: Dict[str, int]={}
+    groups: List[List]=[]
+    rows: Optional[List]=None
+    lastRowHeader=None
+    lastButtonLinkString=None
+    for fz in fanacIssueList:
+        if fSelector is not None and not fSelector(fz):
+            continue
+        url=fURL(fz) if fURL is not None else None
+        if fURL is not None and url is None:
+            continue
+
+        # Start a new group when the row header changes (or at the start, if there are no row headers)
+        if rows is None or (fRowHeaderText is not None and lastRowHeader != fRowHeaderText(fz)):
+            anchor=None
+            header=None
+            headerLink=None
+            headerAnnot=""
+            if fRowHeaderText is not None:
+                lastRowHeader=fRowHeaderText(fz)
+                buttonLinkString=fButtonText(fz) if fButtonText is not None and fButtonText(fz) is not None else ""
+                if buttonLinkString != lastButtonLinkString:
+                    anchor=UnicodeToHtml(buttonLinkString)
+                    lastButtonLinkString=buttonLinkString
+                header=UnicodeToHtml(lastRowHeader)
+                if inAlphaOrder and fDirURL is not None:
+                    headerLink=fDirURL(fz)
+                if fHeaderAnnot is not None and fHeaderAnnot(fz) is not None:
+                    headerAnnot=fHeaderAnnot(fz)
+            rows=[]
+            groups.append([anchor, header, headerLink, headerAnnot, rows])
+
+        # The row: its URL split into a shared directory prefix and the rest, then the link text and what follows it
+        if url is None:
+            url=""
+        prefix, rest=url.rsplit("/", 1) if "/" in url else ("", url)
+        prefix+="/" if "/" in url else ""
+        if prefix not in dirIndex:
+            dirIndex[prefix]=len(dirs)
+            dirs.append(prefix)
+        splitext=fRowBodyText(fz).split("|", 2)
+        row=[dirIndex[prefix], rest, splitext[0], splitext[1] if len(splitext) == 2 else "",
+             fRowAnnot(fz) if inAlphaOrder and fRowAnnot is not None and fRowAnnot(fz) is not None else ""]
+        while len(row) > 3 and row[-1] == "":
+            del row[-1]
+        rows.append(row)
+
+    with OpenOutput(filename) as f:
+        json.dump({"dirs": dirs, "groups": groups}, f, separators=(",", ":"))
+    return f.Changed
+
+
+# The renderer for the JSON feeds.  It builds the same markup WriteTable would have put in the page.
+listingRenderer="""// Renders a fanac.org listing from its JSON feed (see WriteListingFeed() in FanacAnalyser.py)
+(function() {
+    var el=document.getElementById("fanac-listing");
+    if (!el) return;
+    function attr(s) { return String(s).replace(/&/g, "&amp;").replace(/"/g, "&quot;"); }
+    fetch(el.getAttribute("data-feed")).then(function(r) { return r.json(); }).then(function(d) {
+        var out=[];
+        d.groups.forEach(function(g) {
+            if (g[0] !== null) out.push('<a name="'+attr(g[0])+'"></a>');
+            if (g[1] !== null) {
+                out.push('<div class="row border">\\n  <div class=col-md-3>'+(g[2] ? '<a href="'+attr(g[2])+'">'+g[1]+'</a>' : g[1])+
+                         (g[3] ? '&nbsp;&nbsp;&nbsp;&nbsp;'+g[3] : '')+'</div>\\n    <div class=col-md-9>\\n');
+            }
+            g[4].forEach(function(r) {
+                out.push('        <a href="'+attr(d.dirs[r[0]]+r[1])+'">'+r[2]+'</a>'+(r[3] || '')+(r[4] ? '&nbsp;&nbsp;&nbsp;&nbsp;'+r[4] : '')+'<br>\\n');
+            });
+            if (g[1] !== null) out.push('    </div></div>\\n');
+        });
+        el.innerHTML=out.join("");
+        if (location.hash.length > 1) {
+            var target=document.getElementsByName(decodeURIComponent(location.hash.substring(1)))[0];
+            if (target) target.scrollIntoView();
+        }
+    });
+})();
+"""
+
+def WriteListingRenderer(filename: str) -> None:
+    with OpenOutput(filename) as f:
+        f.write(listingRenderer)
+
+
+#================================================================================
+# Return the sorted list of the distinct button texts of the selected fanzines
+def ButtonList(fanacIssueList: List, fButtonText: Optional[Callable[[Any], str]], fSelector: Optional[Callable[[Any], bool]]) -> List[str]:
+    headers=set()
+    if fButtonText is None:
+        return []
+    for fz in fanacIssueList:
+        if fSelector is not None and not fSelector(fz):
+            continue
+        if fButtonText(fz) is not None:
+            headers.add(fButtonText(fz))
+    return sorted(list(headers))
+
+
+# Generate the filename of a shard of a listing from the listing's filename and the shard's button text
+# E.g., Chronological_Listing_of_Fanzines.html + "1950s" --> Chronological_Listing_of_Fanzines_1950s.html
+def ShardFilename(filename: str, button: str) -> str:
+    root, ext=os.path.splitext(filename)
+    suffix="".join([c if c.isalnum() else "_" for c in unidecode.unidecode(button)]).strip("_")
+    if len(suffix) == 0:
+        suffix="Other"     # E.g., the " " button for undated issues or "*" for titles starting with a digit
+    return root+"_"+suffix+ext
+
+
+# Delete the shard pages of a listing (and their feeds and compressed versions) which weren't written this time, e.g.,
+#   the page for a decade or letter which no longer has any issues
+def RemoveStaleShards(filename: str, shardFilenames: List[str]) -> None:
+    directory=os.path.dirname(filename) or "."
+    root, ext=os.path.splitext(os.path.basename(filename))
+    shardPattern=re.compile(re.escape(root)+r"_[A-Za-z0-9_]+(?:"+re.escape(ext)+r"|\.json)(?:\.gz|\.br)?")
+    wanted=set()
+    for name in shardFilenames:
+        shardRoot=os.path.splitext(os.path.basename(name))[0]
+        for suffix in (ext, ".json"):
+            wanted.update([shardRoot+suffix, shardRoot+suffix+".gz", shardRoot+suffix+".br"])
+    for name in os.listdir(directory):
+        if shardPattern.fullmatch(name) is not None and name not in wanted:
+            os.remove(os.path.join(directory, name))
+            Log("RemoveStaleShards: removed "+name)
+
 
 # -------------------------------------------------------------------------
 # We have a name and a dirname from the fanac.org Classic and Modern pages.
@@ -270,9 +489,29 @@ Log("Started")
 LogFlush()
 
 # Read the command line arguments
-outputDir="."
-if len(sys.argv) > 1:
-    outputDir=sys.argv[1]
+parser=argparse.ArgumentParser()
+parser.add_argument("outputDir", nargs="?", default=".")
+parser.add_argument("--snapshot", default=None, help="Snapshot file of the crawl results (default: <outputDir>/Fanac crawl.snapshot)")
+parser.add_argument("--reportonly", action="store_true", help="Don't crawl fanac.org; regenerate the outputs from the snapshot")
+parser.add_argument("--shard", action="store_true", help="Split the big chronological and alphabetical HTML listings into a page per decade or letter")
+parser.add_argument("--precompress", action="store_true", help="Write .gz and .br versions of the big HTML listings")
+parser.add_argument("--checklinks", action="store_true", help="Check that every issue's URL resolves and report the broken ones")
+parser.add_argument("--pdfpages", action="store_true", help="Read the page counts of PDF issues with no page count from the PDFs themselves")
+parser.add_argument("--resume", action="store_true", help="Resume an interrupted crawl from its checkpoint journal")
+parser.add_argument("--budget", type=float, default=None, help="Crawl for at most this many minutes, most important series first, and fill in the rest from the snapshot")
+parser.add_argument("--catalog", default=None, help="SQLite catalog file to be written with the issues and series")
+parser.add_argument("--fromcatalog", action="store_true", help="Don't crawl fanac.org; regenerate the outputs from the --catalog file")
+parser.add_argument("--export", action="store_true", help="Export the issues and series as Parquet (or CSV, if pyarrow isn't installed) for analysis tools")
+parser.add_argument("--maxpagekb", type=int, default=8192, help="Skip any page bigger than this many KB rather than parsing it")
+parser.add_argument("--memprofile", action="store_true", help="Profile memory use by phase (slow) and write a report of it")
+parser.add_argument("--jsonfeed", action="store_true", help="Write the big chronological and alphabetical listings as compact JSON feeds rendered in the browser")
+parser.add_argument("--site", default=None, help="Crawl this stand-in server (e.g., http://127.0.0.1:8000) instead of www.fanac.org")
+args=parser.parse_args()
+FanacOrgReaders.SetSiteOverride(args.site)
+FanacOrgReaders.SetMaxPageBytes(args.maxpagekb*1024)
+memoryProfiler=MemoryProfiler(args.memprofile)
+
+outputDir=args.outputDir
 if not os.path.isdir(outputDir):
     os.mkdir(outputDir)
 
@@ -290,64 +529,121 @@ if not os.path.isdir(reportDir):
 Log("Report directory '"+reportDir+"' created")
 LogFlush()
 
-# Read the fanac.org fanzine index page structures and produce a list of all fanzines series directories
-fanacFanzineDirectories=ReadAllFanacFanzineMainPages()
-
-# Read the directories list and produce a list of all fanzine issues
-fanacIssueList=FanacOrgReaders.ReadFanacFanzineIssues(fanacFanzineDirectories)
-
-# Remove issues which have entries, but don't actually point to anything.
-fanacIssueList=[x for x in fanacIssueList if x.PageName is not None]
-
-# Sort the list of all fanzines issues by fanzine series name
-fanacIssueList.sort(key=lambda elem: elem.SeriesName.lower())  # Sorts in place on fanzine name
-
-def NoNone(s: str) -> str:
-    if s is None:
-        return ""
-    return s
-
+# Parse all the control files, once
+control=FanacControl.Control()
 
+snapshotFilename=args.snapshot if args.snapshot is not None else os.path.join(outputDir, "Fanac crawl.snapshot")
+if args.fromcatalog:
+    # Draw the rows for all the reports from the SQLite catalog
+    if args.catalog is None or not os.path.exists(args.catalog):
+        Log("***Fatal Error: --fromcatalog was specified, but there is no --catalog file", isError=True)
+        exit(1)
+    catalog=FanacCatalog.OpenCatalog(args.catalog)
+    issueSource=[FanacCatalog.ReadCatalog(catalog)]
+    catalog.close()
+elif args.reportonly:
+    # Skip the crawl entirely and regenerate everything from the last crawl's snapshot
+    if not os.path.exists(snapshotFilename):
+        Log("***Fatal Error: --reportonly was specified, but snapshot file "+snapshotFilename+" does not exist", isError=True)
+        exit(1)
+    issueSource=[FanacSnapshot.ReadSnapshot(snapshotFilename)]
+else:
+    # Read the fanac.org fanzine index page structures and produce a list of all fanzines series directories
+    fanacFanzineDirectories=ReadAllFanacFanzineMainPages()
+    memoryProfiler.Phase("Directory discovery")
+
+    # Try each directory's layout from the last run first
+    layoutProfiles=LayoutProfiles(os.path.join(outputDir, "Layout profiles.json"))
+    FanacOrgReaders.SetLayoutProfiles(layoutProfiles)
+
+    # Read the directories list: this yields the fanzine issues series-by-series as the pages are read
+    # Each directory's results are checkpointed as they are read, so an interrupted crawl can be resumed
+    journal=CrawlJournal(os.path.join(outputDir, "Crawl checkpoint.jsonl"), resume=args.resume)
+    # The crawl history gives the priorities for a time-budgeted crawl
+    schedule=CrawlSchedule(os.path.join(outputDir, "Crawl history.json"),
+                           budgetSeconds=args.budget*60 if args.budget is not None else None,
+                           snapshotFilename=snapshotFilename)
+    issueSource=FanacOrgReaders.ReadFanacFanzineIssuesStreaming(fanacFanzineDirectories, journal, schedule)
+
+# The streaming consumers are fed each series' issues as soon as they arrive.
+# Only the listings which depend on the sort order of the complete list need to wait for the crawl to finish.
 # Read the control-year.txt file to get the year to be dumped out
-selectedYears: List[Tuple[int, int]]=[]
-if os.path.exists("control-year.txt"):
-    years=ReadList("control-year.txt")
-    for year in years:      # For each year in the list of years to be dumped
-        file=open(os.path.join(reportDir, year+" fanac.org Fanzines.txt"), "w+")
-        year=InterpretNumber(year)
-        yearCount=0
-        for fz in fanacIssueList:
-            if fz.FIS.Year == year:
-                file.write("|| "+NoNone(fz.IssueName)+" || "+NoNone(str(fz.FIS))+" || " + NoNone(fz.DirURL) +" || " + NoNone(fz.PageName) + " ||\n")
-                yearCount+=1
-        file.close()
-        selectedYears.append((year, yearCount)) # Create a list of tuples (selected year, count)
-
+yearDump=YearDump(reportDir, control.Years.Entries if control.Years.Exists else None)
 
 # Count the number of pages, issues and PDFs and also generate a report listing all fanzines for which a page count can't be located
-issueCount=0
-pdfIssueCount=0
-pageCount=0
-pdfPageCount=0
-f=open(os.path.join(reportDir, "Items with No Page Count.txt"), "w+")
-ignorePageCountErrors=ReadList("control-Ignore Page Count Errors.txt")
+tally=IssueTally(os.path.join(reportDir, "Items with No Page Count.txt"),
+                 control.IgnorePageCountErrors if control.IgnorePageCountErrors.Exists else None)
+countries=CountryAggregator()
+decades=DecadeCounter()
+editors=EditorIndex()
 
-for fz in fanacIssueList:
-    if fz.DirURL is not None:
-        issueCount+=1
-        pageCount+=fz.Pagecount
-        if os.path.splitext(fz.PageName)[1].lower() == ".pdf":
-            pdfIssueCount+=1
-            pdfPageCount+=fz.Pagecount
-        if fz.Pagecount == 0 and ignorePageCountErrors is not None and fz.SeriesName not in ignorePageCountErrors:
-            f.write(str(fz)+"\n")
-f.close()
+pdfPageCounter=None
+if args.pdfpages:
+    pdfPageCounter=FanacPdfPages.PdfPageCounter(cacheFilename=os.path.join(outputDir, "PDF page count cache.json"))
+
+# Remove issues which have entries, but don't actually point to anything.
+issueSource=([x for x in issues if x.PageName is not None] for issues in issueSource)
+# Fill in missing PDF page counts before anything gets counted
+if pdfPageCounter is not None:
+    issueSource=FanacPdfPages.RecoverPdfPageCountsStreaming(issueSource, lambda fz: FanacOrgReaders.SiteURL(KeysOf(fz).ResolvedURL) if KeysOf(fz).ResolvedURL is not None else None,
+                                                            pdfPageCounter)
+
+fanacIssueList: List[FanzineIssueInfo]=[]
+for issues in issueSource:
+    for fz in issues:
+        yearDump.Add(fz)
+        tally.Add(fz)
+        countries.Add(fz)
+        decades.Add(fz)
+        editors.Add(fz)
+    fanacIssueList.extend(issues)
+
+memoryProfiler.Phase("Crawl, dedupe and streaming counts")
+
+selectedYears=yearDump.Close()
+tally.Close()
+issueCount=tally.IssueCount
+pdfIssueCount=tally.PdfIssueCount
+pageCount=tally.PageCount
+pdfPageCount=tally.PdfPageCount
+
+if not args.fromcatalog and not args.reportonly:
+    # List the duplicates which were dropped during the crawl
+    with OpenOutput(os.path.join(reportDir, "Duplicate issues dropped.txt")) as f:
+        for dropped, kept in FanacOrgReaders.droppedDuplicates:
+            note=""
+            if dropped.SeriesName != kept.SeriesName:
+                note="    [cross-directory: kept under '"+kept.SeriesName+"']"
+            f.write(dropped.SeriesName+": "+str(dropped.IssueName)+"  ("+NoNone(dropped.DirURL)+"  "+NoNone(dropped.PageName)+")"+note+"\n")
+
+    layoutProfiles.Save()
+    schedule.Save()
+    schedule.WriteStaleReport(os.path.join(reportDir, "Stale series.txt"))     # Written every run, so an unbudgeted run replaces the last budgeted run's list with an empty one
+    layoutProfiles.WriteChangesReport(os.path.join(reportDir, "Directories with changed layout.txt"))
+    FanacOrgReaders.parseStats.WriteReport(os.path.join(reportDir, "Parse paths.txt"))
+
+    # Record what changed since the last run, and then save the results so that later runs can regenerate the outputs without re-crawling
+    FanacChangeFeed.WriteChangeFeed(os.path.join(reportDir, "Change feed.json"), snapshotFilename, fanacIssueList)
+    FanacSnapshot.WriteSnapshot(snapshotFilename, fanacIssueList)
+
+    if args.catalog is not None:
+        FanacCatalog.WriteCatalog(args.catalog, fanacIssueList)
+
+memoryProfiler.Phase("Crawl reports and saving the snapshot")
+
+# Export the issues and series in a form analysis tools can load directly
+if args.export:
+    FanacExport.ExportIssues(os.path.join(outputDir, "Fanac"), fanacIssueList)
+
+# Build the ordered views of the issues once, using the sort keys which were computed for each issue when it was created (see StampIssue())
+#   dateOrdered: by date, then issue name, then series name
+#   alphaOrdered: by series name, and within a series by date (the order in the index page is usually a good proxy for date)
+dateOrdered=sorted(fanacIssueList, key=lambda elem: (KeysOf(elem).DateKey, elem.IssueName.lower(), elem.SeriesName.lower()))
+alphaOrdered=sorted(dateOrdered, key=lambda elem: KeysOf(elem).AlphaKey)
 
 # Produce a list of fanzines listed by date
-fanacIssueList.sort(key=lambda elem: elem.IssueName.lower())  # Sorts in place on fanzine's name
-fanacIssueList.sort(key=lambda elem: elem.FIS.FormatDateForSorting())
-undatedList=[f for f in fanacIssueList if f.FIS.IsEmpty()]
-datedList=[f for f in fanacIssueList if not f.FIS.IsEmpty()]
+undatedList=[f for f in dateOrdered if f.FIS.IsEmpty()]
+datedList=[f for f in dateOrdered if not f.FIS.IsEmpty()]
 
 timestamp="Indexed as of "+strftime("%Y-%m-%d %H:%M:%S", localtime())+" EST"
 
@@ -357,27 +653,9 @@ def ChronButtonText(fz: FanzineIssueInfo) -> str:
     return str(fz.FIS.Year)[0:3]+"0s"
 
 def URL(fz: FanzineIssueInfo) -> str:
-    if fz is None or fz.PageName is None:
+    url=KeysOf(fz).ResolvedURL
+    if url is None:
         return "<no url>"
-    # Sometimes the url will be to a page in a PDF, so the URL will end with #page=nnn
-    # Detect that, since the page needs to be handled specially.
-    page=""
-    url=fz.DirURL
-    m=re.match("(.*)(#page=[0-9]+)$", url)
-    if m is not None:
-        url=m.groups()[0]
-        page=m.groups()[1]
-
-    if "/" not in fz.PageName:
-        url=url+"/"+fz.PageName+page
-    else:
-        # There are two possibilities: This is a reference to somewhere in the fanzines directory or this is a reference elsewhere.
-        # If it is in fanzines, then the url ends with <stuff>/fanzines/<dir>/<file>.html
-        parts=fz.PageName.split("/")
-        if len(parts) > 2 and parts[-3:-2][0] == "fanzines":
-            url=url+"/../"+"/".join(parts[-2:])+page
-        else:
-            url=fz.PageName
     return url
 
 countText="{:,}".format(issueCount)+" issues consisting of "+"{:,}".format(pageCount)+" pages."
@@ -388,7 +666,10 @@ WriteTable(os.path.join(outputDir, "Chronological_Listing_of_Fanzines.html"),
            fRowHeaderText=lambda fz: (fz.FIS.MonthText+" "+fz.FIS.YearText).strip(),
            fURL=URL,
            countText=countText+"\n"+timestamp+"\n",
-           headerFilename='control-Header (Fanzine, chronological).html')
+           headerFilename='control-Header (Fanzine, chronological).html',
+           shardByButton=args.shard,
+           precompress=args.precompress,
+           jsonFeed=args.jsonfeed)
 WriteTable(os.path.join(outputDir, "Chronological Listing of Fanzines.txt"),
            datedList,
            lambda fz: UnicodeToHtml(fz.IssueName),
@@ -402,25 +683,24 @@ WriteTable(os.path.join(reportDir, "Undated Fanzine Issues.html"),
            countText=timestamp,
            headerFilename="control-Header (Fanzine, alphabetical).html")
 
+memoryProfiler.Phase("Sorted views and chronological listings")
+
 # Generate a list of all the newszines (in lower case)
 # This takes names from the file control-newszines.txt and adds fanzines tagged as newszines on their series index page
 
-# Read the control-newszines.txt file
-newszinesSet=set([x.lower() for x in ReadList("control-newszines.txt", isFatal=True)])
-
 # Add in the newszines discovered in the <h2> blocks
 newszinesFromH2Set=set([fii.SeriesName.lower() for fii in fanacIssueList if "newszine" in fii.Taglist])
-with open(os.path.join(reportDir, "Items identified as newszines by H2 tags.txt"), "w+") as f:
+with OpenOutput(os.path.join(reportDir, "Items identified as newszines by H2 tags.txt")) as f:
     newszinesFromH2List=sorted(list(newszinesFromH2Set))
     for nz in newszinesFromH2List:
         f.write(nz+"\n")
 
-newszinesSet=newszinesSet.union(newszinesFromH2Set)
-
 # Make up a lists of newszines and non-newszines
+# A series is a newszine if it matches an entry in control-newszines.txt or was tagged in its <h2> block
 allzinesSet=set([fx.SeriesName.lower() for fx in fanacIssueList])
+newszinesSet=set([x for x in allzinesSet if x in newszinesFromH2Set or x in control.Newszines])
 
-with open(os.path.join(reportDir, "Items identified as non-newszines.txt"), "w+") as f:
+with OpenOutput(os.path.join(reportDir, "Items identified as non-newszines.txt")) as f:
     nonNewszines=sorted(list(allzinesSet.difference(newszinesSet)))
     for nnz in nonNewszines:
         f.write(nnz+"\n")
@@ -432,48 +712,39 @@ newsPageCount=0
 newsIssueCount=0
 newsPdfIssueCount=0
 for fz in fanacIssueList:
-    if fz.SeriesName.lower() in listOfNewszines and fz.PageName is not None:
+    if fz.SeriesName.lower() in newszinesSet and fz.PageName is not None:
         newsIssueCount+=1
         newsPageCount+=fz.Pagecount
         if os.path.splitext(fz.PageName)[1].lower() == ".pdf":
             newsPdfIssueCount+=1
 
 # Look for lines in the list of newszines which don't match actual newszines on the site.
-unusedLines=[x for x in listOfNewszines if x.lower() not in listOfNewszines]
-unusedLines=[x+"\n" for x in unusedLines]
+unusedLines=[x+"\n" for x in control.Newszines.Unused()]
 
 newszines=[x+"\n" for x in listOfNewszines]
-with open(os.path.join(reportDir, "Items identified as newszines.txt"), "w+") as f:
+with OpenOutput(os.path.join(reportDir, "Items identified as newszines.txt")) as f:
     f.writelines(newszines)
-with open(os.path.join(reportDir, "Unused lines in control-newszines.txt"), "w+") as f:
+with OpenOutput(os.path.join(reportDir, "Unused lines in control-newszines.txt")) as f:
     f.writelines(unusedLines)
 
 countText="{:,}".format(newsIssueCount)+" issues consisting of "+"{:,}".format(newsPageCount)+" pages."
 WriteTable(os.path.join(outputDir, "Chronological_Listing_of_Newszines.html"),
-           fanacIssueList,
+           dateOrdered,
            lambda fz: UnicodeToHtml(fz.IssueName),
            fButtonText=lambda fz: ChronButtonText(fz),
            fRowHeaderText=lambda fz: (fz.FIS.MonthText+" "+fz.FIS.YearText).strip(),
            fURL=URL,
            countText=countText+"\n"+timestamp+"\n",
            headerFilename="control-Header (Newszine).html",
-           fSelector=lambda fz: fz.SeriesName.lower() in listOfNewszines)
+           fSelector=lambda fz: fz.SeriesName.lower() in newszinesSet)
+
+memoryProfiler.Phase("Newszine listing")
 
 # Produce a list of fanzines by title
 def AlphaSortText(fz: FanzineIssueInfo) -> str:
-    if fz.SeriesName is None or len(fz.SeriesName) == 0:
-        return " "
-    # Replace lower case and accented alphas, ignore punctuation, retain digits; the Unidecode is so that things like 'á Bas' sort with A
-    out=""
-    for c in fz.SeriesName:
-        if c.isalpha():
-            out+=unidecode.unidecode(c.upper())
-        elif c.isdigit():
-            out+=c
-    return out
+    return KeysOf(fz).AlphaKey
 countText="{:,}".format(issueCount)+" issues consisting of "+"{:,}".format(pageCount)+" pages."
-fanacIssueList.sort(key=lambda elem: elem.FIS.FormatDateForSorting())  # Sorts in place on order in index page, which is usually a good proxy for date
-fanacIssueList.sort(key=lambda elem: AlphaSortText(elem))  # Sorts in place on fanzine's name
+fanacIssueList=alphaOrdered
 
 
 def AlphaButtonText(fz: FanzineIssueInfo) -> str:
@@ -507,7 +778,10 @@ WriteTable(os.path.join(outputDir, "Alphabetical_Listing_of_Fanzines.html"),
            fURL=URL,
            countText=countText+"\n"+timestamp+"\n",
            headerFilename="control-Header (Fanzine, alphabetical).html",
-           inAlphaOrder=True)
+           inAlphaOrder=True,
+           shardByButton=args.shard,
+           precompress=args.precompress,
+           jsonFeed=args.jsonfeed)
 
 
 # Read through the alphabetic list and generate a flag file of cases where the issue name doesn't match the serial name
@@ -527,10 +801,24 @@ WriteTable(os.path.join(reportDir, "Fanzines with odd names.txt"),
            countText=timestamp+"\n",
            fSelector=lambda fx: OddNames(fx.IssueName,  fx.SeriesName))
 
+memoryProfiler.Phase("Alphabetical listings")
+
+# Write a summary page for each series
+FanacSeriesPages.WriteSeriesPages(os.path.join(outputDir, "series"), fanacIssueList, timestamp)
+
+# Write the shards of the search index and the page which uses them
+FanacSearchIndex.WriteSearchIndex(os.path.join(outputDir, "search"), fanacIssueList)
+FanacSearchIndex.WriteSearchPage(os.path.join(outputDir, "Search.html"))
+
+# Look for series which are probably the same series listed under two spellings
+FanacDuplicateSeries.WriteDuplicateSeriesReport(os.path.join(reportDir, "Possible duplicate series.txt"), fanacIssueList)
+
+memoryProfiler.Phase("Search index and duplicate series")
+
 # Count the number of distinct fanzine names (not issue names, but names of runs of fanzines.)
 # Create a set of all fanzines run names (the set to eliminate suploicates) and then get its size.
 fzCount=len(set([fz.SeriesName.lower() for fz in fanacIssueList]))
-nzCount=len(set([fz.SeriesName.lower() for fz in fanacIssueList if fz.SeriesName.lower() in listOfNewszines]))
+nzCount=len(set([fz.SeriesName.lower() for fz in fanacIssueList if fz.SeriesName.lower() in newszinesSet]))
 
 # Print to the console and also the statistics file
 Log("\n")
@@ -539,7 +827,7 @@ Log("Newszines:  Titles: "+"{:,}".format(nzCount)+"  Issues: "+"{:,}".format(new
 Log("All PDF fanzines: Issues: "+"{:,}".format(pdfIssueCount)+"  Pages: "+"{:,}".format(pdfPageCount))
 for selectedYear in selectedYears:
     Log(str(selectedYear[0])+" Fanzines: "+str(selectedYear[1]))
-with open(os.path.join(outputDir, "Statistics.txt"), "w+") as f:
+with OpenOutput(os.path.join(outputDir, "Statistics.txt")) as f:
     print("All fanzines: Titles: "+"{:,}".format(fzCount)+"  Issues: "+"{:,}".format(issueCount)+"  Pages: "+"{:,}".format(pageCount)+"  PDFs: "+"{:,}".format(pdfIssueCount), file=f)
     print("Newszines:  Titles: "+"{:,}".format(nzCount)+"  Issues: "+"{:,}".format(newsIssueCount)+"  Pages: "+"{:,}".format(newsPageCount)+"  PDFs: "+"{:,}".format(newsPdfIssueCount), file=f)
     print("All PDF fanzines: Issues: "+"{:,}".format(pdfIssueCount)+"  Pages: "+"{:,}".format(pdfPageCount), file=f)
@@ -554,49 +842,24 @@ WriteTable(os.path.join(reportDir, "Fanzines with odd page counts.txt"),
            countText=timestamp,
            fSelector=lambda fz: fz.Pagecount > 250)
 
+# If we have a catalog, use it for the reports which are just indexed queries
+if args.catalog is not None and os.path.exists(args.catalog):
+    catalog=FanacCatalog.OpenCatalog(args.catalog)
+    with OpenOutput(os.path.join(reportDir, "Undated issues by country.txt")) as f:
+        f.write(timestamp+"\n\n")
+        for country, count in FanacCatalog.UndatedIssuesByCountry(catalog):
+            f.write("{:30}  {:6,}\n".format(country if country is not None and len(country) > 0 else "<no country>", count))
+    with OpenOutput(os.path.join(reportDir, "Series with issues over 250 pages.txt")) as f:
+        f.write(timestamp+"\n\n")
+        for series, pages in FanacCatalog.SeriesWithLargeIssues(catalog, 250):
+            f.write(series+"    (largest issue: "+str(pages)+" pages)\n")
+    catalog.close()
+
+memoryProfiler.Phase("Statistics and odd page counts")
+
 # Now generate a list of fanzine series sorted by country
-# For this, we don't actually want a list of individual issues, so we need to collapse fanacIssueList into a fanzineSeriesList
-# FanacIssueList is a list of FanzineIssueInfo objects.  We will read through them all and create a dictionary keyed by fanzine series name with the country as value.
-Country = namedtuple('Country', 'SeriesList SeriesCount')
-fanacSeriesDictByCountry: Dict[str, Country]={}     # Key is country code; value is a tuple of ([FSI], FanzineCounts for country])
-
-for issue in fanacIssueList:
-    # If this is a new country, create a new, empty entry for it
-    countryName=issue.Country.lower().strip()
-    if countryName == "":
-        countryName="us"     # Joe wants fanzines with no country to be treated as US
-    fanacSeriesDictByCountry.setdefault(countryName, Country([], FanzineCounts()))  # If needed, add an empty country entry
-
-    serieslist=fanacSeriesDictByCountry[countryName].SeriesList
-    # serieslist is the list of fanzine series with counts for this country
-    # Note that we accumulate the series page and issue totals
-
-    # Is this new issue from a series that is already in the list for this country?
-    found=False
-    for i in range(len(serieslist)):
-        if issue.Series == serieslist[i]:
-            # Yes: If the directories in the DirURLs match, just add this issue to the existing series totals.
-            # If they don't match, just skip it because it's probably one of the doubly-referred-to entries and will be picked up in some other series.
-            if issue.Series.DirURL == serieslist[i].DirURL:
-                # serieslist[loc] is a specific series in [country]
-                # Update the series by adding the pagecount of this issue to it
-                serieslist[i]+=issue.Pagecount
-                fanacSeriesDictByCountry[countryName]=Country(fanacSeriesDictByCountry[countryName].SeriesList, fanacSeriesDictByCountry[countryName].SeriesCount+issue.Pagecount)
-                found=True
-            break
-    # No: Add a new series entry created from this issue
-    if not found:
-        issue.Series+=issue.Pagecount
-        serieslist.append(issue.Series)
-        count=fanacSeriesDictByCountry[countryName].SeriesCount+issue.Pagecount
-        count.Titlecount+=1
-        fanacSeriesDictByCountry[countryName]=Country(fanacSeriesDictByCountry[countryName].SeriesList, count)
-
-# Next we sort the individual country lists into order by series name
-for ckey, cval in fanacSeriesDictByCountry.items():
-    serieslist=cval[0]
-    serieslist.sort(key=lambda elem: elem.SeriesName.lower())
-    fanacSeriesDictByCountry[ckey]=(serieslist, cval[1])  # Sorts in place on fanzine name
+# The issues have already been collapsed into a fanzine series list for each country as they were read
+fanacSeriesDictByCountry=countries.Finish()
 
 # Take a string which is lower case and turn it to City, State, US sort of capitalization
 def CapIt(s: str) -> str:
@@ -613,7 +876,7 @@ def CapIt(s: str) -> str:
     return ret
 
 # List out the series by country data
-with open(os.path.join(reportDir, "Series by Country.txt"), "w+") as f:
+with OpenOutput(os.path.join(reportDir, "Series by Country.txt")) as f:
     keys=list(fanacSeriesDictByCountry.keys())
     keys.sort() # We want to list the countries in alphabetical order
     for key in keys:
@@ -629,8 +892,7 @@ fanacFanzineSeriesListByCountry: List[Tuple[str, int, str]]=[]
 for countryName, countryEntries in fanacSeriesDictByCountry.items():
     for v in countryEntries[0]:
         fanacFanzineSeriesListByCountry.append((countryName, countryEntries[1], v))       # (country, countryCount, series)
-fanacFanzineSeriesListByCountry.sort(key=lambda elem: RemoveAccents(RemoveArticles(elem[2].DisplayName.lower())).lower())
-fanacFanzineSeriesListByCountry.sort(key=lambda elem: elem[0].lower())
+fanacFanzineSeriesListByCountry.sort(key=lambda elem: (elem[0].lower(), RemoveAccents(RemoveArticles(elem[2].DisplayName.lower())).lower()))
 
 # Provides the annotation for rows in the following output table
 def plural(i: int) -> str:
@@ -651,7 +913,7 @@ def Annotate(elem: FanzineCounts) -> str:
 
 WriteTable(os.path.join(outputDir, "Series_by_Country.html"),
            fanacFanzineSeriesListByCountry,
-           lambda elem: UnicodeToHtml(elem[2].DisplayName)+("| <small>("+elem[2].Editor+")</small>") if elem[2].Editor is not None else "",
+           lambda elem: UnicodeToHtml(elem[2].DisplayName)+("| <small>("+UnicodeToHtml(html.escape(elem[2].Editor, quote=False))+")</small>") if elem[2].Editor is not None else "",
            fRowHeaderText=lambda elem: CapIt(elem[0]),
            fURL=lambda elem: elem[2].DirURL,
            fButtonText=lambda elem: CapIt(elem[0]),
@@ -661,40 +923,50 @@ WriteTable(os.path.join(outputDir, "Series_by_Country.html"),
            headerFilename="control-Header (Fanzine, by country).html",
            inAlphaOrder=True)
 
+memoryProfiler.Phase("Country listings")
 
-# Compute counts of issues and series by decade.
-# We get the issue numbers by simply going through the list and adding one to the appropriate decade.
-# For series, we create a set of series found for that decade
-
-# issueDecadeCount and seriesDecadeCount are  dictionaries keyed by decade: 190, 191, ...199, 200...
-# For issueDecadeCount, the value is a count for that decade
-# For seriesDecadeCount, the value is a set of series names which we will count in the end.
-issueDecadeCount: Dict[int, int]={}
-seriesDecadeCount: Dict[int, Set[str]]={}
-for issue in fanacIssueList:
-    year=0
-    if issue.FIS is not None and issue.FIS.Year is not None:
-        year=issue.FIS.Year
-    decade=math.floor(year/10)
-
-    issueDecadeCount.setdefault(decade, 0)
-    seriesDecadeCount.setdefault(decade, set())
-
-    issueDecadeCount[decade]+=1
-    seriesDecadeCount[decade].add(issue.SeriesName)
-
-# Print the report
-with open(os.path.join(reportDir, "Decade counts.txt"), "w+") as f:
-    f.write(str(datetime.date.today())+"\n")
-    f.write("Counts of fanzines and fanzine series by decade\n\n")
-    f.write(" Decade  Series  Issues\n")
-    decades=sorted([x for x in issueDecadeCount.keys()])
-    for decade in decades:
-        if decade == 0:
-            print("undated   {:5}   {:5}".format(len(seriesDecadeCount[decade]), issueDecadeCount[decade]), file=f)
-        else:
-            print("  {:3}0s   {:5}   {:5}".format(decade, len(seriesDecadeCount[decade]), issueDecadeCount[decade]), file=f)
+# List the fanzine series by editor
+# The index was built as the issues were read
+editors.WriteReport(os.path.join(reportDir, "Series by Editor.txt"), timestamp)
+
+def EditorButtonText(row: EditorRow) -> str:
+    c=EditorSortKey(row.Editor)[0][:1].upper()
+    if c == "" or c.isdigit():
+        return "*"
+    return c
+
+WriteTable(os.path.join(outputDir, "Editors.html"),
+           editors.Rows(),
+           lambda row: UnicodeToHtml(row.Series.DisplayName),
+           fRowHeaderText=lambda row: html.escape(row.Editor, quote=False),
+           fURL=lambda row: row.Series.DirURL,
+           fButtonText=EditorButtonText,
+           fRowAnnot=lambda row: "<small>"+Annotate(row.SeriesCounts)+"</small>",
+           fHeaderAnnot=lambda row: "<small>"+Annotate(row.EditorCounts)+"</small>",
+           countText=timestamp,
+           headerFilename="control-Header (Editors).html",
+           inAlphaOrder=True)
+
+
+memoryProfiler.Phase("Editor listings")
+
+# Print the counts of issues and series by decade.
+decades.Write(os.path.join(reportDir, "Decade counts.txt"))
+
+# Check that all the issue links actually resolve
+if args.checklinks:
+    checker=FanacLinkChecker.LinkChecker(cacheFilename=os.path.join(outputDir, "Link check cache.json"))
+    # With --site, the links are checked against the stand-in, just as the pages were read from it
+    FanacLinkChecker.CheckIssueLinks(fanacIssueList, lambda fz: FanacOrgReaders.SiteURL(KeysOf(fz).ResolvedURL) if KeysOf(fz).ResolvedURL is not None else None,
+                                     os.path.join(reportDir, "Broken links.txt"), checker)
+
+# List the control file entries which no longer match anything
+control.WriteUnusedReport(os.path.join(reportDir, "Unused control file entries.txt"))
+
+memoryProfiler.Phase("Remaining reports")
+memoryProfiler.WriteReport(os.path.join(reportDir, "Memory profile.txt"))
 
+LogOutputSummary()
 Log("FanacAnalyzer has Completed.")
 
 LogClose()
@@ -0,0 +1,139 @@
+from typing import List, Tuple, Optional
+import sqlite3
+import os
+
+from FanzineIssueSpecPackage import FanzineIssueInfo
+
+from Log import Log
+from FanacRecords import IssueRecord, SeriesRecord, IssueToRecord, RecordToIssue
+
+# ====================================================================================
+# A local SQLite catalog of the crawled fanzine series and issues
+# The tables carry secondary indexes on the things we select on (series, date, country, newszine, file type)
+#   so that ad-hoc analyses are indexed queries rather than passes over the whole issue list.
+# DateSpec and SerialSpec keep each issue's date and serial as read (see FanacRecords), so issues read back from the catalog
+#   print exactly as they did when crawled.
+
+catalogSchema="""
+CREATE TABLE series (
+    id          INTEGER PRIMARY KEY,
+    SeriesName  TEXT,
+    DirURL      TEXT,
+    Editor      TEXT,
+    Country     TEXT
+);
+CREATE TABLE issues (
+    id          INTEGER PRIMARY KEY,
+    series      INTEGER REFERENCES series(id),
+    SeriesName  TEXT,
+    IssueName   TEXT,
+    DirURL      TEXT,
+    PageName    TEXT,
+    Pagecount   INTEGER,
+    Country     TEXT,
+    Year        INTEGER,
+    Month       INTEGER,
+    Day         INTEGER,
+    MonthText   TEXT,
+    Vol         INTEGER,
+    Num         INTEGER,
+    Whole       INTEGER,
+    Newszine    INTEGER,
+    FileType    TEXT,
+    DateSpec    TEXT,
+    SerialSpec  TEXT
+);
+CREATE INDEX issuesBySeries ON issues(series);
+CREATE INDEX issuesBySeriesName ON issues(SeriesName COLLATE NOCASE);
+CREATE INDEX issuesByDate ON issues(Year, Month);
+CREATE INDEX issuesByCountry ON issues(Country COLLATE NOCASE);
+CREATE INDEX issuesByNewszine ON issues(Newszine);
+CREATE INDEX issuesByFileType ON issues(FileType);
+CREATE INDEX issuesByPagecount ON issues(Pagecount);
+"""
+
+issueColumns="SeriesName, IssueName, DirURL, PageName, Pagecount, Country, Year, Month, Day, MonthText, Vol, Num, Whole, Newszine, DateSpec, SerialSpec"
+
+
+# -------------------------------------------------------------------------
+# The file type is the lower case extension of the issue's page, e.g., "pdf" or "html"
+def FileType(pageName: Optional[str]) -> str:
+    if pageName is None:
+        return ""
+    return os.path.splitext(pageName)[1].lower().lstrip(".")
+
+
+# ====================================================================================
+# Create a new catalog from the list of issues, replacing any existing one
+def WriteCatalog(filename: str, fanacIssueList: List[FanzineIssueInfo]) -> None:
+    Log("----Begin writing catalog "+filename)
+    if os.path.exists(filename):
+        os.remove(filename)
+
+    seriesIndex={}
+    seriesRows: List[Tuple]=[]
+    issueRows: List[Tuple]=[]
+    for fii in fanacIssueList:
+        rec=IssueToRecord(fii)
+        series=None
+        if rec.Series is not None:
+            series=seriesIndex.get(rec.Series)
+            if series is None:
+                series=len(seriesIndex)+1
+                seriesIndex[rec.Series]=series
+                seriesRows.append((series,)+tuple(rec.Series))
+        issueRows.append((series, rec.SeriesName, rec.IssueName, rec.DirURL, rec.PageName, rec.Pagecount, rec.Country,
+                          rec.Year, rec.Month, rec.Day, rec.MonthText, rec.Vol, rec.Num, rec.Whole, int(rec.Newszine),
+                          rec.DateSpec, rec.SerialSpec, FileType(rec.PageName)))
+
+    # Everything goes in in a single transaction: committing row-by-row would make loading the catalog take minutes
+    conn=sqlite3.connect(filename)
+    try:
+        conn.executescript(catalogSchema)
+        with conn:
+            conn.executemany("INSERT INTO series VALUES (?, ?, ?, ?, ?)", seriesRows)
+            conn.executemany("INSERT INTO issues (series, "+issueColumns+", FileType) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", issueRows)
+    finally:
+        conn.close()
+    Log("----Done writing catalog: "+str(len(issueRows))+" issues, "+str(len(seriesRows))+" series")
+
+
+def OpenCatalog(filename: str) -> sqlite3.Connection:
+    return sqlite3.connect(filename)
+
+
+# ====================================================================================
+# Read issues back out of the catalog as FanzineIssueInfo, optionally selecting with a WHERE clause on the issues table
+#   e.g., ReadCatalog(conn, "Newszine = 1")
+def ReadCatalog(conn: sqlite3.Connection, where: str="", params: Tuple=()) -> List[FanzineIssueInfo]:
+    sql="SELECT i.SeriesName, i.IssueName, i.DirURL, i.PageName, i.Pagecount, i.Country, i.Year, i.Month, i.Day, i.MonthText, i.Vol, i.Num, i.Whole, i.Newszine, "\
+        "i.DateSpec, i.SerialSpec, s.SeriesName, s.DirURL, s.Editor, s.Country FROM issues i LEFT JOIN series s ON i.series = s.id"
+    if len(where) > 0:
+        sql+=" WHERE "+where
+    sql+=" ORDER BY i.id"
+
+    seriesCache={}
+    fanacIssueList: List[FanzineIssueInfo]=[]
+    for row in conn.execute(sql, params):
+        series=None
+        if row[16] is not None or row[17] is not None:
+            series=SeriesRecord(*row[16:20])
+        rec=IssueRecord(*row[0:13], Newszine=row[13] != 0, Series=series, DateSpec=row[14], SerialSpec=row[15])
+        fanacIssueList.append(RecordToIssue(rec, seriesCache))
+    return fanacIssueList
+
+
+# ====================================================================================
+# Some of the canned analyses
+
+# Series having at least one issue of more than minPages pages
+# Returns a list of (series name, largest page count)
+def SeriesWithLargeIssues(conn: sqlite3.Connection, minPages: int=250) -> List[Tuple[str, int]]:
+    return conn.execute("SELECT SeriesName, MAX(Pagecount) FROM issues WHERE Pagecount > ? GROUP BY SeriesName ORDER BY SeriesName COLLATE NOCASE",
+                        (minPages,)).fetchall()
+
+
+# Count of issues having no year, by country
+# Returns a list of (country, count)
+def UndatedIssuesByCountry(conn: sqlite3.Connection) -> List[Tuple[str, int]]:
+    return conn.execute("SELECT Country, COUNT(*) FROM issues WHERE Year IS NULL GROUP BY Country COLLATE NOCASE ORDER BY Country COLLATE NOCASE").fetchall()
@@ -0,0 +1,122 @@
+from typing import List, Dict, Optional, Tuple
+from time import localtime, strftime
+import json
+import os
+
+from FanzineIssueSpecPackage import FanzineIssueInfo
+
+from Log import Log
+from FanacRecords import IssueRecord, IssueToRecord, RecordToIssue, CanonicalIssueURL
+from FanacSnapshot import Snapshot
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# Run-to-run change feed
+# Before a crawl's results replace the previous snapshot, compare the two and write a machine-readable list of what changed
+#   on fanac.org in between: the issues added, removed and changed, and a summary for each series which was affected.
+# Issues are matched on their canonical URL, so an issue which has merely been renamed or re-dated shows up as changed
+#   rather than as a removal and an addition.
+# Downstream consumers can apply the feed as a delta instead of re-reading the complete listings.
+
+# The fields compared between runs
+comparedFields=["SeriesName", "IssueName", "Year", "Month", "Day", "Pagecount", "Country"]
+
+
+def ChangeTime(t: Optional[float]) -> Optional[str]:
+    return strftime("%Y-%m-%d %H:%M:%S", localtime(t)) if t is not None else None
+
+
+# -------------------------------------------------------------------------
+# Read the previous run's issues from its snapshot: canonical URL --> IssueRecord
+def ReadPreviousIssues(snapshotFilename: str) -> Dict[str, IssueRecord]:
+    previous: Dict[str, IssueRecord]={}
+    seriesCache={}
+    with Snapshot(snapshotFilename) as snap:
+        for rec in snap.Issues():
+            previous[CanonicalIssueURL(RecordToIssue(rec, seriesCache))]=rec
+    return previous
+
+
+def IssueEntry(url: str, rec: IssueRecord) -> Dict:
+    d={"url": url}
+    for field in comparedFields:
+        d[field]=getattr(rec, field)
+    return d
+
+
+def SeriesKey(rec: IssueRecord) -> Tuple[str, str]:
+    dirURL=rec.Series.DirURL if rec.Series is not None and rec.Series.DirURL is not None else rec.DirURL
+    return rec.SeriesName if rec.SeriesName is not None else "", dirURL if dirURL is not None else ""
+
+
+# ====================================================================================
+# Compare the previous and current issues and return the feed as a dictionary ready to be written as JSON
+def BuildChangeFeed(previous: Dict[str, IssueRecord], current: Dict[str, IssueRecord]) -> Dict:
+    added=[url for url in current.keys() if url not in previous]
+    removed=[url for url in previous.keys() if url not in current]
+    changed=[]
+    for url, rec in current.items():
+        old=previous.get(url)
+        if old is None:
+            continue
+        diffs={field: [getattr(old, field), getattr(rec, field)] for field in comparedFields if getattr(old, field) != getattr(rec, field)}
+        if len(diffs) > 0:
+            changed.append((url, diffs))
+
+    # Summarize by series.  A series is new (or gone) if all of its issues are.
+    series: Dict[Tuple[str, str], Dict]={}
+    def Summary(rec: IssueRecord) -> Dict:
+        key=SeriesKey(rec)
+        return series.setdefault(key, {"series": key[0], "dirURL": key[1], "added": 0, "removed": 0, "changed": 0})
+    for url in added:
+        Summary(current[url])["added"]+=1
+    for url in removed:
+        Summary(previous[url])["removed"]+=1
+    for url, diffs in changed:
+        Summary(current[url])["changed"]+=1
+
+    previousSeries=set(SeriesKey(rec) for rec in previous.values())
+    currentSeries=set(SeriesKey(rec) for rec in current.values())
+    for key, s in series.items():
+        if key not in previousSeries:
+            s["status"]="added"
+        elif key not in currentSeries:
+            s["status"]="removed"
+        else:
+            s["status"]="changed"
+
+    return {
+        "counts": {"previousIssues": len(previous), "currentIssues": len(current),
+                   "added": len(added), "removed": len(removed), "changed": len(changed),
+                   "seriesAffected": len(series)},
+        "series": sorted(series.values(), key=lambda s: (s["series"].lower(), s["dirURL"])),
+        "added": [IssueEntry(url, current[url]) for url in sorted(added)],
+        "removed": [IssueEntry(url, previous[url]) for url in sorted(removed)],
+        "changed": [{"url": url, "changes": diffs} for url, diffs in sorted(changed, key=lambda c: c[0])],
+    }
+
+
+# ====================================================================================
+# Write the change feed between the snapshot in snapshotFilename (which must not yet have been replaced) and this run's issues
+# If there is no previous snapshot, every issue is reported as added.
+def WriteChangeFeed(filename: str, snapshotFilename: str, fanacIssueList: List[FanzineIssueInfo]) -> None:
+    previous: Dict[str, IssueRecord]={}
+    since=None
+    if os.path.exists(snapshotFilename):
+        try:
+            previous=ReadPreviousIssues(snapshotFilename)
+            since=os.path.getmtime(snapshotFilename)
+        except (OSError, ValueError) as e:
+            Log("WriteChangeFeed: Can't read previous snapshot "+snapshotFilename+": "+str(e), isError=True)
+    else:
+        Log("WriteChangeFeed: No previous snapshot, so all issues are new")
+
+    current={CanonicalIssueURL(fii): IssueToRecord(fii) for fii in fanacIssueList}
+    feed=BuildChangeFeed(previous, current)
+    feed={"since": ChangeTime(since), **feed}
+
+    counts=feed["counts"]
+    Log("WriteChangeFeed: "+str(counts["added"])+" issues added, "+str(counts["removed"])+" removed, "+str(counts["changed"])+" changed in "+
+        str(counts["seriesAffected"])+" series")
+    with OpenOutput(filename) as f:
+        json.dump(feed, f, indent=1, default=str)
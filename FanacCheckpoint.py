@@ -0,0 +1,91 @@
+from typing import List, Dict, Optional, Set
+from time import localtime, strftime
+import json
+import os
+
+from FanzineIssueSpecPackage import FanzineIssueInfo
+
+from Log import Log
+from FanacRecords import IssueToRecord, RecordToIssue, IssueRecordToDict, IssueRecordFromDict
+
+# ====================================================================================
+# A checkpoint journal for the crawl
+# As each directory is read, its issues are appended to the journal (one JSON line per directory) and flushed to disk.
+# If the crawl dies, a resumed run replays the directories already in the journal instead of fetching them again and
+#   carries on from where the failed run stopped.
+# Each crawl is a "generation".  A new crawl starts a new generation and an empty journal; a resumed crawl continues the
+#   generation in the journal, unless that generation ran to completion, in which case there is nothing to resume.
+#
+# The journal's lines are
+#   {"generation": "<id>"}                              The first line
+#   {"dir": "<dirname>", "issues": [<issue record>...]} One for each completed directory
+#   {"complete": true}                                  When the crawl has finished
+
+class CrawlJournal:
+    def __init__(self, filename: str, resume: bool=False):
+        self._filename=filename
+        self._done: Set[str]=set()                  # The directories completed, this run or (when resuming) the interrupted one
+        self._offsets: Dict[str, int]={}            # Where in the journal each directory completed by the interrupted run is
+        self._seriesCache={}
+        self.Generation: Optional[str]=None
+
+        # The records themselves are not kept in memory: only the names of the directories and, when resuming, where their
+        #   lines are in the journal, so that they can be read back one directory at a time as the crawl reaches them.
+        if resume and os.path.exists(filename):
+            complete=False
+            goodLength=0
+            with open(filename, "rb") as f:
+                for line in f:
+                    try:
+                        entry=json.loads(line)
+                    except ValueError:
+                        break       # A partly-written last line from the crash; everything before it is good
+                    if "generation" in entry:
+                        self.Generation=entry["generation"]
+                    elif "dir" in entry:
+                        self._done.add(entry["dir"])
+                        self._offsets[entry["dir"]]=goodLength
+                    elif entry.get("complete"):
+                        complete=True
+                    goodLength+=len(line)
+            if self.Generation is not None and not complete:
+                Log("CrawlJournal: Resuming generation "+self.Generation+" with "+str(len(self._done))+" directories already done")
+                # Cut off any partial trailing line before appending to the journal
+                os.truncate(filename, goodLength)
+                return
+            Log("CrawlJournal: Nothing to resume; starting a new crawl")
+            self._done=set()
+            self._offsets={}
+
+        self.Generation=strftime("%Y-%m-%d %H:%M:%S", localtime())
+        with open(self._filename, "w") as f:
+            f.write(json.dumps({"generation": self.Generation})+"\n")
+        Log("CrawlJournal: Starting generation "+self.Generation)
+
+    def _Append(self, entry: Dict) -> None:
+        with open(self._filename, "a") as f:
+            f.write(json.dumps(entry)+"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def IsDone(self, dirname: str) -> bool:
+        return dirname in self._done
+
+    # The issues recorded for a completed directory, read back from the journal
+    def Issues(self, dirname: str) -> List[FanzineIssueInfo]:
+        offset=self._offsets.get(dirname)
+        if offset is None:
+            return []
+        with open(self._filename, "rb") as f:
+            f.seek(offset)
+            entry=json.loads(f.readline())
+        return [RecordToIssue(IssueRecordFromDict(d), self._seriesCache) for d in entry["issues"]]
+
+    # Record that a directory has been read, along with the issues read from it
+    def Record(self, dirname: str, issues: List[FanzineIssueInfo]) -> None:
+        self._Append({"dir": dirname, "issues": [IssueRecordToDict(IssueToRecord(fii)) for fii in issues]})
+        self._done.add(dirname)
+
+    # Mark the crawl as having run to completion
+    def Complete(self) -> None:
+        self._Append({"complete": True})
@@ -0,0 +1,199 @@
+from typing import List, Dict, Optional, Set, Tuple
+import os
+import re
+
+from Log import Log
+from HelpersPackage import ReadList
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# The control files, each parsed once per run into a form which can be checked in constant time
+# An entry in a control file is one of
+#   An exact name, e.g., "MT Void, The" or "Fanews[card]" -- all the characters of a plain entry are literal
+#   A prefix, written "glob:" followed by the prefix and a single trailing "*", e.g., "glob:FAPA_*"
+#   A wildcard pattern, written "glob:" followed by a pattern using the shell-style "*", "?" and "[...]", e.g., "glob:Bullsheet?-*"
+# Exact names go into a set.  Prefixes are checked by looking up each of the name's own prefixes of the lengths in use, so
+#   it's a handful of set lookups rather than a scan of the list.  All the wildcard patterns of a file are compiled into a
+#   single regular expression.
+# Each list remembers which of its entries matched something, so entries which no longer match anything can be reported.
+# The files can be reloaded in place (only the ones which have changed are re-read), for long-running use.
+
+globPrefix="glob:"
+wildcardChars=re.compile(r"[*?\[]")
+
+
+# -------------------------------------------------------------------------
+# Translate a shell-style wildcard pattern into a regular expression.
+# (We don't use fnmatch.translate because the patterns are joined into one regex, and on older Pythons translate's output
+#   contains named groups which would then be duplicated.)
+def GlobToRegex(pattern: str) -> str:
+    out=[]
+    i=0
+    while i < len(pattern):
+        c=pattern[i]
+        i+=1
+        if c == "*":
+            out.append(".*")
+        elif c == "?":
+            out.append(".")
+        elif c == "[":
+            j=i
+            if j < len(pattern) and pattern[j] == "!":
+                j+=1
+            if j < len(pattern) and pattern[j] == "]":      # A "]" first in the set is one of its characters
+                j+=1
+            j=pattern.find("]", j)
+            if j < 0:
+                out.append(re.escape(c))     # No closing bracket: it's a literal "["
+                continue
+            chars=pattern[i:j].replace("\\", "\\\\")
+            i=j+1
+            if chars.startswith("!"):
+                chars="^"+chars[1:]
+            elif chars.startswith("^"):
+                chars="\\"+chars
+            out.append("["+chars+"]")
+        else:
+            out.append(re.escape(c))
+    return "(?:"+"".join(out)+")\\Z"
+
+
+class ControlList:
+    def __init__(self, filename: str, caseless: bool=False, isFatal: bool=False):
+        self.Filename=filename
+        self._caseless=caseless
+        self._isFatal=isFatal
+        self._mtime: Optional[float]=None
+        self.Exists=False                       # Was there a file to load?
+        self.Entries: List[str]=[]              # In file order
+        self._exact: Dict[str, str]={}          # Normalized name --> entry
+        self._prefixes: Dict[str, str]={}       # Normalized prefix --> entry
+        self._prefixLengths: List[int]=[]
+        self._wildcards: List[str]=[]
+        self._wildcardPattern: Optional[re.Pattern]=None
+        self._used: Set[str]=set()
+        self.Consulted=False                    # Has anything been looked up in this list?
+        self.Load()
+
+    def _Normalize(self, s: str) -> str:
+        return s.lower() if self._caseless else s
+
+    def Load(self) -> None:
+        entries=[]
+        if os.path.exists(self.Filename) or self._isFatal:
+            entries=ReadList(self.Filename, isFatal=self._isFatal)
+            if entries is None:
+                entries=[]
+        self.Exists=os.path.exists(self.Filename)
+        self._mtime=os.path.getmtime(self.Filename) if self.Exists else None
+        self.Entries=[e.strip() for e in entries if len(e.strip()) > 0]
+        self._exact={}
+        self._prefixes={}
+        self._wildcards=[]
+        for entry in self.Entries:
+            norm=self._Normalize(entry)
+            if not norm.startswith(globPrefix):
+                self._exact[norm]=entry
+                continue
+            pattern=norm[len(globPrefix):]
+            if wildcardChars.search(pattern) is None:
+                self._exact[pattern]=entry
+            elif pattern.endswith("*") and wildcardChars.search(pattern[:-1]) is None:
+                self._prefixes[pattern[:-1]]=entry
+            else:
+                self._wildcards.append(entry)
+        self._prefixLengths=sorted(set(len(p) for p in self._prefixes.keys()))
+        self._wildcardPattern=None
+        if len(self._wildcards) > 0:
+            self._wildcardPattern=re.compile("|".join("(?P<w"+str(i)+">"+GlobToRegex(self._Normalize(w)[len(globPrefix):])+")" for i, w in enumerate(self._wildcards)))
+        self._used=set()
+
+    # Re-read the file if it has changed since it was loaded.  Returns True if it was re-read.
+    def Reload(self) -> bool:
+        mtime=os.path.getmtime(self.Filename) if os.path.exists(self.Filename) else None
+        if mtime == self._mtime:
+            return False
+        Log("ControlList: Reloading "+self.Filename)
+        self.Load()
+        return True
+
+    # Return the entry which matches name, or None
+    def Match(self, name: Optional[str]) -> Optional[str]:
+        self.Consulted=True
+        if name is None:
+            return None
+        norm=self._Normalize(name)
+        entry=self._exact.get(norm)
+        if entry is None:
+            for length in self._prefixLengths:
+                if length > len(norm):
+                    break
+                entry=self._prefixes.get(norm[:length])
+                if entry is not None:
+                    break
+        if entry is None and self._wildcardPattern is not None:
+            m=self._wildcardPattern.match(norm)
+            if m is not None:
+                entry=self._wildcards[int(m.lastgroup[1:])]
+        if entry is not None:
+            self._used.add(entry)
+        return entry
+
+    def __contains__(self, name: Optional[str]) -> bool:
+        return self.Match(name) is not None
+
+    def __iter__(self):
+        return iter(self.Entries)
+
+    def __len__(self) -> int:
+        return len(self.Entries)
+
+    def Unused(self) -> List[str]:
+        return [e for e in self.Entries if e not in self._used]
+
+
+# ====================================================================================
+# All the control files
+class ControlFiles:
+    def __init__(self):
+        self.TopLevelDirectories=ControlList("control-topleveldirectories.txt")
+        self.Skippers=ControlList("control-skippers.txt")
+        self.Offsite=ControlList("control-offsite.txt")
+        self.Singletons=ControlList("control-singletons.txt")
+        self.SpecialBiggies=ControlList("control-specialbiggies.txt")
+        self.Newszines=ControlList("control-newszines.txt", caseless=True, isFatal=True)
+        self.IgnorePageCountErrors=ControlList("control-Ignore Page Count Errors.txt")
+        self.Years=ControlList("control-year.txt")
+
+    def Lists(self) -> List[ControlList]:
+        return [self.TopLevelDirectories, self.Skippers, self.Offsite, self.Singletons, self.SpecialBiggies, self.Newszines,
+                self.IgnorePageCountErrors, self.Years]
+
+    # Re-read whichever control files have changed.  Returns the number reloaded.
+    def Reload(self) -> int:
+        return len([cl for cl in self.Lists() if cl.Reload()])
+
+    # List the entries of each control file which matched nothing this run
+    # Lists which were never consulted (e.g., the crawl's lists when the crawl was skipped) are left out
+    def WriteUnusedReport(self, filename: str) -> None:
+        with OpenOutput(filename) as f:
+            for cl in self.Lists():
+                if not cl.Consulted:
+                    continue
+                unused=cl.Unused()
+                Log("ControlFiles: "+cl.Filename+": "+str(len(unused))+" of "+str(len(cl))+" entries unused")
+                f.write(cl.Filename+": "+str(len(unused))+" of "+str(len(cl))+" entries matched nothing\n")
+                for entry in unused:
+                    f.write("    "+entry+"\n")
+                f.write("\n")
+
+
+# -------------------------------------------------------------------------
+# The control files are loaded once, the first time they're wanted
+_control: Optional[ControlFiles]=None
+
+def Control() -> ControlFiles:
+    global _control
+    if _control is None:
+        _control=ControlFiles()
+    return _control
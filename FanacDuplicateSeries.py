@@ -0,0 +1,112 @@
+from typing import List, Dict, Set, Tuple, Optional
+import unidecode
+
+from FanzineIssueSpecPackage import FanzineIssueInfo, FanzineSeriesInfo
+
+from Log import Log
+from HelpersPackage import RemoveArticles
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# Find fanzine series which are probably the same series listed under two spellings
+# Comparing every pair of names with SequenceMatcher is O(n²), which is far too slow for thousands of series.
+# Instead we build an inverted index from character trigrams to the series containing them.  A series' only candidate
+#   partners are then the series which share trigrams with it, and only those pairs are scored by the Jaccard similarity
+#   of the two names' trigram sets.
+# Editors are indexed the same way, and a matching editor raises a pair's score.
+
+# Trigrams which occur in more than this many series ("the", "fan", "new", ...) tell us little and would make the
+#   candidate lists long, so they are left out of the index.
+maxPostings=200
+
+
+# -------------------------------------------------------------------------
+# Reduce a name to lower case letters and digits, with articles and accents removed and spaces normalized
+def NormalizeName(s: Optional[str]) -> str:
+    if s is None:
+        return ""
+    s=unidecode.unidecode(RemoveArticles(s)).lower()
+    s="".join([c if c.isalnum() else " " for c in s])
+    return " ".join(s.split())
+
+
+def Trigrams(s: str) -> Set[str]:
+    if len(s) == 0:
+        return set()
+    s="  "+s+" "
+    return {s[i:i+3] for i in range(len(s)-2)}
+
+
+# ====================================================================================
+# An inverted index from trigram to the set of items (by number) containing it
+class TrigramIndex:
+    def __init__(self, strings: List[str]):
+        self.Grams: List[Set[str]]=[Trigrams(s) for s in strings]
+        postings: Dict[str, List[int]]={}
+        for i, grams in enumerate(self.Grams):
+            for g in grams:
+                postings.setdefault(g, []).append(i)
+        self.Postings={g: p for g, p in postings.items() if len(p) <= maxPostings}
+
+    # Return {j: Jaccard similarity of i and j} for every j>i which shares an indexed trigram with i
+    # The index only picks the candidates.  Since the frequent trigrams aren't in it, the count of shared indexed trigrams
+    #   would understate the overlap, so each candidate is scored on the complete trigram sets.
+    def Neighbors(self, i: int) -> Dict[int, float]:
+        candidates: Set[int]=set()
+        for g in self.Grams[i]:
+            for j in self.Postings.get(g, ()):
+                if j > i:
+                    candidates.add(j)
+        return {j: self.Similarity(i, j) for j in candidates}
+
+    def Similarity(self, i: int, j: int) -> float:
+        a, b=self.Grams[i], self.Grams[j]
+        if len(a) == 0 or len(b) == 0:
+            return 0.0
+        n=len(a & b)
+        return n/(len(a)+len(b)-n)
+
+
+# ====================================================================================
+# Return a list of (score, name similarity, editor similarity, series1, series2) for all the pairs scoring at least threshold
+def FindDuplicateSeries(seriesList: List[FanzineSeriesInfo], threshold: float=0.7) -> List[Tuple[float, float, float, FanzineSeriesInfo, FanzineSeriesInfo]]:
+    names=TrigramIndex([NormalizeName(s.SeriesName) for s in seriesList])
+    editors=TrigramIndex([NormalizeName(s.Editor) for s in seriesList])
+
+    pairs=[]
+    for i in range(len(seriesList)):
+        for j, nameSim in names.Neighbors(i).items():
+            editorSim=editors.Similarity(i, j)
+            # When both series have editors, a matching editor makes a near-match more convincing and a different one less so
+            score=nameSim
+            if len(editors.Grams[i]) > 0 and len(editors.Grams[j]) > 0:
+                score=0.75*nameSim+0.25*editorSim
+            if score >= threshold or nameSim == 1.0:
+                pairs.append((score, nameSim, editorSim, seriesList[i], seriesList[j]))
+    pairs.sort(key=lambda p: -p[0])
+    return pairs
+
+
+# -------------------------------------------------------------------------
+# Collect the distinct series from a list of issues
+def SeriesOfIssues(fanacIssueList: List[FanzineIssueInfo]) -> List[FanzineSeriesInfo]:
+    seen: Dict[Tuple[str, str], FanzineSeriesInfo]={}
+    for fz in fanacIssueList:
+        fsi=fz.Series
+        if fsi is None or fsi.SeriesName is None:
+            continue
+        seen.setdefault((fsi.SeriesName, fsi.DirURL), fsi)
+    return list(seen.values())
+
+
+# ====================================================================================
+def WriteDuplicateSeriesReport(filename: str, fanacIssueList: List[FanzineIssueInfo], threshold: float=0.7) -> None:
+    seriesList=SeriesOfIssues(fanacIssueList)
+    pairs=FindDuplicateSeries(seriesList, threshold)
+    Log("FindDuplicateSeries: "+str(len(pairs))+" candidate pairs among "+str(len(seriesList))+" series")
+    with OpenOutput(filename) as f:
+        f.write("Possible duplicate series (similarity of at least "+str(threshold)+")\n\n")
+        for score, nameSim, editorSim, s1, s2 in pairs:
+            f.write("{:.2f}  (name {:.2f}, editor {:.2f})\n".format(score, nameSim, editorSim))
+            for s in (s1, s2):
+                f.write("      "+s.SeriesName+("  ["+s.Editor+"]" if s.Editor else "")+"  "+str(s.DirURL)+"\n")
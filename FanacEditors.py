@@ -0,0 +1,115 @@
+from typing import List, Dict, Tuple, Optional
+from collections import namedtuple
+from functools import lru_cache
+import re
+import unidecode
+
+from FanzineIssueSpecPackage import FanzineIssueInfo, FanzineSeriesInfo, FanzineCounts
+
+from Log import Log
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# An index of editors
+# The editor string pulled out of a series page's <h2> block often names several people ("Lee Hoffman & Walt Willis",
+#   "Bob Tucker, Art Widner and Bob Madle"), so it is split into individual names.  The names are normalized (accents,
+#   case, punctuation and spacing) so that the spellings of one person's name on different pages come together.
+# Since every issue of a series has the same editor string, the splitting and normalization are cached.
+# The counts are accumulated as the issues stream in, in a dictionary keyed by the normalized name, so building the index
+#   is one pass over the issues no matter how many editors there are.
+
+editorSplitPattern=re.compile(r"\s*(?:,|;|/|&|\+|\band\b|\bwith\b)\s*", re.IGNORECASE)
+editorNoisePattern=re.compile(r"\(.*?\)|\[.*?\]|\beds?\.|\beditors?\b|\bedited by\b", re.IGNORECASE)
+# Suffixes which follow a name after a comma ("Bob Tucker, Jr."), and so mustn't be split off as names of their own
+nameSuffixes=frozenset(["jr", "sr", "ii", "iii", "iv"])
+
+# One row of the Editors listing: an editor, the editor's totals, one of the editor's series and the totals for that series
+EditorRow=namedtuple("EditorRow", "Editor EditorCounts Series SeriesCounts")
+
+
+# -------------------------------------------------------------------------
+# Split an editor string into the individual names
+@lru_cache(maxsize=None)
+def SplitEditors(editors: Optional[str]) -> Tuple[str, ...]:
+    if editors is None:
+        return ()
+    editors=editorNoisePattern.sub(" ", editors)
+    names: List[str]=[]
+    for n in editorSplitPattern.split(editors):
+        n=" ".join(n.split())
+        if len(names) > 0 and n.lower().rstrip(".") in nameSuffixes:
+            names[-1]+=", "+n       # Put the suffix back on the name it belongs to
+        else:
+            names.append(n)
+    return tuple(n for n in names if len(n) > 1 and any(c.isalpha() for c in n))
+
+
+# Reduce a name to the key used to match it: no accents, lower case, letters and digits only, single spaced
+@lru_cache(maxsize=None)
+def NormalizeEditor(name: str) -> str:
+    name=unidecode.unidecode(name).lower()
+    return " ".join("".join([c if c.isalnum() else " " for c in name]).split())
+
+
+# Editors are listed by surname (so "Bob Tucker, Jr." goes under Tucker)
+def EditorSortKey(name: str) -> Tuple[str, str]:
+    key=NormalizeEditor(name)
+    words=key.split()
+    while len(words) > 1 and words[-1] in nameSuffixes:
+        words=words[:-1]
+    return (words[-1] if len(words) > 0 else "", key)
+
+
+# ====================================================================================
+class EditorIndex:
+    def __init__(self):
+        self._names: Dict[str, str]={}                                    # Normalized name --> name as first seen
+        self._counts: Dict[str, FanzineCounts]={}                         # Normalized name --> editor's totals
+        self._series: Dict[str, Dict[Tuple, Tuple[FanzineSeriesInfo, FanzineCounts]]]={}   # Normalized name --> {series key: (series, series totals)}
+
+    def Add(self, fz: FanzineIssueInfo) -> None:
+        fsi=fz.Series
+        if fsi is None:
+            return
+        seriesKey=(fsi.SeriesName, fsi.DirURL)
+        for name in SplitEditors(fsi.Editor):
+            key=NormalizeEditor(name)
+            if key not in self._names:
+                self._names[key]=name
+                self._counts[key]=FanzineCounts()
+                self._series[key]={}
+            editorCounts=self._counts[key]
+            seriesDict=self._series[key]
+            if seriesKey not in seriesDict:
+                seriesDict[seriesKey]=(fsi, FanzineCounts())
+                editorCounts.Titlecount+=1
+            seriesCounts=seriesDict[seriesKey][1]
+            seriesCounts.Issuecount+=1
+            seriesCounts.Pagecount+=fz.Pagecount
+            editorCounts.Issuecount+=1
+            editorCounts.Pagecount+=fz.Pagecount
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    # Return the index as a flat list of rows, by editor and then by series name, suitable for WriteTable
+    def Rows(self) -> List[EditorRow]:
+        rows=[]
+        for key in sorted(self._names.keys(), key=lambda k: EditorSortKey(self._names[k])):
+            for fsi, counts in sorted(self._series[key].values(), key=lambda sc: sc[0].SeriesName.lower()):
+                rows.append(EditorRow(self._names[key], self._counts[key], fsi, counts))
+        return rows
+
+    # -------------------------------------------------------------------------
+    def WriteReport(self, filename: str, timestamp: str) -> None:
+        Log("EditorIndex: "+str(len(self._names))+" editors")
+        with OpenOutput(filename) as f:
+            f.write(timestamp+"\n")
+            f.write(str(len(self._names))+" editors\n")
+            editor=None
+            for row in self.Rows():
+                if row.Editor != editor:
+                    editor=row.Editor
+                    c=row.EditorCounts
+                    f.write("\n"+editor+"   "+str(c.Titlecount)+" titles,  "+str(c.Issuecount)+" issues,  and "+str(c.Pagecount)+" pages\n")
+                f.write("    "+row.Series.SeriesName+"    ("+str(row.SeriesCounts.Issuecount)+" issues, "+str(row.SeriesCounts.Pagecount)+" pages)\n")
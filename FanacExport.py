@@ -0,0 +1,108 @@
+from typing import List, Dict, Tuple, Optional, Iterator
+import json
+import csv
+import os
+
+from FanzineIssueSpecPackage import FanzineIssueInfo
+
+from Log import Log
+from FanacRecords import IssueToRecord, CanonicalIssueURL, KeysOf
+from FanacCatalog import FileType
+
+# pyarrow isn't part of the standard library.  If it's not installed, we fall back to CSV with a separate schema file.
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow=None
+
+# ====================================================================================
+# Export the issues and series as typed, columnar tables for analysis tools
+# With pyarrow the tables are written as Parquet, which loads in a fraction of a second and keeps the types.
+# Without it, they are written as CSV (in batches, so the whole table is never held as text) alongside a JSON schema
+#   giving the column types, which is enough for pandas, DuckDB, etc. to load them correctly.
+
+# The columns: (name, type), where type is "string", "int32" or "bool"
+issueColumns: List[Tuple[str, str]]=[
+    ("SeriesName", "string"), ("IssueName", "string"),
+    ("Year", "int32"), ("Month", "int32"), ("Day", "int32"), ("MonthText", "string"),
+    ("Vol", "int32"), ("Num", "int32"), ("Whole", "int32"),
+    ("Pagecount", "int32"), ("Country", "string"), ("Editor", "string"), ("Newszine", "bool"),
+    ("FileType", "string"), ("URL", "string"), ("CanonicalURL", "string"), ("SeriesURL", "string"),
+]
+seriesColumns: List[Tuple[str, str]]=[
+    ("SeriesName", "string"), ("Editor", "string"), ("Country", "string"), ("SeriesURL", "string"),
+    ("Issuecount", "int32"), ("Pagecount", "int32"), ("Newszine", "bool"),
+]
+
+csvBatchRows=10000
+
+
+# -------------------------------------------------------------------------
+# Yield the issue and series rows as dictionaries
+def IssueRows(fanacIssueList: List[FanzineIssueInfo]) -> Iterator[Dict]:
+    for fii in fanacIssueList:
+        rec=IssueToRecord(fii)
+        series=rec.Series
+        yield {"SeriesName": rec.SeriesName, "IssueName": rec.IssueName,
+               "Year": rec.Year, "Month": rec.Month, "Day": rec.Day, "MonthText": rec.MonthText,
+               "Vol": rec.Vol, "Num": rec.Num, "Whole": rec.Whole,
+               "Pagecount": rec.Pagecount, "Country": rec.Country, "Editor": series.Editor if series is not None else None,
+               "Newszine": rec.Newszine, "FileType": FileType(rec.PageName),
+               "URL": KeysOf(fii).ResolvedURL, "CanonicalURL": CanonicalIssueURL(fii), "SeriesURL": series.DirURL if series is not None else rec.DirURL}
+
+
+def SeriesRows(fanacIssueList: List[FanzineIssueInfo]) -> List[Dict]:
+    series: Dict[Tuple, Dict]={}
+    for row in IssueRows(fanacIssueList):
+        s=series.setdefault((row["SeriesName"], row["SeriesURL"]),
+                            {"SeriesName": row["SeriesName"], "Editor": row["Editor"], "Country": row["Country"], "SeriesURL": row["SeriesURL"],
+                             "Issuecount": 0, "Pagecount": 0, "Newszine": False})
+        s["Issuecount"]+=1
+        s["Pagecount"]+=row["Pagecount"]
+        s["Newszine"]=s["Newszine"] or row["Newszine"]
+    return list(series.values())
+
+
+# ====================================================================================
+def WriteParquet(filename: str, rows: Iterator[Dict], columns: List[Tuple[str, str]]) -> None:
+    types={"string": pyarrow.string(), "int32": pyarrow.int32(), "bool": pyarrow.bool_()}
+    schema=pyarrow.schema([(name, types[t]) for name, t in columns])
+    data: Dict[str, List]={name: [] for name, t in columns}
+    for row in rows:
+        for name, t in columns:
+            data[name].append(row[name])
+    temp=filename+".tmp"
+    pyarrow.parquet.write_table(pyarrow.table(data, schema=schema), temp, compression="zstd")
+    os.replace(temp, filename)
+
+
+def WriteCsv(filename: str, rows: Iterator[Dict], columns: List[Tuple[str, str]]) -> None:
+    names=[name for name, t in columns]
+    temp=filename+".tmp"
+    with open(temp, "w", newline="", encoding="utf-8") as f:
+        writer=csv.writer(f)
+        writer.writerow(names)
+        batch=[]
+        for row in rows:
+            batch.append([("1" if row[n] else "0") if t == "bool" else row[n] for n, t in columns])
+            if len(batch) >= csvBatchRows:
+                writer.writerows(batch)
+                batch=[]
+        writer.writerows(batch)
+    os.replace(temp, filename)
+    with open(os.path.splitext(filename)[0]+".schema.json", "w") as f:
+        json.dump({"format": "csv", "header": True, "nullValue": "", "columns": [{"name": n, "type": t} for n, t in columns]}, f, indent=1)
+
+
+# ====================================================================================
+# Write "<baseFilename> issues" and "<baseFilename> series" as .parquet, or as .csv if pyarrow isn't installed
+def ExportIssues(baseFilename: str, fanacIssueList: List[FanzineIssueInfo]) -> None:
+    for suffix, rows, columns in ((" issues", IssueRows(fanacIssueList), issueColumns), (" series", iter(SeriesRows(fanacIssueList)), seriesColumns)):
+        if pyarrow is not None:
+            WriteParquet(baseFilename+suffix+".parquet", rows, columns)
+        else:
+            WriteCsv(baseFilename+suffix+".csv", rows, columns)
+    if pyarrow is None:
+        Log("ExportIssues: pyarrow is not installed, so the export was written as CSV")
+    Log("ExportIssues: "+str(len(fanacIssueList))+" issues exported to "+baseFilename)
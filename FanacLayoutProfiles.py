@@ -0,0 +1,68 @@
+from typing import List, Dict, Optional, Tuple, Any
+import json
+import os
+
+from Log import Log
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# Per-directory layout profiles
+# Most series pages keep the same layout from run to run: the same table-locating strategy finds the index table,
+#   the table has the same column headers, and the page is a singleton or it isn't.
+# After a directory has been successfully read we save its layout, and the next run tries that layout first, falling back
+#   on the full heuristic search only when it no longer fits.  If the saved strategy finds a table whose header row is the
+#   same as last time, the search stops there, and the saved column list and column map are used as they are rather than
+#   canonicizing the headers again.  Directories whose layout differs from the saved one are
+#   recorded, which makes changes to the page templates visible.
+
+class LayoutProfiles:
+    def __init__(self, filename: Optional[str]=None):
+        self._filename=filename
+        self._profiles: Dict[str, Dict[str, Any]]={}
+        self.Changes: List[Tuple[str, Dict[str, Any], Dict[str, Any]]]=[]   # (directory URL, old profile, new profile)
+        self.Hits=0     # Number of pages where the saved layout worked
+        self.Misses=0   # Number of pages with no saved layout or where it didn't work
+        if filename is not None and os.path.exists(filename):
+            try:
+                with open(filename, "r") as f:
+                    self._profiles=json.load(f)
+            except (OSError, ValueError) as e:
+                Log("LayoutProfiles: Ignoring unreadable profiles file "+filename+": "+str(e), isError=True)
+
+    def Get(self, directoryUrl: str) -> Optional[Dict[str, Any]]:
+        return self._profiles.get(directoryUrl)
+
+    # Record the layout which was found for a directory and note it if it differs from the one previously saved
+    #   kind is "table" or "singleton"
+    #   locator is the index of the table-locating strategy which found the index table
+    #   columns is the list of canonicized column headers
+    #   headerText is the text of the table's header row from which the columns were read
+    #   index is the column map: canonical column name --> column number
+    def Record(self, directoryUrl: str, kind: str, locator: Optional[int]=None, columns: Optional[List[str]]=None,
+               headerText: Optional[str]=None, index: Optional[Dict[str, int]]=None) -> None:
+        new={"kind": kind, "locator": locator, "columns": columns, "headerText": headerText, "index": index}
+        old=self._profiles.get(directoryUrl)
+        if old is not None and any(old.get(key) != new.get(key) for key in ("kind", "locator", "columns")):
+            self.Changes.append((directoryUrl, old, new))
+            Log("   Layout of "+directoryUrl+" has changed")
+        self._profiles[directoryUrl]=new
+
+    def Save(self) -> None:
+        if self._filename is None:
+            return
+        temp=self._filename+".tmp"
+        with open(temp, "w") as f:
+            json.dump(self._profiles, f, indent=1, sort_keys=True)
+        os.replace(temp, self._filename)
+
+    # Report the directories whose layout changed
+    def WriteChangesReport(self, filename: str) -> None:
+        Log("LayoutProfiles: "+str(self.Hits)+" pages read using their saved layout, "+str(self.Misses)+" needed the full search, "+
+            str(len(self.Changes))+" layouts changed")
+        with OpenOutput(filename) as f:
+            f.write(str(len(self.Changes))+" directories whose layout has changed since the last run\n")
+            for url, old, new in self.Changes:
+                f.write("\n"+url+"\n")
+                for key in ("kind", "locator", "columns"):
+                    if old.get(key) != new.get(key):
+                        f.write("    "+key+": "+str(old.get(key))+"  -->  "+str(new.get(key))+"\n")
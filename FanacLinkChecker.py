@@ -0,0 +1,169 @@
+from typing import List, Dict, Iterable, Optional, Callable
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import urllib.parse
+import time
+import json
+import os
+import requests
+
+from FanzineIssueSpecPackage import FanzineIssueInfo
+
+from Log import Log
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# Check that issue URLs actually resolve
+# Each distinct URL gets a HEAD request.  The requests are made concurrently, but with a cap on the number in flight to
+#   any one host and a minimum interval between requests to it, so we don't hammer fanac.org.
+# Results are cached with a time-to-live so that a nightly run only re-checks links which are new or whose results are stale.
+# Only definite answers (successes and 4xx) get the full time-to-live.  No response or a 5xx is usually a passing problem
+#   at the server, so those get failureTtlSeconds, which by default means they are checked again on every run.
+
+LinkStatus=namedtuple("LinkStatus", "Status Checked Error")     # HTTP status (0 if no response), time checked, error text
+
+
+# ====================================================================================
+# Per-host limits: at most maxConcurrent requests in flight, started at least minInterval seconds apart
+class HostLimiter:
+    def __init__(self, maxConcurrent: int, minInterval: float):
+        self._semaphore=threading.BoundedSemaphore(maxConcurrent)
+        self._lock=threading.Lock()
+        self._minInterval=minInterval
+        self._next=0.0
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        with self._lock:
+            now=time.monotonic()
+            wait=self._next-now
+            self._next=max(now, self._next)+self._minInterval
+        if wait > 0:
+            time.sleep(wait)
+        return self
+
+    def __exit__(self, *args):
+        self._semaphore.release()
+
+
+# ====================================================================================
+class LinkChecker:
+    def __init__(self, cacheFilename: Optional[str]=None, ttlSeconds: float=7*24*3600, failureTtlSeconds: float=0, maxWorkers: int=16,
+                 perHostConcurrency: int=4, perHostInterval: float=0.1, timeout: float=10.0):
+        self._cacheFilename=cacheFilename
+        self._ttl=ttlSeconds
+        self._failureTtl=failureTtlSeconds
+        self._maxWorkers=maxWorkers
+        self._perHostConcurrency=perHostConcurrency
+        self._perHostInterval=perHostInterval
+        self._timeout=timeout
+        self._hosts: Dict[str, HostLimiter]={}
+        self._hostsLock=threading.Lock()
+        self._local=threading.local()       # Each worker thread gets its own requests.Session, which isn't thread-safe
+        self.Cache: Dict[str, LinkStatus]={}
+        self._LoadCache()
+
+    def _LoadCache(self) -> None:
+        if self._cacheFilename is None or not os.path.exists(self._cacheFilename):
+            return
+        try:
+            with open(self._cacheFilename, "r") as f:
+                self.Cache={url: LinkStatus(*val) for url, val in json.load(f).items()}
+        except (OSError, ValueError, TypeError) as e:
+            Log("LinkChecker: Ignoring unreadable cache "+self._cacheFilename+": "+str(e), isError=True)
+            self.Cache={}
+
+    def SaveCache(self) -> None:
+        if self._cacheFilename is None:
+            return
+        temp=self._cacheFilename+".tmp"
+        with open(temp, "w") as f:
+            json.dump({url: list(val) for url, val in self.Cache.items()}, f)
+        os.replace(temp, self._cacheFilename)
+
+    def _Limiter(self, url: str) -> HostLimiter:
+        host=urllib.parse.urlsplit(url).netloc.lower()
+        with self._hostsLock:
+            limiter=self._hosts.get(host)
+            if limiter is None:
+                limiter=HostLimiter(self._perHostConcurrency, self._perHostInterval)
+                self._hosts[host]=limiter
+        return limiter
+
+    def _Session(self) -> requests.Session:
+        session=getattr(self._local, "session", None)
+        if session is None:
+            session=requests.Session()
+            self._local.session=session
+        return session
+
+    # Check a single URL (no caching)
+    def CheckOne(self, url: str) -> LinkStatus:
+        with self._Limiter(url):
+            session=self._Session()
+            try:
+                r=session.head(url, allow_redirects=True, timeout=self._timeout)
+                if r.status_code in (405, 501):
+                    # Some servers don't do HEAD.  Fall back to a GET, but don't read the body.
+                    r=session.get(url, allow_redirects=True, timeout=self._timeout, stream=True)
+                    r.close()
+                return LinkStatus(r.status_code, time.time(), "")
+            except requests.RequestException as e:
+                return LinkStatus(0, time.time(), type(e).__name__+": "+str(e))
+
+    def IsFresh(self, url: str, now: float) -> bool:
+        status=self.Cache.get(url)
+        if status is None:
+            return False
+        ttl=self._failureTtl if status.Status == 0 or status.Status >= 500 else self._ttl
+        return now-status.Checked < ttl
+
+    # Check all the URLs, using cached results where they are still fresh
+    # Returns a dictionary of URL --> LinkStatus
+    def Check(self, urls: Iterable[str]) -> Dict[str, LinkStatus]:
+        urls=sorted(set(urls))
+        now=time.time()
+        stale=[url for url in urls if not self.IsFresh(url, now)]
+        Log("LinkChecker: "+str(len(urls))+" distinct links, "+str(len(stale))+" to be checked")
+
+        with ThreadPoolExecutor(max_workers=self._maxWorkers) as executor:
+            for url, status in zip(stale, executor.map(self.CheckOne, stale)):
+                self.Cache[url]=status
+        self.SaveCache()
+        return {url: self.Cache[url] for url in urls}
+
+
+def IsBroken(status: LinkStatus) -> bool:
+    return status.Status == 0 or status.Status >= 400
+
+
+# -------------------------------------------------------------------------
+# The URL which actually gets fetched: the #page=nnn (or other) fragment is for the browser, not the server
+def FetchableURL(url: str) -> str:
+    return urllib.parse.urldefrag(url)[0]
+
+
+# ====================================================================================
+# Check the links of all the issues and write a report listing the broken ones
+def CheckIssueLinks(fanacIssueList: List[FanzineIssueInfo], fURL: Callable[[FanzineIssueInfo], Optional[str]], reportFilename: str,
+                    checker: LinkChecker) -> Dict[str, LinkStatus]:
+    issuesByURL: Dict[str, List[FanzineIssueInfo]]={}
+    for fz in fanacIssueList:
+        url=fURL(fz)
+        if url is None:
+            continue
+        issuesByURL.setdefault(FetchableURL(url), []).append(fz)
+
+    results=checker.Check(issuesByURL.keys())
+
+    broken=[url for url, status in results.items() if IsBroken(status)]
+    Log("LinkChecker: "+str(len(broken))+" broken links found")
+    with OpenOutput(reportFilename) as f:
+        f.write(str(len(broken))+" broken links out of "+str(len(results))+" checked\n\n")
+        for url in broken:
+            status=results[url]
+            f.write(url+"    "+(str(status.Status) if status.Status != 0 else status.Error)+"\n")
+            for fz in issuesByURL[url]:
+                f.write("      "+fz.SeriesName+": "+str(fz.IssueName)+"\n")
+    return results
@@ -0,0 +1,120 @@
+from typing import List, Dict, Optional
+import subprocess
+import argparse
+import tempfile
+import time
+import sys
+import os
+
+from Log import Log, LogOpen, LogClose
+from FanacStandIn import StandInServer, RequestRecord, BuildSyntheticSite, faultProfiles
+from FanacChangeFeed import ReadPreviousIssues, BuildChangeFeed
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# Run the complete crawl against the fanac.org stand-in under each of a set of fault profiles and report how it did:
+#   throughput (pages per second), the latency of the requests (median and tail), the faults injected and the requests
+#   abandoned, and correctness: the issues missing, extra or changed compared to the crawl under the "clean" profile.
+# The crawl is FanacAnalyser.py run as a separate process with --site pointing at the stand-in, so it is exactly the
+#   production crawl.  Each run gets its own output directory, so nothing (layout profiles, history, ...) carries over.
+
+def Percentile(values: List[float], fraction: float) -> float:
+    if len(values) == 0:
+        return 0.0
+    values=sorted(values)
+    return values[min(len(values)-1, int(fraction*len(values)))]
+
+
+# -------------------------------------------------------------------------
+# Run the crawl once against a server using profileName and return the measurements as a dictionary
+def RunProfile(profileName: str, siteRoot: str, workDir: str, seed: int, timeout: float) -> Dict:
+    server=StandInServer(siteRoot, faultProfiles[profileName], seed=seed)
+    server.Start()
+    outputDir=os.path.join(workDir, profileName)
+    Log("FanacLoadTest: Crawling "+server.URL+" with the '"+profileName+"' profile into "+outputDir)
+    start=time.monotonic()
+    try:
+        result=subprocess.run([sys.executable, "FanacAnalyser.py", outputDir, "--site", server.URL],
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=timeout,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        returnCode=result.returncode
+        if returnCode != 0:
+            Log("FanacLoadTest: The crawl failed: "+result.stderr.decode("utf-8", errors="replace")[-2000:], isError=True)
+    except subprocess.TimeoutExpired:
+        returnCode=None
+        Log("FanacLoadTest: The crawl timed out after "+str(timeout)+" seconds", isError=True)
+    elapsed=time.monotonic()-start
+    server.Stop()
+
+    requests: List[RequestRecord]=list(server.Requests)
+    seconds=[r.Seconds for r in requests]
+    faults: Dict[str, int]={}
+    for r in requests:
+        if r.Fault != "":
+            faults[r.Fault]=faults.get(r.Fault, 0)+1
+    snapshotFilename=os.path.join(outputDir, "Fanac crawl.snapshot")
+    return {"profile": profileName,
+            "returnCode": returnCode,
+            "elapsed": elapsed,
+            "requests": len(requests),
+            "ok": len([r for r in requests if r.Status == 200 and not r.Aborted]),
+            "aborted": len([r for r in requests if r.Aborted]),
+            "faults": faults,
+            "p50": Percentile(seconds, 0.5), "p95": Percentile(seconds, 0.95), "p99": Percentile(seconds, 0.99),
+            "max": max(seconds) if len(seconds) > 0 else 0.0,
+            "issues": ReadPreviousIssues(snapshotFilename) if os.path.exists(snapshotFilename) else {}}
+
+
+# ====================================================================================
+def WriteLoadTestReport(filename: str, results: List[Dict], expectedIssues: Optional[int]) -> None:
+    baseline=results[0]
+    with OpenOutput(filename) as f:
+        f.write("Crawl load and fault test\n")
+        if expectedIssues is not None:
+            f.write("The synthetic site has "+str(expectedIssues)+" issues\n")
+        f.write("Correctness is relative to the crawl with the '"+baseline["profile"]+"' profile\n\n")
+        f.write("{:<11} {:>8} {:>9} {:>9} {:>7} {:>7} {:>7} {:>7} {:>8} {:>8} {:>8} {:>8}\n".format(
+            "profile", "seconds", "requests", "pages/s", "p50", "p95", "p99", "max", "aborted", "issues", "missing", "changed"))
+        for r in results:
+            feed=BuildChangeFeed(baseline["issues"], r["issues"])
+            f.write("{:<11} {:>8.1f} {:>9} {:>9.2f} {:>7.3f} {:>7.3f} {:>7.3f} {:>7.3f} {:>8} {:>8} {:>8} {:>8}\n".format(
+                r["profile"], r["elapsed"], r["requests"], r["ok"]/r["elapsed"] if r["elapsed"] > 0 else 0.0,
+                r["p50"], r["p95"], r["p99"], r["max"], r["aborted"], len(r["issues"]),
+                feed["counts"]["removed"], feed["counts"]["changed"]+feed["counts"]["added"]))
+        f.write("\n")
+        for r in results:
+            faults=", ".join(k+": "+str(v) for k, v in sorted(r["faults"].items()))
+            status="timed out" if r["returnCode"] is None else "exit code "+str(r["returnCode"])
+            f.write(r["profile"]+": "+status+(";  faults injected: "+faults if len(faults) > 0 else "")+"\n")
+
+
+# ====================================================================================
+# Main
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Run the fanac.org crawl against a local stand-in under a set of fault profiles")
+    parser.add_argument("--tree", default=None, help="A recorded copy of the fanac.org tree to serve (default: build a synthetic one)")
+    parser.add_argument("--series", type=int, default=200, help="Number of series in the synthetic site")
+    parser.add_argument("--issues", type=int, default=25, help="Number of issues per series in the synthetic site")
+    parser.add_argument("--profiles", default=",".join(faultProfiles.keys()), help="Comma-separated fault profiles to run; the first is the baseline")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=3600, help="Seconds to allow each crawl")
+    parser.add_argument("--report", default="Load test report.txt")
+    args=parser.parse_args()
+
+    LogOpen("Log - Fanac Load Test Log.txt", "Log - Fanac Load Test Error Log.txt")
+    profileNames=[p.strip() for p in args.profiles.split(",") if p.strip() != ""]
+    unknown=[p for p in profileNames if p not in faultProfiles]
+    if len(unknown) > 0:
+        Log("***Fatal Error: Unknown fault profiles: "+", ".join(unknown), isError=True)
+        exit(1)
+
+    with tempfile.TemporaryDirectory() as workDir:
+        siteRoot=args.tree
+        expected=None
+        if siteRoot is None:
+            siteRoot=os.path.join(workDir, "site")
+            expected=BuildSyntheticSite(siteRoot, args.series, args.issues, args.seed)
+        results=[RunProfile(name, siteRoot, workDir, args.seed, args.timeout) for name in profileNames]
+        WriteLoadTestReport(args.report, results, expected)
+    Log("FanacLoadTest has Completed.")
+    LogClose()
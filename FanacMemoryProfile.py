@@ -0,0 +1,80 @@
+from typing import List, Optional, Tuple
+from collections import namedtuple
+import tracemalloc
+import sys
+
+from Log import Log
+from FanacOutput import OpenOutput
+
+# resource is Unix-only.  Without it we report the tracemalloc figures but not the RSS.
+try:
+    import resource
+except ImportError:
+    resource=None
+
+# ====================================================================================
+# Opt-in memory profiling by pipeline phase
+# At each phase boundary we record the memory Python has allocated now and at its peak during the phase (from tracemalloc),
+#   the peak RSS of the process so far, and the allocation sites which grew the most during the phase (by comparing
+#   tracemalloc snapshots).
+# tracemalloc slows the run down considerably, so this is only done when asked for.
+
+PhaseMemory=namedtuple("PhaseMemory", "Name Current Peak PeakRSS TopGrowth")     # TopGrowth is a list of (size change, count change, site)
+
+
+def PeakRSS() -> Optional[int]:
+    if resource is None:
+        return None
+    rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss*1024     # macOS reports bytes, Linux KB
+
+
+def MB(n: Optional[int]) -> str:
+    return "{:,.1f} MB".format(n/(1024*1024)) if n is not None else "n/a"
+
+
+class MemoryProfiler:
+    def __init__(self, enabled: bool, topSites: int=15):
+        self.Enabled=enabled
+        self._topSites=topSites
+        self._previous: Optional[tracemalloc.Snapshot]=None
+        self.Phases: List[PhaseMemory]=[]
+        if enabled:
+            tracemalloc.start()
+            self._previous=self._Snapshot()
+
+    def _Snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                                          tracemalloc.Filter(False, "<frozen importlib._bootstrap>")])
+
+    # Mark the end of a phase
+    def Phase(self, name: str) -> None:
+        if not self.Enabled:
+            return
+        current, peak=tracemalloc.get_traced_memory()
+        snapshot=self._Snapshot()
+        growth: List[Tuple[int, int, str]]=[]
+        for stat in snapshot.compare_to(self._previous, "lineno")[:self._topSites]:
+            frame=stat.traceback[0]
+            growth.append((stat.size_diff, stat.count_diff, frame.filename+":"+str(frame.lineno)))
+        self._previous=snapshot
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()       # So the next phase's peak is its own
+        self.Phases.append(PhaseMemory(name, current, peak, PeakRSS(), growth))
+        Log("MemoryProfiler: "+name+": current "+MB(current)+", peak "+MB(peak)+", peak RSS "+MB(PeakRSS()))
+
+    # -------------------------------------------------------------------------
+    def WriteReport(self, filename: str) -> None:
+        if not self.Enabled:
+            return
+        with OpenOutput(filename) as f:
+            f.write("Memory use by phase\n")
+            if not hasattr(tracemalloc, "reset_peak"):
+                f.write("(This Python can't reset the tracemalloc peak, so each phase's peak includes the phases before it)\n")
+            f.write("\n{:<36} {:>14} {:>14} {:>14}\n".format("phase", "allocated", "phase peak", "peak RSS"))
+            for p in self.Phases:
+                f.write("{:<36} {:>14} {:>14} {:>14}\n".format(p.Name, MB(p.Current), MB(p.Peak), MB(p.PeakRSS)))
+            for p in self.Phases:
+                f.write("\n"+p.Name+": the allocation sites which grew the most\n")
+                for size, count, site in p.TopGrowth:
+                    f.write("    {:>+14,} bytes {:>+10,} blocks   {}\n".format(size, count, site))
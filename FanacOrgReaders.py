@@ -1,5 +1,6 @@
-from typing import Union, Tuple, Optional, List, Dict
+from typing import Union, Tuple, Optional, List, Dict, Iterator
 from contextlib import suppress
+from functools import lru_cache
 from difflib import SequenceMatcher
 from bs4 import BeautifulSoup
 from bs4 import NavigableString
@@ -7,29 +8,54 @@ from bs4 import Tag
 import requests
 import re
 import urllib.parse
+import posixpath
 import os
+import time
 
 
 from FanzineIssueSpecPackage import FanzineIssueSpec, FanzineDate, FanzineSerial, FanzineIssueInfo, FanzineSeriesInfo
 from FanzineIssueSpecPackage import ExtractSerialNumber
 
 from Log import Log, LogSetHeader
-from HelpersPackage import ReadList, FindBracketedText
-from HelpersPackage import RelPathToURL, ChangeFileInURL, ChangeNBSPToSpace, RemoveAllHTMLTags2
+from FanacRecords import CanonicalIssueURL, CanonicalURL, StampIssue
+from FanacLayoutProfiles import LayoutProfiles
+from FanacCheckpoint import CrawlJournal
+from FanacScheduler import CrawlSchedule
+from FanacControl import Control, ControlList
+from FanacParseStats import ParseStats
+from HelpersPackage import RelPathToURL, ChangeFileInURL, ChangeNBSPToSpace
 from HelpersPackage import CanonicizeColumnHeaders
 from HelpersPackage import IsInt
 
 # ============================================================================================
 def ReadFanacFanzineIssues(fanacDirectories: List[Tuple[str, str]]) -> List[FanzineIssueInfo]:
+    fanacIssueInfo: List[FanzineIssueInfo]=[]
+    for issues in ReadFanacFanzineIssuesStreaming(fanacDirectories):
+        fanacIssueInfo.extend(issues)
+    return fanacIssueInfo
+
+
+# ============================================================================================
+# Read index.html files on fanac.org, yielding the list of issues for each series as soon as its page has been read
+# If a journal is supplied, each directory's issues are checkpointed to it, and directories it already has are replayed from it
+# If a schedule is supplied, each directory's crawl is recorded in its history.  If the schedule has a time budget, the
+#   directories are crawled in priority order and, once the budget is spent, the rest are filled in from the last snapshot.
+def ReadFanacFanzineIssuesStreaming(fanacDirectories: List[Tuple[str, str]], journal: Optional[CrawlJournal]=None,
+                                    schedule: Optional[CrawlSchedule]=None) -> Iterator[List[FanzineIssueInfo]]:
     # Read index.html files on fanac.org
     # We do this by reading the fanzines/<name>/index.html file and then decoding the table in it.
     # What we get out of this is a list of fanzines with name, URL, and issue info.
-    # Loop over the list of all fanzines, building up a list of those on fanac.org
+    # Loop over the list of all fanzines, yielding the issues of each one found on fanac.org
     Log("----Begin reading index.html files on fanac.org")
 
-    fanacIssueInfo: List[FanzineIssueInfo]=[]
+    global droppedDuplicates
+    deduper=IssueDeduper()
+    droppedDuplicates=deduper.Dropped
 
-    fanacDirectories.sort(key=lambda tup: tup[1])
+    if schedule is not None and schedule.Budgeted:
+        fanacDirectories=schedule.Order(fanacDirectories)
+    else:
+        fanacDirectories.sort(key=lambda tup: tup[1])
     for title, dirname in fanacDirectories:
         # This bit allows us to skip all *but* the fanzines in unskippers. It's for debugging purposes only
         unskippers=[
@@ -70,22 +96,13 @@ def ReadFanacFanzineIssues(fanacDirectories: List[Tuple[str, str]]) -> List[Fanz
 
         LogSetHeader("'"+dirname+"'      '"+title+"'")
 
-        global skippers  # Not actually used anywhere else, but for performance sake, should be read once and retained
-        try:
-            skippers
-        except NameError:
-            skippers=ReadList("control-skippers.txt")
-        if dirname in skippers:
+        control=Control()
+        if dirname in control.Skippers:
             Log("...Skipping because it is in skippers: "+dirname, isError=True)
             continue
 
         # Some fanzines are listed in our tables, but are offsite and do not even have an index table on fanac.org
-        global offsite  # Not actually used anywhere else, but for performance sake, should be read once and retained
-        try:
-            offsite
-        except NameError:
-            offsite=ReadList("control-offsite.txt")
-        if dirname in offsite:
+        if dirname in control.Offsite:
             Log("...Skipping because it is in offsite: "+dirname)
             continue
 
@@ -107,33 +124,180 @@ def ReadFanacFanzineIssues(fanacDirectories: List[Tuple[str, str]]) -> List[Fanz
         #     Log("***skipped because in the fan_funds or fanzines/Miscellaneous directories: "+url, isError=True)
         #     continue
 
-        fanacIssueInfo.extend(ReadAndAppendFanacFanzineIndexPage(title, url))
-
-    # Now fanacIssueList is a list of all the issues of fanzines on fanac.org
+        if journal is not None and journal.IsDone(dirname):
+            # This directory was completed by an earlier, interrupted run of this crawl
+            Log("...Replaying from checkpoint: "+dirname)
+            issues=journal.Issues(dirname)
+        elif schedule is not None and schedule.OutOfTime():
+            # We're out of time: Use what we had last time.  (This doesn't go in the journal, since it wasn't really read.)
+            issues=schedule.Fallback(dirname, url)
+        else:
+            start=time.perf_counter()
+            issues=ReadAndAppendFanacFanzineIndexPage(title, url)
+            if schedule is not None:
+                schedule.Record(dirname, issues, time.perf_counter()-start)
+            if journal is not None:
+                journal.Record(dirname, issues)
+
+        # Duplicates are dropped as we go, so the caller never sees more than one copy of an issue
+        issues=deduper.Filter(issues)
+        if len(issues) > 0:
+            yield issues
+
+    # Last, the issues which were only listed from some other series' directory
+    issues=deduper.Flush()
+    if len(issues) > 0:
+        yield issues
+
+    # Now we have yielded all the issues of fanzines on fanac.org
+    if journal is not None:
+        journal.Complete()
     Log("----Done reading index.html files on fanac.org")
+    Log("----"+str(len(droppedDuplicates))+" duplicate issues dropped")
 
-    fanacIssueInfo=RemoveDuplicates(fanacIssueInfo)
 
-    return fanacIssueInfo
+#=============================================================================================
+# Drop duplicate issues as they are read.
+# Two issues are duplicates if they resolve to the same canonical URL.  This catches exact repeats within a series,
+#   the same issue reached through a different series directory (e.g., a FAPA-Misc reference) and external-looking links
+#   (http:, fanac.org without www, etc.) which actually point at the same file on fanac.org.
+# Which copy is kept doesn't depend on the order the directories are crawled in:
+#   A copy listed in the directory which actually holds the file is preferred, and otherwise the one with the lowest (DirURL, PageName).
+#   Copies listed from some other directory are held back until the end of the crawl (see Flush()), since the directory
+#   which holds the file may not have been read yet.
+# Issues which don't point to anything (PageName is None) are dropped, since they have no URL to compare.
+# The copies which lose are recorded in Dropped as (dropped issue, issue kept in its place).
+class IssueDeduper:
+    def __init__(self):
+        self._seen: Dict[str, FanzineIssueInfo]={}          # Issues already passed on, which are in their own directory
+        self._pending: Dict[str, FanzineIssueInfo]={}       # Issues from other directories, held back until Flush()
+        self.Dropped: List[Tuple[FanzineIssueInfo, FanzineIssueInfo]]=[]
+
+    def Filter(self, fanzineList: List[FanzineIssueInfo]) -> List[FanzineIssueInfo]:
+        chosen: Dict[str, FanzineIssueInfo]={}
+        for fz in fanzineList:
+            if fz.PageName is None:
+                continue
+            key=CanonicalIssueURL(fz)
+            if not IsInOwnDirectory(fz):
+                self._Choose(self._pending, key, fz)
+            elif key in self._seen:
+                self.Dropped.append((fz, self._seen[key]))
+            else:
+                self._Choose(chosen, key, fz)
+
+        kept: List[FanzineIssueInfo]=[]
+        for fz in fanzineList:
+            if fz.PageName is None:
+                continue
+            key=CanonicalIssueURL(fz)
+            if chosen.get(key) is fz:
+                del chosen[key]
+                self._seen[key]=fz
+                if key in self._pending:
+                    self.Dropped.append((self._pending.pop(key), fz))
+                kept.append(fz)
+        return kept
+
+    # The issues from other directories whose file wasn't listed in its own directory
+    def Flush(self) -> List[FanzineIssueInfo]:
+        kept: List[FanzineIssueInfo]=[]
+        for key, fz in self._pending.items():
+            if key in self._seen:
+                self.Dropped.append((fz, self._seen[key]))
+            else:
+                self._seen[key]=fz
+                kept.append(fz)
+        self._pending={}
+        return kept
+
+    # Put fz in choices[key] unless what is already there should be preferred to it
+    def _Choose(self, choices: Dict[str, FanzineIssueInfo], key: str, fz: FanzineIssueInfo) -> None:
+        current=choices.get(key)
+        if current is None:
+            choices[key]=fz
+        elif (fz.DirURL or "", fz.PageName) < (current.DirURL or "", current.PageName):
+            self.Dropped.append((current, fz))
+            choices[key]=fz
+        else:
+            self.Dropped.append((fz, current))
+
+
+# -------------------------------------------------------------------------
+# Is the file an issue points to in the series directory it was listed in?
+def IsInOwnDirectory(fz: FanzineIssueInfo) -> bool:
+    if fz.DirURL is None:
+        return False
+    issue=urllib.parse.urlsplit(CanonicalIssueURL(fz))
+    directory=urllib.parse.urlsplit(CanonicalURL(fz.DirURL))
+    return issue.netloc == directory.netloc and posixpath.dirname(issue.path) == directory.path.rstrip("/")
+
+# The duplicates dropped by the last crawl
+droppedDuplicates: List[Tuple[FanzineIssueInfo, FanzineIssueInfo]]=[]
 
 
 #=============================================================================================
 # Remove the duplicates from a fanzine list
 def RemoveDuplicates(fanzineList: List[FanzineIssueInfo]) -> List[FanzineIssueInfo]:
-    # Sort in place on fanzine's Directory's URL followed by file name
-    fanzineList.sort(key=lambda fz: fz.PageName if fz.PageName is not None else "")
-    fanzineList.sort(key=lambda fz: fz.DirURL if fz.DirURL is not None else "")
-
-#TODO Drop external links which duplicate Fanac.org
-    # Any duplicates will be adjacent, so search for adjacent directoryURL+URL
-    last=""
-    dedupedList: List[FanzineIssueInfo]=[]
-    for fz in fanzineList:
-        this=fz.DirURL+(fz.PageName if fz.PageName is not None else "")
-        if this != last:
-            dedupedList.append(fz)
-        last=this
-    return dedupedList
+    deduper=IssueDeduper()
+    return deduper.Filter(fanzineList)+deduper.Flush()
+
+
+#=============================================================================================
+# The layout profiles used by the crawl (None means don't use any)
+layoutProfiles: Optional[LayoutProfiles]=None
+
+def SetLayoutProfiles(profiles: Optional[LayoutProfiles]) -> None:
+    global layoutProfiles
+    layoutProfiles=profiles
+
+
+#=============================================================================================
+# Which paths the parse took through its fallback heuristics, and what they cost
+parseStats=ParseStats()
+
+
+#=============================================================================================
+# The crawl can be pointed at a stand-in for fanac.org (see FanacStandIn.py) instead of the live site
+# The URLs recorded in the results are still the fanac.org URLs: only the fetches go to the stand-in.
+siteOverride: Optional[str]=None
+
+def SetSiteOverride(site: Optional[str]) -> None:
+    global siteOverride
+    siteOverride=site.rstrip("/") if site is not None else None
+
+
+# Return the URL which should actually be fetched to get url
+def SiteURL(url: str) -> str:
+    if siteOverride is None:
+        return url
+    u=urllib.parse.urlsplit(url)
+    if u.netloc.lower() not in ("fanac.org", "www.fanac.org"):
+        return url
+    return siteOverride+urllib.parse.urlunsplit(("", "", u.path, u.query, ""))
+
+
+#=============================================================================================
+# The same few column names get canonicized over and over, so remember the results
+@lru_cache(maxsize=None)
+def CanonicalColumnName(name: str) -> str:
+    return CanonicizeColumnHeaders(name)
+
+
+# A table's list of (canonicized) column headers together with a map from header to column number,
+#   so finding a column is a dictionary lookup rather than a scan canonicizing every header in turn
+# index, if given, is a map saved from an earlier ColumnMap of the same headers
+class ColumnMap(list):
+    def __init__(self, headers: List[str], index: Optional[Dict[str, int]]=None):
+        super().__init__(headers)
+        self.HeaderText: Optional[str]=None     # The text of the header row the map was made from
+        self.Saved=False                        # Was it taken from the directory's saved layout?
+        if index is not None:
+            self.Index: Dict[str, int]=dict(index)
+            return
+        self.Index={}
+        for i, h in enumerate(headers):
+            self.Index.setdefault(CanonicalColumnName(h), i)
 
 
 #=============================================================================================
@@ -141,6 +305,16 @@ def RemoveDuplicates(fanzineList: List[FanzineIssueInfo]) -> List[FanzineIssueIn
 # If cellname is a list of names, try them all and return the first that hits
 def GetCellValueByColHeader(columnHeaders: list, row: List[Tuple[str, str]], cellnames: Union[str, List[str]]) -> Tuple[str, str]:
 
+    if isinstance(columnHeaders, ColumnMap):
+        # The leftmost column matching any of the names wins, just as below
+        names=cellnames if type(cellnames) is list else [cellnames]
+        cols=[columnHeaders.Index.get(CanonicalColumnName(cn)) for cn in names]
+        cols=[c for c in cols if c is not None]
+        if len(cols) > 0:
+            i=min(cols)
+            return ChangeNBSPToSpace(row[i][0]), row[i][1]
+        return "", ""
+
     if type(cellnames) is list:
         for i in range(0, len(columnHeaders)):
             for cn in cellnames:
@@ -160,11 +334,14 @@ def GetCellValueByColHeader(columnHeaders: list, row: List[Tuple[str, str]], cel
 def ExtractDate(columnHeaders: List[str], row: List[Tuple[str, str]]) -> FanzineDate:
 
     # Does this have a Date column?  If so, that's all we need. (I hope...)
+    start=time.perf_counter()
     dateText=GetCellValueByColHeader(columnHeaders, row, "Date")[0]
     if dateText is not None and len(dateText) > 0:
         # Get the date
         with suppress(Exception):
-            return FanzineDate().Match(dateText)
+            fd=FanzineDate().Match(dateText)
+            parseStats.Count("ExtractDate", "date column", time.perf_counter()-start)
+            return fd
 
     # Next, take the various parts and assemble them and try to interpret the result using the FanzineDate() parser
     yearText=GetCellValueByColHeader(columnHeaders, row, "Year")[0]
@@ -186,6 +363,7 @@ def ExtractDate(columnHeaders: List[str], row: List[Tuple[str, str]]) -> Fanzine
         if constructedDate is not None:
             fd=FanzineDate().Match(constructedDate)
             if not fd.IsEmpty():
+                parseStats.Count("ExtractDate", "constructed date", time.perf_counter()-start)
                 return fd
 
     # Well, that didn't work.
@@ -195,6 +373,7 @@ def ExtractDate(columnHeaders: List[str], row: List[Tuple[str, str]]) -> Fanzine
     # Try to build up a FanzineDate "by hand", so to speak
     fd=FanzineDate(Year=yearText, MonthText=monthText)
     Log("By hand: "+str(fd))
+    parseStats.Count("ExtractDate", "by hand", time.perf_counter()-start)
     return fd
 
 
@@ -254,14 +433,17 @@ def FindIssueCell(columnHeaders: List[str], row: List[Tuple[str, str]]) -> Tuple
 # Scan the row and locate the issue cell, title and href and return them as a tuple
 def ExtractHrefAndTitle(columnHeaders: List[str], row: List[Tuple[str, str]]) -> Tuple[str, str]:
 
+    start=time.perf_counter()
     issueCell=FindIssueCell(columnHeaders, row)
 
     # If necessary, separate the href and the name
     if issueCell[1] != "":
+        parseStats.Count("ExtractHrefAndTitle", "link in issue cell", time.perf_counter()-start)
         return issueCell
     name=issueCell[0]      # issueCell is just the name
 
     if name is None:
+        parseStats.Count("ExtractHrefAndTitle", "no issue cell", time.perf_counter()-start)
         return "", ""
 
     # Sometimes the title of the fanzine is in one column and the hyperlink to the issue in another.
@@ -269,57 +451,104 @@ def ExtractHrefAndTitle(columnHeaders: List[str], row: List[Tuple[str, str]]) ->
     # We return the name from the issue cell and the hyperlink from the other cell
     for i in range(0, len(columnHeaders)):
         if row[i][1] != "":
+            parseStats.Count("ExtractHrefAndTitle", "link in another cell", time.perf_counter()-start)
             return name, row[i][1]
 
+    parseStats.Count("ExtractHrefAndTitle", "no link", time.perf_counter()-start)
     return name, ""     # No hyperlink found
 
 
 # ============================================================================================
-def ExtractCountry(h: str) -> str:
-    temp=FindBracketedText(h, "fanac-type")
-    if temp[0] is None or len(temp[0]) == 0:
+# The patterns used to pick a page apart.  They are compiled once rather than on every call.
+countryColonPattern=re.compile(r"\s*Country:\s*([a-zA-Z ]+)")
+countryCityPattern=re.compile(r"\s*([a-zA-Z. ]+):([a-zA-Z. ]*)[,]?\s*([a-zA-Z. ]?)")
+dateRangePattern=re.compile(r"[0-9-\?]")
+biggieLinkPattern=re.compile(r"^[a-zA-Z0-9\-_]*.html$")
+
+
+# ============================================================================================
+# Extract the country from the text of the page's <fanac-type> block
+def ExtractCountry(fanacType: Optional[str]) -> str:
+    start=time.perf_counter()
+    if fanacType is None or len(fanacType) == 0:
+        parseStats.Count("ExtractCountry", "no fanac-type block", time.perf_counter()-start)
         return ""
 
     # There are two formats for this text:
     #       Country: <country>
     #       <country>:<city>, <state>
-    temp=RemoveAllHTMLTags2(temp[0])
 
     # Look for "Country: <country>
-    m=re.search("\s*Country:\s*([a-zA-Z ]+)", temp)
+    m=countryColonPattern.search(fanacType)
     if m is not None:
+        parseStats.Count("ExtractCountry", "Country: pattern", time.perf_counter()-start)
         return m.groups()[0]
 
     # Look for <country>:<state/city>
-    m=re.search("\s*([a-zA-Z. ]+):([a-zA-Z. ]*)[,]?\s*([a-zA-Z. ]?)", temp)
+    m=countryCityPattern.search(fanacType)
     if m is not None:
+        parseStats.Count("ExtractCountry", "country:city pattern", time.perf_counter()-start)
         return m.groups()[0]
 
+    parseStats.Count("ExtractCountry", "no country", time.perf_counter()-start)
     return ""
 
+
+# ============================================================================================
+# Everything we need from a page, gathered in a single walk over its parse tree:
+#   Tables          All the <table> tags, in document order, for LocateIndexTable
+#   H2              The first <h2> block
+#   H2Tokens        The text fragments of the first <h2> block (what lies between its tags), stripped, with empty ones dropped
+#   FanacType       The text of the <fanac-type> block (where the country lives), or None
+#   IsNewszine      True if the first <h2> block marks this as a Newszine
+#   Links           The hrefs of all the <a> tags
+# This replaces repeated soup.find_all("table") calls for each table-locating strategy and serializing the whole body
+#   to a string just to find the <fanac-type> block.
+class PageAnalysis:
+    def __init__(self, soup: BeautifulSoup):
+        self.Tables: List[Tag]=[]
+        self.H2: Optional[Tag]=None
+        self.FanacType: Optional[str]=None
+        self.Links: List[str]=[]
+
+        for tag in soup.descendants:
+            if not isinstance(tag, Tag):
+                continue
+            name=tag.name
+            if name == "table":
+                self.Tables.append(tag)
+            elif name == "a":
+                href=tag.attrs.get("href")      # Some pages have <A NAME="1"> tags which we need to ignore
+                if href is not None:
+                    self.Links.append(href)
+            elif name == "h2":
+                if self.H2 is None:
+                    self.H2=tag
+            elif name == "fanac-type":
+                if self.FanacType is None:
+                    self.FanacType=tag.get_text()
+
+        self.H2Tokens: List[str]=[]
+        self.IsNewszine=False
+        if self.H2 is not None:
+            self.H2Tokens=[t.strip() for t in self.H2.strings if len(t.strip()) > 0]
+            self.IsNewszine="Newszine" in self.H2.get_text()      # The whole text, since the word may be split across tags
+
+
 # ============================================================================================
 # Function to extract information from a fanac.org fanzine index.html page
 def ReadAndAppendFanacFanzineIndexPage(fanzineName: str, directoryUrl: str) -> List[FanzineIssueInfo]:
 
     Log("ReadAndAppendFanacFanzineIndexPage: "+fanzineName+"   "+directoryUrl)
+    parseStats.SetSeries(fanzineName)
 
     # Fanzines with only a single page rather than an index.
     # Note that these are directory names
-    global singletons   # Not actually used anywhere else, but for performance sake, should be read once and retained
-    try:
-        singletons
-    except NameError:
-        singletons=ReadList("control-singletons.txt")
+    control=Control()
 
     # We have some pages where we have a tree of pages with specially-flagged fanzine index tables at the leaf nodes.
     # If this is the root of one of them...
-    global specialBiggies   # Not actually used anywhere else, but for performance sake, should be read once and retained
-    try:
-        specialBiggies
-    except NameError:
-        specialBiggies=ReadList("control-specialBiggies.txt")
-
-    if fanzineName in specialBiggies:
+    if fanzineName in control.SpecialBiggies:
         return ReadSpecialBiggie(directoryUrl,fanzineName)
 
     # It looks like this is a single level directory.
@@ -327,22 +556,46 @@ def ReadAndAppendFanacFanzineIndexPage(fanzineName: str, directoryUrl: str) -> L
     if soup is None:
         return []
 
+    # We're done with the page once its issues have been extracted, so free the parse tree immediately rather than
+    # waiting for the garbage collector to get around to it
+    try:
+        return ReadFanacFanzineIndexSoup(fanzineName, directoryUrl, soup, control.Singletons)
+    finally:
+        soup.decompose()
+
+
+# ============================================================================================
+# Extract the issues from a fanac.org fanzine index.html page which has already been loaded
+def ReadFanacFanzineIndexSoup(fanzineName: str, directoryUrl: str, soup: BeautifulSoup, singletons: ControlList) -> List[FanzineIssueInfo]:
+
     # We need to handle singletons specially
     if directoryUrl.endswith(".html") or directoryUrl.endswith(".htm") or directoryUrl.split("/")[-1:][0] in singletons:
+        if layoutProfiles is not None:
+            layoutProfiles.Record(directoryUrl, "singleton")
         return ReadSingleton(directoryUrl, fanzineName, soup)
 
     # By elimination, this must be an ordinary page, so read it.
-    # Locate the Index Table on this page.
-    table=LocateIndexTable(directoryUrl, soup)
+    page=PageAnalysis(soup)
+
+    # Locate the Index Table on this page, trying first the way it was found last time
+    profile=layoutProfiles.Get(directoryUrl) if layoutProfiles is not None else None
+    if profile is None or profile.get("kind") != "table":
+        profile=None
+    table, locator=LocateIndexTableStrategy(directoryUrl, page, profile=profile)
     if table is None:
         return []
+    columnHeaders=ReadColumnHeaders(table, profile if profile is not None and locator == profile.get("locator") else None)
+    if layoutProfiles is not None:
+        if columnHeaders.Saved:
+            layoutProfiles.Hits+=1
+        else:
+            layoutProfiles.Misses+=1
+        layoutProfiles.Record(directoryUrl, "table", locator, list(columnHeaders), columnHeaders.HeaderText, columnHeaders.Index)
 
     # Check to see if this is marked as a Newszine
-    temp=soup.h2
-    isnewszines=False
-    if temp.text.find("Newszine") > -1:
+    isnewszines=page.IsNewszine
+    if isnewszines:
         Log(">>>>>> Newszine added: '"+fanzineName+"'")
-        isnewszines=True
 
     # Try to pull the editor information out of the page
     # The most common format (ignoring a scattering of <br>s) is
@@ -357,38 +610,30 @@ def ReadAndAppendFanacFanzineIndexPage(fanzineName: str, directoryUrl: str) -> L
     #   /H2
     #   /H2
     #...or something else...
-
-    h2s=str(soup.h2)
-    # Split on various flavors of <br> and <h2>
-    #pattern="<br>|</br>|<br/>|<BR>|</BR>|<BR/>|<h2>|</h2>|<h2/>|<H2>|</H2>|<H2/>"
-    pattern="<.+?>"
-    h2s=re.sub(pattern, "|", h2s)
-    h2s=h2s.split("|")
-    h2s=[h.strip() for h in h2s if len(h.strip()) > 0]
+    # We work with the text fragments of the H2 block, i.e., the bits between the <br>s and <h2>s
+    h2s=page.H2Tokens
 
     # Because of the sloppiness of fanac.org, sometime the fanzine name is picked up again here.
     # We ignore the first token if it is too similar to the fanzine name
-    if SequenceMatcher(None, h2s[0], fanzineName).ratio() > 0.7:
+    if len(h2s) > 0 and SequenceMatcher(None, h2s[0], fanzineName).ratio() > 0.7:
         h2s=h2s[1:]
 
     # The editor(s) names are usually the line or lines before the date range.
     # The date range is something like '1964' or '1964-1999' or '1964-1999?'
-    pattern="[0-9-\?]"
     editor=""
     for h in h2s:
-        if re.match(pattern, h):
+        if dateRangePattern.match(h):
             break
         if len(editor) > 0:
             editor+=", "
         editor+=h
 
-    html=str(soup.body)
-    country=ExtractCountry(html)
+    country=ExtractCountry(page.FanacType)
     if country == "":
         Log("No country found for "+fanzineName)
 
     # Walk the table and extract the fanzines in it
-    fiiList=ExtractFanzineIndexTableInfo(directoryUrl, fanzineName, table, country)
+    fiiList=ExtractFanzineIndexTableInfo(directoryUrl, fanzineName, table, country, columnHeaders)
 
     if len(fiiList) > 0:
         fsi=FanzineSeriesInfo(SeriesName=fiiList[0].SeriesName, DirURL=directoryUrl, Issuecount=0, Pagecount=0, Editor=editor, Country=country)
@@ -417,25 +662,25 @@ def ReadSpecialBiggie(directoryUrl: str, fanzineName: str) -> List[FanzineIssueI
     # Look for and interpret all flagged tables on this page, and look for links to subdirectories.
 
     # Scan for flagged tables on this page
-    table=LocateIndexTable(directoryUrl, soup, silence=True)
-    html=str(soup.body)
-    country=ExtractCountry(html)
+    page=PageAnalysis(soup)
+    table=LocateIndexTable(directoryUrl, page, silence=True)
+    country=ExtractCountry(page.FanacType)
     if country == "":
         Log("No country found for "+fanzineName)
     if table is not None:
         fiiList.extend(ExtractFanzineIndexTableInfo(directoryUrl, fanzineName, table, country))
 
     # Now look for hyperlinks deeper into the directory. (Hyperlinks going outside the directory are not interesting.)
-    links=soup.find_all("a")
-    for link in links:
+    # Free this page's tree before descending, so we don't hold a whole chain of trees in memory.
+    links=page.Links
+    soup.decompose()
+    for url in links:
         # If it's an html file it's probably worth investigating
-        if "href" in link.attrs.keys():     # Some pages have <A NAME="1"> tags which we need to ignore
-            url=link.attrs["href"]
-            m=re.match("^[a-zA-Z0-9\-_]*.html$", url)
-            if m is not None:
-                if url.startswith("index") or url.startswith("archive") or url.startswith("Bullsheet1-00") or url.startswith("Bullsheet2-00"):
-                    u=ChangeFileInURL(directoryUrl, url)
-                    fiiList.extend(ReadSpecialBiggie(u, fanzineName))
+        m=biggieLinkPattern.match(url)
+        if m is not None:
+            if url.startswith("index") or url.startswith("archive") or url.startswith("Bullsheet1-00") or url.startswith("Bullsheet2-00"):
+                u=ChangeFileInURL(directoryUrl, url)
+                fiiList.extend(ReadSpecialBiggie(u, fanzineName))
     return fiiList
 
 
@@ -447,25 +692,81 @@ def OpenSoup(directoryUrl: str) -> Optional[BeautifulSoup]:
     # * A singleton page
     # * The root of a tree with multiple Issue Index Pages
     Log("    opening "+directoryUrl, noNewLine=True)
+    fetchUrl=SiteURL(directoryUrl)
     try:
-        h=requests.get(directoryUrl, timeout=1)
+        body=FetchPage(fetchUrl, timeout=1)
     except:
         try:    # Do first retry
-            h=requests.get(directoryUrl, timeout=2)
+            body=FetchPage(fetchUrl, timeout=2)
         except:
             try:  # Do second retry
-                h=requests.get(directoryUrl, timeout=2)
+                body=FetchPage(fetchUrl, timeout=2)
             except:
                 Log("\n***OpenSoup failed because it didn't load: "+directoryUrl, isError=True)
                 return None
+    if body is None:
+        return None     # Not something we should be parsing: FetchPage has said why
     Log("...loaded", noNewLine=True)
 
     # Next, parse the page looking for the body
-    soup=BeautifulSoup(h.content, "lxml")   # "html.parser"
+    soup=BeautifulSoup(body, "lxml")   # "html.parser"
     Log("...BeautifulSoup opened")
     return soup
 
 
+#=====================================================================================
+# Download a page, streaming it so that we can stop as soon as we know it's not something we want to parse
+#   A page bigger than maxPageBytes is abandoned (as soon as its Content-Length or the bytes received say so)
+#   A response whose Content-Type isn't HTML, or whose first bytes are binary, is abandoned
+# Returns the body, or None if the page was abandoned.  Raises requests exceptions on network failures so the caller can retry.
+# (BeautifulSoup can't be fed a page incrementally, so the body is collected into a bounded buffer and parsed once it's complete.)
+maxPageBytes=8*1024*1024
+htmlContentTypes={"text/html", "application/xhtml+xml"}
+binarySignatures=(b"%PDF", b"PK\x03\x04", b"\x89PNG", b"\xff\xd8\xff", b"GIF8")
+wideBOMs=(b"\xff\xfe", b"\xfe\xff", b"\x00\x00\xfe\xff")     # UTF-16 LE (and UTF-32 LE, whose BOM starts the same way), UTF-16 BE, UTF-32 BE
+wideCharsetPattern=re.compile(r"charset\s*=\s*[\"']?utf-?(16|32)", re.IGNORECASE)
+fetchChunkBytes=64*1024
+
+def SetMaxPageBytes(limit: int) -> None:
+    global maxPageBytes
+    maxPageBytes=limit
+
+
+def FetchPage(url: str, timeout: float) -> Optional[bytes]:
+    with requests.get(url, timeout=timeout, stream=True) as h:
+        contentTypeHeader=h.headers.get("Content-Type", "")
+        contentType=contentTypeHeader.split(";")[0].strip().lower()
+        if contentType != "" and contentType not in htmlContentTypes:
+            Log("\n***FetchPage skipped "+url+" because its Content-Type is '"+contentType+"'", isError=True)
+            return None
+        length=h.headers.get("Content-Length")
+        if length is not None and IsInt(length) and int(length) > maxPageBytes:
+            Log("\n***FetchPage skipped "+url+" because it is "+length+" bytes long", isError=True)
+            return None
+
+        body=bytearray()
+        for chunk in h.iter_content(chunk_size=fetchChunkBytes):
+            if len(body) == 0 and IsBinary(chunk, contentTypeHeader):
+                Log("\n***FetchPage skipped "+url+" because it is a binary file", isError=True)
+                return None
+            body.extend(chunk)
+            if len(body) > maxPageBytes:
+                Log("\n***FetchPage skipped "+url+" because it is more than "+str(maxPageBytes)+" bytes long", isError=True)
+                return None
+        return bytes(body)
+
+
+# Does the start of a page look like a binary file rather than text?
+# NUL bytes are a sign of a binary file, except in UTF-16 and UTF-32 text, where they are everywhere.  So the NUL test is only made
+#   when neither the Content-Type nor a byte order mark says the page is in one of those.
+def IsBinary(start: bytes, contentTypeHeader: str) -> bool:
+    if start.startswith(binarySignatures):
+        return True
+    if start.startswith(wideBOMs) or wideCharsetPattern.search(contentTypeHeader) is not None:
+        return False
+    return b"\x00" in start[:1024]
+
+
 #=====================================================================================
 # Function to pull an href and the accompanying text from a Tag
 # The structure is "<a href='URL'>LINKTEXT</a>
@@ -481,7 +782,9 @@ def GetHrefAndTextFromTag(tag: Tag) -> Tuple[str, str]:
         except:
             return "Failed href in GetHrefAndTextFromTag()", ""
 
-    return tag.contents[0].string, href
+    # Return plain strs: A NavigableString drags its entire parse tree along with it
+    text=tag.contents[0].string
+    return (str(text) if text is not None else None), str(href)
 
 
 #======================================================================================
@@ -505,7 +808,7 @@ def ReadSingleton(directoryUrl: str, fanzineName: str, soup) -> List[FanzineIssu
         Log("***Failed to find date in <h2> block in singleton '"+directoryUrl+"'", isError=True)
         return []
     fis=FanzineIssueSpec(FD=date)
-    fii=FanzineIssueInfo(SeriesName=fanzineName, IssueName=content[0], DirURL=directoryUrl, PageName="", FIS=fis, Pagecount=0)
+    fii=StampIssue(FanzineIssueInfo(SeriesName=fanzineName, IssueName=str(content[0]), DirURL=directoryUrl, PageName="", FIS=fis, Pagecount=0))
     Log("   (singleton): "+str(fii))
     return [fii]
 
@@ -520,22 +823,45 @@ def RemoveNewlineRows(tags: List[Tag]) -> List[Tag]:
     return compressedTags
 
 
+#=========================================================================================
+# The text of the header row of a fanzine index table
+def HeaderRowText(table: Tag) -> str:
+    # The header column may have newline elements, so compress them out.
+    table.contents=[t for t in table.contents if not isinstance(t, NavigableString)]
+    if len(table.contents) == 0:
+        return ""
+    return table.contents[0].text.strip()
+
+
+# Read the column headers from the first row of a fanzine index table
+# If the directory's saved layout (profile) is given and its header row is unchanged, its saved column list and column
+#   map are used as they are, with no canonicizing at all
+def ReadColumnHeaders(table: Tag, profile: Optional[Dict]=None) -> ColumnMap:
+    # Create a composition of all columns. The header column may have newline eleemnts, so compress them out.
+    # Then compress out sizes in the actual column header, make them into a list, and then join the list separated by spaces
+    headerText=HeaderRowText(table)
+    if len(table.contents) == 0 or len(table.contents[0]) == 0:
+        Log("***FanacOrgReaders: No table column headers found. Skipped", isError=True)
+    if profile is not None and profile.get("headerText") == headerText and profile.get("columns") is not None and profile.get("index") is not None:
+        columnHeaders=ColumnMap(profile["columns"], profile["index"])
+        columnHeaders.Saved=True
+    else:
+        columnHeaders=ColumnMap([CanonicalColumnName(c) for c in headerText.split("\n")])
+    columnHeaders.HeaderText=headerText
+    return columnHeaders
+
+
 #=========================================================================================
 # Read a fanzine's page of any format
-def ExtractFanzineIndexTableInfo(directoryUrl: str, fanzineName: str, table: Tag, country: str) -> List[FanzineIssueInfo]:
+def ExtractFanzineIndexTableInfo(directoryUrl: str, fanzineName: str, table: Tag, country: str, columnHeaders: Optional[ColumnMap]=None) -> List[FanzineIssueInfo]:
 
     # OK, we probably have the issue table.  Now decode it.
     # The first row is the column headers
     # Subsequent rows are fanzine issue rows
     Log(directoryUrl+"\n")
 
-    # Create a composition of all columns. The header column may have newline eleemnts, so compress them out.
-    # Then compress out sizes in the actual column header, make them into a list, and then join the list separated by spaces
-    table.contents=[t for t in table.contents if not isinstance(t, NavigableString)]
-    if len(table.contents[0]) == 0:
-        Log("***FanacOrgReaders: No table column headers found. Skipped", isError=True)
-    columnHeaders=table.contents[0].text.strip().split("\n")
-    columnHeaders: List[str]=[CanonicizeColumnHeaders(c) for c in columnHeaders]
+    if columnHeaders is None:
+        columnHeaders=ReadColumnHeaders(table)
 
     # We need to pull the fanzine rows in from BeautifulSoup and save them in the same format for later analysis.
     # The format will be a list of rows
@@ -608,7 +934,7 @@ def ExtractFanzineIndexTableInfo(directoryUrl: str, fanzineName: str, table: Tag
             if fi.PageName is None:
                 urlT="*No PageName*"
             Log("Row "+str(iRow)+"  '"+str(fi.IssueName)+"'  ["+str(fi.FIS)+"]  "+urlT)
-            fiiList.append(fi)
+            fiiList.append(StampIssue(fi))
         else:
             Log(fanzineName+"      ***Can't handle "+dirUrl, isError=True)
 
@@ -616,12 +942,11 @@ def ExtractFanzineIndexTableInfo(directoryUrl: str, fanzineName: str, table: Tag
 
 
 #=====================================================================================
-# Function to search recursively for the table containing the fanzines listing
+# Function to search for the table containing the fanzines listing
 # flags is a dictionary of attributes and values to be matched, e.g., {"class" : "indextable", ...}
 # We must match all of them
-def LookForTable(soup: BeautifulSoup, flags: Dict[str, str]) -> Optional[Tag]:
+def LookForTable(tables: List[Tag], flags: Dict[str, str]) -> Optional[Tag]:
 
-    tables=soup.find_all("table")
     # Look through all tables on the page
     for table in tables:
         # If a table matches *all* of the flags, return the table
@@ -635,35 +960,48 @@ def LookForTable(soup: BeautifulSoup, flags: Dict[str, str]) -> Optional[Tag]:
 
 
 #===============================================================================
-# Locate a fanzine index table.
-def LocateIndexTable(directoryUrl: str, soup: BeautifulSoup, silence: bool=False) -> Optional[Tag]:
-
-    # Because the structures of the pages are so random, we need to search the body for the table.
+# The attributes which mark a fanzine index table, in the order they are tried
+indexTableFlags: List[Dict[str, str]]=[
     # *So far* nearly all of the tables have been headed by <table border="1" cellpadding="5">, so we look for that.
-    table=LookForTable(soup, {"border" : "1", "cellpadding" : "5"})
-    if table is not None:
-        return table
-
+    {"border" : "1", "cellpadding" : "5"},
     # A few cases have been tagged explicitly
-    table=LookForTable(soup, {"class" : "indextable"})
-    if table is not None:
-        return table
-
+    {"class" : "indextable"},
     # Then there's Peon...
-    table=LookForTable(soup, {"border" : "1", "cellpadding" : "3"})
-    if table is not None:
-        return table
-
+    {"border" : "1", "cellpadding" : "3"},
     # And Toto...
-    table=LookForTable(soup, {"border" : "1", "cellpadding" : "2"})
-    if table is not None:
-        return table
-
+    {"border" : "1", "cellpadding" : "2"},
     # Then there's Bable-On...
-    table=LookForTable(soup, {"cellpadding" : "10"})
-    if table is not None:
-        return table
+    {"cellpadding" : "10"},
+]
+
+# Locate a fanzine index table.
+def LocateIndexTable(directoryUrl: str, page: PageAnalysis, silence: bool=False) -> Optional[Tag]:
+    return LocateIndexTableStrategy(directoryUrl, page, silence)[0]
+
+
+# Locate a fanzine index table and return it along with the index (in indexTableFlags) of the strategy which found it
+# If the directory's saved layout (profile) is given, its strategy is tried alone first.  If that finds a table with the
+#   same header row as last time, it's the same table and we're done.  Otherwise the page has changed, and we do the
+#   full search in the normal order.
+def LocateIndexTableStrategy(directoryUrl: str, page: PageAnalysis, silence: bool=False, profile: Optional[Dict]=None) -> Tuple[Optional[Tag], Optional[int]]:
 
+    start=time.perf_counter()
+    preferred=profile.get("locator") if profile is not None else None
+    if preferred is not None and 0 <= preferred < len(indexTableFlags) and profile.get("headerText") is not None:
+        table=LookForTable(page.Tables, indexTableFlags[preferred])
+        if table is not None and HeaderRowText(table) == profile["headerText"]:
+            parseStats.Count("LocateIndexTable", "saved layout", time.perf_counter()-start)
+            return table, preferred
+
+    # Because the structures of the pages are so random, we need to search the body for the table.
+    # The page's tables were all collected in the one walk over the page, so trying each strategy is just a scan of that list.
+    for i, flags in enumerate(indexTableFlags):
+        table=LookForTable(page.Tables, flags)
+        if table is not None:
+            parseStats.Count("LocateIndexTable", "strategy "+str(i), time.perf_counter()-start)
+            return table, i
+
+    parseStats.Count("LocateIndexTable", "not found", time.perf_counter()-start)
     if not silence:
         Log("***failed because BeautifulSoup found no index table in index.html: "+directoryUrl, isError=True)
-    return None
+    return None, None
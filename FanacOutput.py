@@ -0,0 +1,122 @@
+from typing import Dict, Optional
+import gzip
+import hashlib
+import io
+import os
+import re
+
+from Log import Log
+
+# brotli isn't part of the standard library.  If it's not installed, we just skip the .br files.
+try:
+    import brotli
+except ImportError:
+    brotli=None
+
+
+# ====================================================================================
+# Write precompressed .gz (and, if brotli is available, .br) siblings of a file so the web server can send them as-is
+def WritePrecompressed(filename: str) -> None:
+    with open(filename, "rb") as f:
+        content=f.read()
+
+    # mtime=0 keeps the .gz file identical from run to run when the content hasn't changed
+    with open(filename+".gz", "wb") as f:
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+
+    if brotli is not None:
+        with open(filename+".br", "wb") as f:
+            f.write(brotli.compress(content, quality=11))
+    elif os.path.exists(filename+".br"):
+        os.remove(filename+".br")    # Don't leave a stale one behind
+        Log("WritePrecompressed: brotli is not installed, so no .br file was written for "+filename)
+
+
+# Delete the precompressed siblings of a file, if there are any (e.g., when it is no longer being precompressed)
+def RemovePrecompressed(filename: str) -> None:
+    for sibling in (filename+".gz", filename+".br"):
+        if os.path.exists(sibling):
+            os.remove(sibling)
+            Log("RemovePrecompressed: removed "+sibling)
+
+
+# ====================================================================================
+# Output files which are only rewritten when their content has really changed.
+# Every run stamps its outputs with the time ("Indexed as of ...") or the date, so we hash the content with those stamps
+#   blanked out and leave the existing file alone (and its mtime unchanged) if the hash matches.
+# Only the stamps themselves are blanked: the "Indexed as of" line, and a date alone on the first line of a file (the decade
+#   counts report).  A date-only line anywhere else is content.
+# That way a sync of the output directory only transfers the files which actually changed.
+
+volatilePatterns=[re.compile("Indexed as of [0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}( EST)?"),
+                  re.compile("\\A[0-9]{4}-[0-9]{2}-[0-9]{2}\n")]
+
+# Filename --> True if it was rewritten, False if it was unchanged and left alone
+outputStatus: Dict[str, bool]={}
+
+
+def ContentHash(text: str) -> str:
+    for pattern in volatilePatterns:
+        text=pattern.sub("", text)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# -------------------------------------------------------------------------
+# Write text to filename unless the existing file differs from it only in its timestamps
+# Returns True if the file was written
+def WriteIfChanged(filename: str, text: str) -> bool:
+    if os.path.exists(filename):
+        try:
+            with open(filename, "r") as f:
+                old=f.read()
+            if ContentHash(old) == ContentHash(text):
+                outputStatus[filename]=False
+                return False
+        except (OSError, UnicodeDecodeError):
+            pass    # If we can't read it, we just overwrite it
+    with open(filename, "w") as f:
+        f.write(text)
+    outputStatus[filename]=True
+    return True
+
+
+# -------------------------------------------------------------------------
+# A text file which is buffered in memory and only written out (if changed) when closed
+# Use it just like the file returned by open(filename, "w"):
+#   with OpenOutput(filename) as f:
+#       f.write(...)
+class OutputFile(io.StringIO):
+    def __init__(self, filename: str):
+        super().__init__()
+        self.Filename=filename
+        self.Changed: Optional[bool]=None
+
+    def close(self) -> None:
+        if not self.closed:
+            self.Changed=WriteIfChanged(self.Filename, self.getvalue())
+        super().close()
+
+    # If the with block raised, the content is incomplete: Throw it away and leave the existing file alone
+    def __exit__(self, excType, excValue, traceback):
+        if excType is not None:
+            self.Changed=False
+            super().close()
+            return False
+        self.close()
+        return False
+
+
+def OpenOutput(filename: str) -> OutputFile:
+    return OutputFile(filename)
+
+
+# -------------------------------------------------------------------------
+# Log which output files were rewritten and which were left alone
+def LogOutputSummary() -> None:
+    changed=sorted([fn for fn, c in outputStatus.items() if c])
+    unchanged=sorted([fn for fn, c in outputStatus.items() if not c])
+    Log("Output files: "+str(len(changed))+" changed, "+str(len(unchanged))+" unchanged")
+    for fn in changed:
+        Log("   changed:   "+fn)
+    for fn in unchanged:
+        Log("   unchanged: "+fn)
@@ -0,0 +1,68 @@
+from typing import List, Dict, Tuple, Optional, Set
+
+from Log import Log
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# Counters for the paths the readers take through their fallback heuristics
+# Each stage of the parse (locating the index table, reading a row's date, ...) records which of its paths finally
+#   produced the result and how long the stage took getting there, both for the run as a whole and for the series being read.
+# The report then shows how often each fallback is needed, what it costs, and which series keep landing on the slow paths,
+#   so their pages can be fixed at the source.
+
+# The paths we expect most pages and rows to take.  Anything else is a fallback.
+fastPaths: Dict[str, Set[str]]={
+    "LocateIndexTable": {"saved layout", "strategy 0"},
+    "ExtractDate": {"date column", "constructed date"},
+    "ExtractCountry": {"Country: pattern"},
+    "ExtractHrefAndTitle": {"link in issue cell"},
+}
+
+
+class ParseStats:
+    def __init__(self):
+        self._series: Optional[str]=None
+        self.Counts: Dict[Tuple[str, str], int]={}                       # (stage, path) --> number of times taken
+        self.Seconds: Dict[Tuple[str, str], float]={}                    # (stage, path) --> total time
+        self.BySeries: Dict[str, Dict[Tuple[str, str], int]]={}          # series --> (stage, path) --> number of times taken
+
+    # Set the series whose page is being read, to which subsequent counts are charged
+    def SetSeries(self, series: Optional[str]) -> None:
+        self._series=series
+
+    def Count(self, stage: str, path: str, seconds: float=0.0) -> None:
+        key=(stage, path)
+        self.Counts[key]=self.Counts.get(key, 0)+1
+        self.Seconds[key]=self.Seconds.get(key, 0.0)+seconds
+        if self._series is not None:
+            counts=self.BySeries.setdefault(self._series, {})
+            counts[key]=counts.get(key, 0)+1
+
+    @staticmethod
+    def IsFallback(key: Tuple[str, str]) -> bool:
+        stage, path=key
+        return stage in fastPaths and path not in fastPaths[stage]
+
+    # -------------------------------------------------------------------------
+    def WriteReport(self, filename: str) -> None:
+        fallbacks=sum(n for key, n in self.Counts.items() if self.IsFallback(key))
+        Log("ParseStats: "+str(sum(self.Counts.values()))+" parse steps, "+str(fallbacks)+" on fallback paths")
+        with OpenOutput(filename) as f:
+            f.write("Paths taken through the readers' heuristics  (* = fallback path)\n\n")
+            f.write("{:<22} {:<26} {:>9} {:>11} {:>10}\n".format("stage", "path", "count", "total ms", "mean us"))
+            for key in sorted(self.Counts.keys()):
+                n=self.Counts[key]
+                seconds=self.Seconds[key]
+                f.write("{:<22} {:<26} {:>9,} {:>11.1f} {:>10.1f}\n".format(key[0], ("* " if self.IsFallback(key) else "  ")+key[1], n,
+                                                                            1000*seconds, 1e6*seconds/n if n > 0 else 0.0))
+
+            # The series which use the fallbacks most
+            series=[(sum(n for key, n in counts.items() if self.IsFallback(key)), name, counts) for name, counts in self.BySeries.items()]
+            series=[s for s in series if s[0] > 0]
+            series.sort(key=lambda s: (-s[0], s[1].lower()))
+            f.write("\n"+str(len(series))+" series took fallback paths\n")
+            for total, name, counts in series:
+                f.write("\n"+name+"    ("+str(total)+" fallbacks)\n")
+                for key in sorted(counts.keys()):
+                    if self.IsFallback(key):
+                        f.write("    "+key[0]+": "+key[1]+"  "+str(counts[key])+"\n")
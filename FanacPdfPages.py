@@ -0,0 +1,296 @@
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+import threading
+import urllib.parse
+import json
+import os
+import re
+import requests
+
+from FanzineIssueSpecPackage import FanzineIssueInfo
+
+from Log import Log
+
+# ====================================================================================
+# Recover the page counts of PDF issues from the PDFs themselves, reading only the few pieces of the file which are needed
+#   via HTTP Range requests.
+# We try, in order
+#   * The first couple of KB: A linearized ("fast web view") PDF has its page count (/N) right in the linearization dictionary
+#   * The last few KB: The trailer gives us /Root and startxref, and the xref table then gives us the byte offsets of the
+#       catalog object and of the page tree root, whose /Count is the page count
+# Each object is fetched with its own small range request, so no matter how big the scan, we read a few tens of KB.
+# Results are cached keyed by URL+ETag, so a PDF is only re-read when it has been replaced on the server.
+# All the lookups of a run go through a single thread pool, so a crawl can keep going while the PDFs of the series it has
+#   already read are looked up, and the cache is saved once, when the run is done with it.
+
+headBytes=2048
+tailBytes=8192
+objectBytes=4096
+
+linearizedPattern=re.compile(rb"/Linearized\s.*?/N\s+(\d+)", re.DOTALL)
+startxrefPattern=re.compile(rb"startxref\s+(\d+)")
+rootPattern=re.compile(rb"/Root\s+(\d+)\s+(\d+)\s+R")
+pagesPattern=re.compile(rb"/Pages\s+(\d+)\s+(\d+)\s+R")
+countPattern=re.compile(rb"/Count\s+(\d+)")
+typePagesPattern=re.compile(rb"/Type\s*/Pages\b")
+xrefSubsectionPattern=re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*(?:\r\n|\r|\n)")
+
+
+class PdfRangeReader:
+    def __init__(self, session: requests.Session, url: str, timeout: float):
+        self._session=session
+        self._url=url
+        self._timeout=timeout
+        self.ETag: Optional[str]=None
+        self.Size: Optional[int]=None
+
+    # Fetch bytes [start, end] (inclusive) or, if start is None, the last -end bytes
+    # Returns None if the server won't do ranges: we don't want the whole file
+    def Get(self, start: Optional[int], end: int) -> Optional[bytes]:
+        rng="bytes="+(str(start)+"-"+str(end) if start is not None else str(end))
+        r=self._session.get(self._url, headers={"Range": rng}, timeout=self._timeout, stream=True)
+        try:
+            if r.status_code != 206:
+                return None
+            self.ETag=r.headers.get("ETag", self.ETag)
+            m=re.match(r"bytes (\d+)-(\d+)/(\d+)", r.headers.get("Content-Range", ""))
+            if m is not None:
+                self.Size=int(m.groups()[2])
+            return r.content
+        finally:
+            r.close()
+
+    # Fetch the beginning of the object at offset and return its dictionary text (up to "stream" or "endobj")
+    def GetObject(self, offset: int) -> Optional[bytes]:
+        data=self.Get(offset, offset+objectBytes-1)
+        if data is None:
+            return None
+        for terminator in (b"stream", b"endobj"):
+            loc=data.find(terminator)
+            if loc >= 0:
+                data=data[:loc]
+        return data
+
+
+# -------------------------------------------------------------------------
+# Find the offset of object objNum using the classic xref table starting at xrefOffset
+# Follows /Prev links to earlier xref sections.  Returns None for cross-reference streams, which we don't decode.
+def FindObjectOffset(reader: PdfRangeReader, xrefOffset: int, objNum: int, depth: int=0) -> Optional[int]:
+    if depth > 8:
+        return None
+    data=reader.Get(xrefOffset, xrefOffset+objectBytes-1)
+    if data is None or not data.lstrip().startswith(b"xref"):
+        return None
+    pos=data.find(b"xref")+4
+    while True:
+        m=xrefSubsectionPattern.match(data, pos)
+        if m is None:
+            break
+        first, count=int(m.groups()[0]), int(m.groups()[1])
+        pos=m.end()
+        if first <= objNum < first+count:
+            entryStart=pos+20*(objNum-first)        # Each xref entry is exactly 20 bytes
+            if entryStart+20 > len(data):
+                more=reader.Get(xrefOffset+entryStart, xrefOffset+entryStart+19)
+                entry=more if more is not None else b""
+            else:
+                entry=data[entryStart:entryStart+20]
+            fields=entry.split()
+            if len(fields) >= 3 and fields[2] == b"n":
+                return int(fields[0])
+            return None
+        pos+=20*count
+        if pos >= len(data):
+            break
+
+    # Not in this section: try the trailer's /Prev
+    trailer=data.find(b"trailer")
+    if trailer >= 0:
+        m=re.search(rb"/Prev\s+(\d+)", data[trailer:])
+        if m is not None:
+            return FindObjectOffset(reader, int(m.groups()[0]), objNum, depth+1)
+    return None
+
+
+# -------------------------------------------------------------------------
+# Return the page count of the PDF at url (or None if it can't be determined cheaply) and its ETag
+def ReadPdfPageCount(session: requests.Session, url: str, timeout: float=20.0) -> Tuple[Optional[int], Optional[str]]:
+    reader=PdfRangeReader(session, url, timeout)
+
+    # Linearized PDFs tell us right at the start
+    head=reader.Get(0, headBytes-1)
+    if head is None:
+        return None, reader.ETag
+    m=linearizedPattern.search(head)
+    if m is not None:
+        return int(m.groups()[0]), reader.ETag
+
+    # Otherwise go to the trailer
+    tail=reader.Get(None, -tailBytes)
+    if tail is None:
+        return None, reader.ETag
+    xrefs=startxrefPattern.findall(tail)
+    roots=rootPattern.findall(tail)
+    if len(xrefs) > 0 and len(roots) > 0:
+        xrefOffset=int(xrefs[-1])
+        rootOffset=FindObjectOffset(reader, xrefOffset, int(roots[-1][0]))
+        if rootOffset is not None:
+            catalog=reader.GetObject(rootOffset)
+            m=pagesPattern.search(catalog) if catalog is not None else None
+            if m is not None:
+                pagesOffset=FindObjectOffset(reader, xrefOffset, int(m.groups()[0]))
+                if pagesOffset is not None:
+                    pages=reader.GetObject(pagesOffset)
+                    m=countPattern.search(pages) if pages is not None else None
+                    if m is not None:
+                        return int(m.groups()[0]), reader.ETag
+
+    # Last resort: Sometimes the page tree root is sitting right there in the tail
+    loc=typePagesPattern.search(tail)
+    if loc is not None:
+        m=countPattern.search(tail, max(0, loc.start()-200))
+        if m is not None:
+            return int(m.groups()[0]), reader.ETag
+    return None, reader.ETag
+
+
+# ====================================================================================
+# Page counts of PDFs, cached by URL and ETag
+class PdfPageCounter:
+    def __init__(self, cacheFilename: Optional[str]=None, maxWorkers: int=8, timeout: float=20.0):
+        self._cacheFilename=cacheFilename
+        self._timeout=timeout
+        self._session=requests.Session()
+        self._lock=threading.Lock()
+        self._dirty=False
+        self._executor=ThreadPoolExecutor(max_workers=maxWorkers)
+        self._futures: Dict[str, Future]={}                     # URL --> its lookup, so each PDF is looked up once per run
+        self.Cache: Dict[str, Dict[str, Optional[int]]]={}       # URL --> {ETag: page count}
+        if cacheFilename is not None and os.path.exists(cacheFilename):
+            try:
+                with open(cacheFilename, "r") as f:
+                    self.Cache=json.load(f)
+            except (OSError, ValueError) as e:
+                Log("PdfPageCounter: Ignoring unreadable cache "+cacheFilename+": "+str(e), isError=True)
+
+    def SaveCache(self) -> None:
+        if self._cacheFilename is None or not self._dirty:
+            return
+        self._dirty=False
+        temp=self._cacheFilename+".tmp"
+        with open(temp, "w") as f:
+            json.dump(self.Cache, f)
+        os.replace(temp, self._cacheFilename)
+
+    # Wait for any outstanding lookups, shut the thread pool down and save the cache
+    def Close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.SaveCache()
+
+    # Get the current ETag cheaply, so we know if our cached value is still good
+    def _ETag(self, url: str) -> Optional[str]:
+        try:
+            r=self._session.head(url, allow_redirects=True, timeout=self._timeout)
+            return r.headers.get("ETag")
+        except requests.RequestException:
+            return None
+
+    def PageCount(self, url: str) -> Optional[int]:
+        with self._lock:
+            cached=self.Cache.get(url)
+        if cached is not None:
+            etag=self._ETag(url)
+            if etag is not None and etag in cached:
+                return cached[etag]
+        try:
+            count, etag=ReadPdfPageCount(self._session, url, self._timeout)
+        except requests.RequestException as e:
+            Log("PdfPageCounter: "+url+" failed: "+str(e), isError=True)
+            return None
+        if etag is not None:
+            with self._lock:
+                self.Cache[url]={etag: count}
+                self._dirty=True
+        return count
+
+    # Start looking up the page count of url in the background
+    def Submit(self, url: str) -> Future:
+        future=self._futures.get(url)
+        if future is None:
+            future=self._executor.submit(self.PageCount, url)
+            self._futures[url]=future
+        return future
+
+    # Look up the page counts of all the URLs concurrently.  Returns a dictionary URL --> page count (or None)
+    def PageCounts(self, urls: List[str]) -> Dict[str, Optional[int]]:
+        futures={url: self.Submit(url) for url in sorted(set(urls))}
+        return {url: future.result() for url, future in futures.items()}
+
+
+# ====================================================================================
+# The PDF issues which have no page count, grouped by the URL of the PDF (without any #page=nnn)
+def IssuesNeedingPageCounts(issues: List[FanzineIssueInfo], fURL) -> Dict[str, List[FanzineIssueInfo]]:
+    needed: Dict[str, List[FanzineIssueInfo]]={}
+    for fz in issues:
+        if fz.Pagecount != 0 or fz.PageName is None or os.path.splitext(fz.PageName)[1].lower() != ".pdf":
+            continue
+        url=fURL(fz)
+        if url is None:
+            continue
+        needed.setdefault(urllib.parse.urldefrag(url)[0], []).append(fz)
+    return needed
+
+
+# Fill in the page counts which were found.  Returns the number of issues given a page count.
+def ApplyPageCounts(needed: Dict[str, List[FanzineIssueInfo]], counts: Dict[str, Optional[int]]) -> int:
+    recovered=0
+    for url, count in counts.items():
+        if count is None or count <= 0:
+            continue
+        for fz in needed[url]:
+            # A #page=nnn link is one issue in a multi-issue PDF, so the PDF's page count isn't the issue's
+            if fz.DirURL is not None and "#page=" in fz.DirURL:
+                continue
+            fz.Pagecount=count
+            recovered+=1
+    return recovered
+
+
+# -------------------------------------------------------------------------
+# Fill in the page counts of the PDF issues which have none
+def RecoverPdfPageCounts(fanacIssueList: List[FanzineIssueInfo], fURL, counter: PdfPageCounter) -> int:
+    needed=IssuesNeedingPageCounts(fanacIssueList, fURL)
+    Log("RecoverPdfPageCounts: "+str(len(needed))+" PDFs with no page count")
+    recovered=ApplyPageCounts(needed, counter.PageCounts(list(needed.keys())))
+    counter.SaveCache()
+    Log("RecoverPdfPageCounts: "+str(recovered)+" page counts recovered")
+    return recovered
+
+
+# -------------------------------------------------------------------------
+# The same for a stream of batches of issues (e.g., series by series from the crawl)
+# Each batch's lookups are started as soon as it arrives, and the batch is passed on, in its turn, once they have all finished.
+#   So the crawl isn't held up waiting for the PDFs, but nothing downstream sees an issue before its page count is filled in.
+# At most maxPending batches are held back; beyond that we wait for the oldest.
+def RecoverPdfPageCountsStreaming(batches: Iterable[List[FanzineIssueInfo]], fURL, counter: PdfPageCounter,
+                                  maxPending: int=100) -> Iterator[List[FanzineIssueInfo]]:
+    pending=deque()      # (batch, needed, {URL: future})
+    pdfs=0
+    recovered=0
+    try:
+        for batch in batches:
+            needed=IssuesNeedingPageCounts(batch, fURL)
+            pdfs+=len(needed)
+            pending.append((batch, needed, {url: counter.Submit(url) for url in needed.keys()}))
+            while len(pending) > 0 and (len(pending) > maxPending or all(f.done() for f in pending[0][2].values())):
+                batch, needed, futures=pending.popleft()
+                recovered+=ApplyPageCounts(needed, {url: f.result() for url, f in futures.items()})
+                yield batch
+        while len(pending) > 0:
+            batch, needed, futures=pending.popleft()
+            recovered+=ApplyPageCounts(needed, {url: f.result() for url, f in futures.items()})
+            yield batch
+    finally:
+        counter.Close()
+    Log("RecoverPdfPageCounts: "+str(recovered)+" page counts recovered for "+str(pdfs)+" PDFs with no page count")
@@ -0,0 +1,236 @@
+from typing import Optional, Dict, Tuple
+from collections import namedtuple
+from functools import lru_cache
+import posixpath
+import json
+import urllib.parse
+import re
+import unidecode
+
+from FanzineIssueSpecPackage import FanzineIssueSpec, FanzineDate, FanzineSerial, FanzineIssueInfo, FanzineSeriesInfo
+
+# ====================================================================================
+# Flat, plain-data forms of FanzineIssueInfo and FanzineSeriesInfo.
+# These are what get written to (and read back from) the persistent stores, so that the stores never need to know
+# how the FanzineIssueSpecPackage classes are put together internally.
+# The integer date and serial fields are there for selecting and sorting on.  The issue's date and serial are also kept
+#   exactly as they were read (DateSpec and SerialSpec) so that an issue read back from a store prints the same as it did
+#   when it was crawled, non-integer serials, suffixes, month names and all.  Records from before these were kept have None
+#   for them and are rebuilt from the integer fields.
+
+SeriesRecord=namedtuple("SeriesRecord", "SeriesName DirURL Editor Country")
+IssueRecord=namedtuple("IssueRecord", "SeriesName IssueName DirURL PageName Pagecount Country "
+                                      "Year Month Day MonthText Vol Num Whole Newszine Series DateSpec SerialSpec", defaults=(None, None))
+
+
+# -------------------------------------------------------------------------
+# Turn something which ought to be a small integer into an int or None
+def IntOrNone(val) -> Optional[int]:
+    if val is None:
+        return None
+    try:
+        return int(val)
+    except (ValueError, TypeError):
+        return None
+
+
+# -------------------------------------------------------------------------
+# The state of a FanzineDate or FanzineSerial as a JSON string, or None if it can't be captured that way
+def SpecToText(spec) -> Optional[str]:
+    if spec is None:
+        return None
+    attrs=getattr(spec, "__dict__", None)
+    if attrs is None or any(not isinstance(v, (str, int, float, bool, type(None))) for v in attrs.values()):
+        return None
+    return json.dumps(attrs, sort_keys=True, separators=(",", ":"))
+
+
+# Restore the state saved by SpecToText() into a freshly made FanzineDate or FanzineSerial
+def SpecFromText(spec, text: str):
+    spec.__dict__.update(json.loads(text))
+    return spec
+
+
+# -------------------------------------------------------------------------
+def SeriesToRecord(fsi: Optional[FanzineSeriesInfo]) -> Optional[SeriesRecord]:
+    if fsi is None:
+        return None
+    return SeriesRecord(SeriesName=fsi.SeriesName, DirURL=fsi.DirURL, Editor=fsi.Editor, Country=fsi.Country)
+
+
+# -------------------------------------------------------------------------
+def IssueToRecord(fii: FanzineIssueInfo) -> IssueRecord:
+    fis=fii.FIS
+    year=month=day=vol=num=whole=None
+    monthText=dateSpec=serialSpec=None
+    if fis is not None:
+        year=IntOrNone(fis.Year)
+        month=IntOrNone(fis.Month)
+        if fis.FD is not None:
+            day=IntOrNone(fis.FD.Day)
+            monthText=fis.FD.MonthText      # Things like "Spring" or "Holiday" only survive as text
+            dateSpec=SpecToText(fis.FD)
+        if fis.FS is not None:
+            vol=IntOrNone(fis.FS.Vol)
+            num=IntOrNone(fis.FS.Num)
+            whole=IntOrNone(fis.FS.Whole)
+            serialSpec=SpecToText(fis.FS)
+
+    return IssueRecord(SeriesName=fii.SeriesName, IssueName=fii.IssueName, DirURL=fii.DirURL, PageName=fii.PageName,
+                       Pagecount=fii.Pagecount if fii.Pagecount is not None else 0, Country=fii.Country,
+                       Year=year, Month=month, Day=day, MonthText=monthText, Vol=vol, Num=num, Whole=whole,
+                       Newszine="newszine" in fii.Taglist, Series=SeriesToRecord(fii.Series), DateSpec=dateSpec, SerialSpec=serialSpec)
+
+
+# -------------------------------------------------------------------------
+# Rebuild a FanzineIssueInfo from a record.
+# seriesCache lets all the issues of a series share a single FanzineSeriesInfo, just as they do when freshly crawled.
+def RecordToIssue(rec: IssueRecord, seriesCache: Optional[Dict[Tuple, FanzineSeriesInfo]]=None) -> FanzineIssueInfo:
+    if rec.DateSpec is not None:
+        fd=SpecFromText(FanzineDate(), rec.DateSpec)
+    elif rec.Month is not None:
+        fd=FanzineDate(Year=rec.Year, Month=rec.Month, Day=rec.Day)
+    else:
+        fd=FanzineDate(Year=rec.Year, MonthText=rec.MonthText)
+    if rec.SerialSpec is not None:
+        fs=SpecFromText(FanzineSerial(), rec.SerialSpec)
+    else:
+        fs=FanzineSerial(Vol=rec.Vol, Num=rec.Num, Whole=rec.Whole)
+    fii=FanzineIssueInfo(SeriesName=rec.SeriesName, IssueName=rec.IssueName, DirURL=rec.DirURL, PageName=rec.PageName,
+                         FIS=FanzineIssueSpec(FD=fd, FS=fs), Pagecount=rec.Pagecount, Country=rec.Country)
+    if rec.Newszine:
+        fii.Taglist.append("newszine")
+    StampIssue(fii)
+
+    if rec.Series is not None:
+        fsi=None
+        if seriesCache is not None:
+            fsi=seriesCache.get(tuple(rec.Series))
+        if fsi is None:
+            fsi=FanzineSeriesInfo(SeriesName=rec.Series.SeriesName, DirURL=rec.Series.DirURL, Issuecount=0, Pagecount=0,
+                                  Editor=rec.Series.Editor, Country=rec.Series.Country)
+            if seriesCache is not None:
+                seriesCache[tuple(rec.Series)]=fsi
+        fii.Series=fsi
+    return fii
+
+
+# ====================================================================================
+pdfPagePattern=re.compile("(.*)(#page=[0-9]+)$")
+
+# Assemble the URL of an issue from its directory URL and page name
+# Returns None if the issue doesn't point to anything
+def IssueURL(fii: FanzineIssueInfo) -> Optional[str]:
+    if fii is None or fii.PageName is None:
+        return None
+    # Sometimes the url will be to a page in a PDF, so the URL will end with #page=nnn
+    # Detect that, since the page needs to be handled specially.
+    page=""
+    url=fii.DirURL
+    m=pdfPagePattern.match(url)
+    if m is not None:
+        url=m.groups()[0]
+        page=m.groups()[1]
+
+    if "/" not in fii.PageName:
+        return url+"/"+fii.PageName+page
+    # There are two possibilities: This is a reference to somewhere in the fanzines directory or this is a reference elsewhere.
+    # If it is in fanzines, then the url ends with <stuff>/fanzines/<dir>/<file>.html
+    parts=fii.PageName.split("/")
+    if len(parts) > 2 and parts[-3:-2][0] == "fanzines":
+        return url+"/../"+"/".join(parts[-2:])+page
+    return fii.PageName
+
+
+# -------------------------------------------------------------------------
+# Reduce a URL to a canonical form so that different spellings of the same location compare equal:
+#   http and https, fanac.org and www.fanac.org, case of the host, "..", "." and doubled "/" in the path, and %-escapes
+def CanonicalURL(url: str) -> str:
+    u=urllib.parse.urlsplit(url.strip())
+    host=u.netloc.lower()
+    scheme=u.scheme.lower()
+    if host == "fanac.org" or host == "www.fanac.org":
+        host="www.fanac.org"
+        scheme="https"
+    path=urllib.parse.unquote(u.path)
+    if len(path) > 0:
+        trailing=path.endswith("/")
+        path=posixpath.normpath(path)
+        if path.startswith("//"):
+            path=path[1:]
+        if trailing and not path.endswith("/"):
+            path+="/"
+    return urllib.parse.urlunsplit((scheme, host, path, u.query, u.fragment))
+
+
+# -------------------------------------------------------------------------
+# The canonical URL of an issue: This is the key which identifies an issue no matter which series directory it was reached through
+def CanonicalIssueURL(fii: FanzineIssueInfo) -> str:
+    return KeysOf(fii).CanonicalURL
+
+
+# ====================================================================================
+# Conversion of records to and from plain dictionaries, for storing as JSON
+def IssueRecordToDict(rec: IssueRecord) -> Dict:
+    d=rec._asdict()
+    d["Series"]=rec.Series._asdict() if rec.Series is not None else None
+    return d
+
+
+def IssueRecordFromDict(d: Dict) -> IssueRecord:
+    d=dict(d)
+    d["Series"]=SeriesRecord(**d["Series"]) if d.get("Series") is not None else None
+    return IssueRecord(**d)
+
+
+# ====================================================================================
+# Keys computed once, when an issue is created, rather than every time the issue is sorted or listed
+#   ResolvedURL     The issue's URL (from IssueURL()), or None
+#   CanonicalURL    The canonical form of the issue's URL, which identifies the issue
+#   DateKey         The issue's FIS.FormatDateForSorting(), so the date order is the same as it has always been (undated issues first)
+#   AlphaKey        The series name reduced to upper case letters and digits, for sorting alphabetically
+#   Year            The issue's year as an int, or None if it is undated
+# FanzineIssueInfo belongs to FanzineIssueSpecPackage, so the keys are kept here, indexed by the issue, rather than on it.
+# Each entry holds a reference to its issue, so the id() can't be reused by another object while the entry exists.
+IssueKeys=namedtuple("IssueKeys", "ResolvedURL CanonicalURL DateKey AlphaKey Year")
+
+issueKeys: Dict[int, Tuple[FanzineIssueInfo, IssueKeys]]={}
+
+def StampIssue(fii: FanzineIssueInfo) -> FanzineIssueInfo:
+    resolvedURL=IssueURL(fii)
+    canonicalURL=CanonicalURL(resolvedURL if resolvedURL is not None else (fii.DirURL if fii.DirURL is not None else ""))
+    year=IntOrNone(fii.FIS.Year) if fii.FIS is not None else None
+    issueKeys[id(fii)]=(fii, IssueKeys(ResolvedURL=resolvedURL, CanonicalURL=canonicalURL, DateKey=DateSortKey(fii),
+                                       AlphaKey=AlphaSortKey(fii.SeriesName), Year=year))
+    return fii
+
+
+# -------------------------------------------------------------------------
+# The keys of an issue, computing them if the issue didn't come through StampIssue()
+def KeysOf(fii: FanzineIssueInfo) -> IssueKeys:
+    entry=issueKeys.get(id(fii))
+    if entry is None or entry[0] is not fii:
+        StampIssue(fii)
+        entry=issueKeys[id(fii)]
+    return entry[1]
+
+
+def DateSortKey(fii: FanzineIssueInfo) -> str:
+    if fii.FIS is None:
+        return ""
+    return fii.FIS.FormatDateForSorting()
+
+
+# Replace lower case and accented alphas, ignore punctuation, retain digits; the Unidecode is so that things like 'á Bas' sort with A
+# There are far fewer series names than issues, so the results are cached
+@lru_cache(maxsize=None)
+def AlphaSortKey(seriesName: Optional[str]) -> str:
+    if seriesName is None or len(seriesName) == 0:
+        return " "
+    out=""
+    for c in seriesName:
+        if c.isalpha():
+            out+=unidecode.unidecode(c.upper())
+        elif c.isdigit():
+            out+=c
+    return out
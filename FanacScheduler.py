@@ -0,0 +1,135 @@
+from typing import List, Dict, Tuple, Optional
+from time import localtime, strftime
+import hashlib
+import json
+import time
+import os
+
+from FanzineIssueSpecPackage import FanzineIssueInfo
+
+from Log import Log
+from FanacRecords import IssueToRecord, RecordToIssue, CanonicalURL
+from FanacSnapshot import Snapshot
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# Time-budgeted, prioritized crawling
+# We keep a history of every directory crawled: when it was last read, how long it took, how many issues it had and a hash
+#   of its contents (so we know when it last changed).
+# When there's a time budget, the directories are crawled in priority order until the budget runs out.  The series which
+#   didn't get crawled are filled in from the last good snapshot and reported as stale.
+#
+# Priority, highest first:
+#   Directories we've never seen
+#   Directories which changed recently (they're the ones most likely to have changed again)
+#   Directories which haven't been crawled for a long time
+#   Large series (more issues means more to go wrong in the listings if it's stale)
+# Pages known to be slow are started early, too: Leaving them for last risks the budget running out partway through.
+
+secondsPerDay=24*3600
+
+
+def DirectoryKey(url: str) -> str:
+    return CanonicalURL(url).rstrip("/")
+
+
+# -------------------------------------------------------------------------
+# A hash of the issues of a directory, used to tell when a directory's contents have changed
+def IssuesHash(issues: List[FanzineIssueInfo]) -> str:
+    recs=sorted([json.dumps(IssueToRecord(fii), default=str) for fii in issues])
+    return hashlib.sha256("\n".join(recs).encode("utf-8")).hexdigest()
+
+
+# ====================================================================================
+class CrawlSchedule:
+    def __init__(self, historyFilename: str, budgetSeconds: Optional[float]=None, snapshotFilename: Optional[str]=None):
+        self._historyFilename=historyFilename
+        self._snapshotFilename=snapshotFilename
+        self._deadline=time.monotonic()+budgetSeconds if budgetSeconds is not None else None
+        self._fallback: Optional[Dict[str, List[FanzineIssueInfo]]]=None
+        self.History: Dict[str, Dict]={}
+        self.Stale: List[Tuple[str, str, Optional[float], int]]=[]        # (dirname, url, when it was last crawled, issues filled in)
+
+        if os.path.exists(historyFilename):
+            try:
+                with open(historyFilename, "r") as f:
+                    self.History=json.load(f)
+            except (OSError, ValueError) as e:
+                Log("CrawlSchedule: Ignoring unreadable history "+historyFilename+": "+str(e), isError=True)
+
+    @property
+    def Budgeted(self) -> bool:
+        return self._deadline is not None
+
+    def OutOfTime(self) -> bool:
+        return self._deadline is not None and time.monotonic() > self._deadline
+
+    # -------------------------------------------------------------------------
+    def Priority(self, dirname: str, now: float) -> float:
+        h=self.History.get(dirname)
+        if h is None:
+            return 1e9      # Never seen
+        score=0.0
+        daysSinceChange=(now-h.get("lastChanged", 0))/secondsPerDay
+        score+=1000.0/(1.0+daysSinceChange)                     # Recently changed
+        score+=10.0*(now-h.get("lastCrawled", 0))/secondsPerDay  # Stale
+        score+=h.get("issues", 0)/10.0                          # Large
+        score+=h.get("seconds", 0.0)                            # Slow
+        return score
+
+    # Return the directories in the order they should be crawled
+    def Order(self, fanacDirectories: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        now=time.time()
+        return sorted(fanacDirectories, key=lambda tup: (-self.Priority(tup[1], now), tup[1]))
+
+    # -------------------------------------------------------------------------
+    # Record the result of crawling a directory
+    def Record(self, dirname: str, issues: List[FanzineIssueInfo], seconds: float) -> None:
+        now=time.time()
+        h=self.History.setdefault(dirname, {})
+        digest=IssuesHash(issues)
+        if h.get("hash") != digest:
+            h["hash"]=digest
+            h["lastChanged"]=now
+        h["lastCrawled"]=now
+        h["seconds"]=round(seconds, 3)
+        h["issues"]=len(issues)
+
+    def Save(self) -> None:
+        temp=self._historyFilename+".tmp"
+        with open(temp, "w") as f:
+            json.dump(self.History, f, indent=1, sort_keys=True)
+        os.replace(temp, self._historyFilename)
+
+    # -------------------------------------------------------------------------
+    # The issues of a directory we didn't get to, taken from the last good snapshot
+    def Fallback(self, dirname: str, url: str) -> List[FanzineIssueInfo]:
+        if self._fallback is None:
+            self._LoadFallback()
+        issues=self._fallback.get(DirectoryKey(url), [])
+        h=self.History.get(dirname)
+        self.Stale.append((dirname, url, h.get("lastCrawled") if h is not None else None, len(issues)))
+        return issues
+
+    def _LoadFallback(self) -> None:
+        self._fallback={}
+        if self._snapshotFilename is None or not os.path.exists(self._snapshotFilename):
+            Log("CrawlSchedule: No snapshot to fill in the uncrawled series from", isError=True)
+            return
+        seriesCache={}
+        with Snapshot(self._snapshotFilename) as snap:
+            for rec in snap.Issues():
+                dirURL=rec.Series.DirURL if rec.Series is not None and rec.Series.DirURL is not None else rec.DirURL
+                if dirURL is None:
+                    continue
+                self._fallback.setdefault(DirectoryKey(dirURL), []).append(RecordToIssue(rec, seriesCache))
+
+    # -------------------------------------------------------------------------
+    def WriteStaleReport(self, filename: str) -> None:
+        Log("CrawlSchedule: "+str(len(self.Stale))+" series not crawled this run")
+        with OpenOutput(filename) as f:
+            f.write(str(len(self.Stale))+" series were not crawled this run and were filled in from the last snapshot\n\n")
+            for dirname, url, lastCrawled, count in self.Stale:
+                when=strftime("%Y-%m-%d %H:%M", localtime(lastCrawled)) if lastCrawled is not None else "never"
+                note=str(count)+" issues" if count > 0 else "*** not in the snapshot: missing from the listings"
+                f.write(dirname+"    last crawled "+when+"    "+note+"\n")
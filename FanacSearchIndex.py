@@ -0,0 +1,332 @@
+from typing import List, Dict, Set, Tuple, Optional
+from string import Template
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+from FanzineIssueSpecPackage import FanzineIssueInfo
+
+from Log import Log
+from FanacRecords import CanonicalIssueURL, KeysOf
+from FanacOutput import OpenOutput
+
+# ====================================================================================
+# A static search index for the listings
+# The words of the series names, editors and countries (indexing series) and of the issue names and years (indexing issues)
+#   go into an inverted index which is split into small JSON shards by word prefix.  Each shard carries, along with its
+#   words' postings, the short display form of every document they point to, so a query needs nothing beyond the shards of
+#   its own words: there is no second round of fetches to turn the matches into results.
+# Shards start out keyed by the first two characters of the word.  Any shard which would be bigger than shardCap is split
+#   by longer prefixes until it fits (or until it holds a single word), and the list of prefixes in use is written to
+#   shards.json so the page knows which shards to fetch.  The commonest short words aren't indexed at all.
+# A single word which is too big for a shard on its own (a year like 1953, or "fanzine") is split into numbered chunks
+#   instead, and its entry in its shard is just the number of chunks.  The page doesn't fetch those chunks when the query has
+#   some other word whose matches are all at hand: it checks the other word's matches against their own text instead.
+#   When every word of the query is that common, the page fetches the chunks of the first one a few at a time, as the reader asks for more.
+# Python and the page must break text into words in the same way, so both use NFKD with the combining marks dropped,
+#   followed by the folds table for the letters which NFKD leaves alone (ß, ø, æ...)
+# Documents are identified by a hash of their canonical URL rather than by their position in a list, so adding or removing
+#   an issue only changes the few shards it appears in.  Shards are written with OpenOutput, so unchanged shards aren't
+#   rewritten at all, and shards which are no longer produced are deleted.
+#
+# Files, in <outputDir>/search/
+#   shards.json         [prefix, ...] the prefixes of the shards, sorted.  A word is in the shard of the longest of these it starts with.
+#   t-<prefix>.json     {"w": {word: [document ids] or chunk count}, "d": {document id: document}} for the words in the shard
+#   w-<word>-<n>.json   {"w": [document ids], "d": {document id: document}} for chunk n of a word too big for a shard
+#                       An issue document is ["i", issue name, series name, date, URL]; a series document is ["s", name, editor, country, URL]
+
+tokenPattern=re.compile(r"[a-z0-9]+")
+idLength=10
+shardCap=48*1024        # Bytes (roughly) of JSON in a shard before it is split
+stopWords=frozenset(["the", "and", "of", "an", "to", "in", "on", "for", "by", "de", "la", "le", "el", "der", "die", "das"])
+folds={"ß": "ss", "ø": "o", "æ": "ae", "œ": "oe", "đ": "d", "ð": "d", "þ": "th", "ł": "l", "ı": "i", "ħ": "h", "ŧ": "t", "ŋ": "ng"}
+
+
+# The same steps as tokens() in the search page
+def Normalize(s: str) -> str:
+    s="".join(c for c in unicodedata.normalize("NFKD", s) if not "\u0300" <= c <= "\u036f").lower()
+    return "".join(folds.get(c, c) for c in s)
+
+
+def Tokens(s: Optional[str]) -> Set[str]:
+    if s is None:
+        return set()
+    return {t for t in tokenPattern.findall(Normalize(s)) if len(t) >= 2 and t not in stopWords}
+
+
+def DocumentId(kind: str, key: str) -> str:
+    return hashlib.sha1((kind+":"+key).encode("utf-8")).hexdigest()[:idLength]
+
+
+# -------------------------------------------------------------------------
+# Build the index: returns (postings: word --> set of ids, documents: id --> document)
+def BuildSearchIndex(fanacIssueList: List[FanzineIssueInfo]) -> Tuple[Dict[str, Set[str]], Dict[str, List]]:
+    postings: Dict[str, Set[str]]={}
+    documents: Dict[str, List]={}
+    for fz in fanacIssueList:
+        fsi=fz.Series
+        seriesURL=fsi.DirURL if fsi is not None and fsi.DirURL is not None else fz.DirURL
+        seriesId=DocumentId("s", str(fz.SeriesName)+"|"+str(seriesURL))
+        if seriesId not in documents:
+            editor=fsi.Editor if fsi is not None else ""
+            documents[seriesId]=["s", fz.SeriesName, editor, fz.Country, seriesURL]
+            for t in Tokens(fz.SeriesName) | Tokens(editor) | Tokens(fz.Country):
+                postings.setdefault(t, set()).add(seriesId)
+
+        issueId=DocumentId("i", CanonicalIssueURL(fz))
+        date=(fz.FIS.MonthText+" "+fz.FIS.YearText).strip() if fz.FIS is not None else ""
+        documents[issueId]=["i", fz.IssueName, fz.SeriesName, date, KeysOf(fz).ResolvedURL]
+        words=Tokens(fz.IssueName)
+        if KeysOf(fz).Year is not None:
+            words.add(str(KeysOf(fz).Year))       # The year, so that "hyphen 1953" finds the 1953 issues of Hyphen
+        for t in words:
+            postings.setdefault(t, set()).add(issueId)
+    return postings, documents
+
+
+# -------------------------------------------------------------------------
+# The shard prefix a word belongs to: the longest prefix in use which it starts with
+def ShardPrefix(word: str, prefixes: Set[str]) -> str:
+    for length in range(len(word), 1, -1):
+        if word[:length] in prefixes:
+            return word[:length]
+    return word[:2]
+
+
+def DocumentSizes(documents: Dict[str, List]) -> Dict[str, int]:
+    return {docId: len(json.dumps(doc, separators=(",", ":")))+idLength+4 for docId, doc in documents.items()}
+
+
+# The (rough) size of the JSON for a set of words, their postings and their documents
+def ShardSize(words: List[str], postings: Dict[str, Set[str]], docSize: Dict[str, int]) -> int:
+    ids=set()
+    size=0
+    for w in words:
+        size+=len(w)+4+(idLength+3)*len(postings[w])
+        ids.update(postings[w])
+    return size+sum(docSize[i] for i in ids)
+
+
+# The words which are too big for a shard even on their own
+def ChunkedWords(postings: Dict[str, Set[str]], docSize: Dict[str, int]) -> Set[str]:
+    return {w for w in postings.keys() if ShardSize([w], postings, docSize) > shardCap}
+
+
+# Split a word's (sorted) postings into chunks which each fit under the cap
+def ChunkPostings(ids: List[str], docSize: Dict[str, int]) -> List[List[str]]:
+    chunks: List[List[str]]=[[]]
+    size=0
+    for docId in ids:
+        if size+idLength+3+docSize[docId] > shardCap and len(chunks[-1]) > 0:
+            chunks.append([])
+            size=0
+        chunks[-1].append(docId)
+        size+=idLength+3+docSize[docId]
+    return chunks
+
+
+# Choose the shard prefixes, starting from the words' first two characters and splitting any shard which is over the cap
+# The chunked words take up almost no room in their shards, so they are left out of the sizes
+def ChooseShardPrefixes(postings: Dict[str, Set[str]], documents: Dict[str, List], chunked: Set[str]) -> Set[str]:
+    docSize=DocumentSizes(documents)
+
+    prefixes=set(w[:2] for w in postings.keys())
+    while True:
+        shards: Dict[str, List[str]]={}
+        for w in postings.keys():
+            shards.setdefault(ShardPrefix(w, prefixes), []).append(w)
+        split=False
+        for prefix, words in shards.items():
+            if len(words) < 2 or ShardSize([w for w in words if w not in chunked], postings, docSize) <= shardCap:
+                continue
+            longer=set(w[:len(prefix)+1] for w in words if len(w) > len(prefix))-prefixes
+            if len(longer) > 0:
+                prefixes|=longer
+                split=True
+        if not split:
+            return prefixes
+
+
+# ====================================================================================
+# Write the shards into directory, deleting any left over from earlier runs which are no longer needed
+def WriteSearchIndex(directory: str, fanacIssueList: List[FanzineIssueInfo]) -> None:
+    os.makedirs(directory, exist_ok=True)
+    postings, documents=BuildSearchIndex(fanacIssueList)
+    docSize=DocumentSizes(documents)
+    chunked=ChunkedWords(postings, docSize)
+    prefixes=ChooseShardPrefixes(postings, documents, chunked)
+
+    shards: Dict[str, Dict]={}
+    chunks: Dict[str, Dict]={}
+    for word, ids in postings.items():
+        shard=shards.setdefault("t-"+ShardPrefix(word, prefixes)+".json", {"w": {}, "d": {}})
+        if word in chunked:
+            wordChunks=ChunkPostings(sorted(ids), docSize)
+            shard["w"][word]=len(wordChunks)
+            for n, chunkIds in enumerate(wordChunks):
+                chunks["w-"+word+"-"+str(n)+".json"]={"w": chunkIds, "d": {docId: documents[docId] for docId in chunkIds}}
+            continue
+        shard["w"][word]=sorted(ids)
+        for docId in ids:
+            shard["d"][docId]=documents[docId]
+
+    changed=0
+    for name, content in list(shards.items())+list(chunks.items()):
+        with OpenOutput(os.path.join(directory, name)) as f:
+            json.dump(content, f, separators=(",", ":"), sort_keys=True)
+        changed+=1 if f.Changed else 0
+    with OpenOutput(os.path.join(directory, "shards.json")) as f:
+        json.dump(sorted(name[2:-5] for name in shards.keys()), f, separators=(",", ":"))
+
+    removed=0
+    for name in os.listdir(directory):
+        if name[:2] in ("t-", "d-", "w-") and name.endswith(".json") and name not in shards and name not in chunks:
+            os.remove(os.path.join(directory, name))
+            removed+=1
+    largest=max([os.path.getsize(os.path.join(directory, name)) for name in list(shards.keys())+list(chunks.keys())], default=0)
+    Log("WriteSearchIndex: "+str(len(postings))+" words, "+str(len(documents))+" documents in "+str(len(shards))+" shards and "+
+        str(len(chunks))+" chunks of "+str(len(chunked))+" common words (largest "+"{:,}".format(largest)+" bytes); "+
+        str(changed)+" files rewritten, "+str(removed)+" removed")
+
+
+# ====================================================================================
+# The search page.  It lives next to the search directory and fetches the shards it needs as the reader types.
+searchPage=Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Search the fanac.org fanzines</title>
+<style>
+body {font-family: sans-serif; margin: 2em;}
+#q {width: 30em; font-size: 120%;}
+.series {font-weight: bold;}
+.meta {color: #666; font-size: 90%;}
+</style>
+</head>
+<body>
+<h1>Search the fanac.org fanzines</h1>
+<p>Search series names, editors, countries, issue names and years.  Every word must match the beginning of a word.</p>
+<input id="q" type="search" autofocus placeholder="e.g., hyphen 1953">
+<p id="count"></p>
+<ul id="results"></ul>
+<button id="more" hidden>More</button>
+<script>
+const stopWords=new Set($stopWords);
+const folds=$folds;
+const cache={};
+function fetchJson(name, missing) {
+    if (!(name in cache)) {
+        cache[name]=fetch("search/"+name).then(r => r.ok ? r.json() : missing).catch(() => missing);
+    }
+    return cache[name];
+}
+// The same steps as Normalize() and Tokens() in FanacSearchIndex.py
+function tokens(s) {
+    s=String(s == null ? "" : s).normalize("NFKD").replace(/[\\u0300-\\u036f]/g, "").toLowerCase().replace(/[^\\x00-\\x7f]/g, c => folds[c] || c);
+    return (s.match(/[a-z0-9]+/g) || []).filter(t => t.length >= 2 && !stopWords.has(t));
+}
+function escapeHtml(s) {
+    return String(s == null ? "" : s).replace(/[&<>"]/g, c => ({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"}[c]));
+}
+// The shards which can hold words starting with w: those whose prefixes start with w, and the one w itself would be in
+async function shardsFor(w) {
+    const prefixes=await fetchJson("shards.json", []);
+    const names=prefixes.filter(p => p.startsWith(w));
+    let best=null;
+    for (const p of prefixes) {
+        if (w.startsWith(p) && (best == null || p.length > best.length)) best=p;
+    }
+    if (best != null && !names.includes(best)) names.push(best);
+    return names;
+}
+// The matches for w which are in its shards, plus the chunk files of any matching word too common to be kept in a shard
+async function lookup(w) {
+    const shards=await Promise.all((await shardsFor(w)).map(p => fetchJson("t-"+p+".json", {w: {}, d: {}})));
+    const found={ids: new Set(), docs: {}, chunks: []};
+    for (const shard of shards) {
+        for (const word in shard.w) {
+            if (!word.startsWith(w)) continue;
+            const entry=shard.w[word];
+            if (typeof entry == "number") {
+                for (let n=0; n < entry; n++) found.chunks.push("w-"+word+"-"+n+".json");
+            } else {
+                entry.forEach(id => { found.ids.add(id); found.docs[id]=shard.d[id]; });
+            }
+        }
+    }
+    return found;
+}
+// Does the text of a document have a word starting with w?  These are the same fields its index words came from.
+function docHas(d, w) {
+    const text=d[0] == "s" ? [d[1], d[2], d[3]] : [d[1], d[3]];
+    return tokens(text.join(" ")).some(t => t.startsWith(w));
+}
+// Returns {ids, docs, more, filter}: more is the chunk files still to be fetched, whose documents must pass filter
+async function search(query) {
+    const words=tokens(query);
+    const result={ids: [], docs: {}, more: [], filter: () => true};
+    if (words.length == 0) return result;
+    const found=await Promise.all(words.map(lookup));
+    found.forEach(f => Object.assign(result.docs, f.docs));
+    let ids, others;
+    const complete=found.filter(f => f.chunks.length == 0);
+    if (complete.length > 0) {
+        // Intersect the words whose matches are all at hand, and check the rest against the text of what's left
+        ids=complete.map(f => f.ids).reduce((a, b) => new Set([...a].filter(id => b.has(id))));
+        others=words.filter((w, i) => found[i].chunks.length > 0);
+    } else {
+        // Every word is too common to fetch in full: page through the first one's chunks and check the rest against the text
+        ids=found[0].ids;
+        others=words.slice(1);
+        result.more=found[0].chunks;
+    }
+    result.filter=id => result.docs[id] != null && others.every(w => docHas(result.docs[id], w));
+    result.ids=[...ids].filter(result.filter);
+    return result;
+}
+let latest=0;
+let current=null;
+let limit=200;
+function show() {
+    const shown=current.ids.slice(0, limit);
+    const docs=shown.map(id => current.docs[id]).filter(d => d);
+    docs.sort((a, b) => b[0].localeCompare(a[0]) || String(a[1]).localeCompare(String(b[1])));     // Series first
+    const more=current.more.length > 0 || current.ids.length > shown.length;
+    document.getElementById("count").textContent=current.ids.length+(current.more.length > 0 ? "+" : "")+" found"+
+        (more ? ", showing the first "+shown.length : "");
+    document.getElementById("more").hidden=!more;
+    document.getElementById("results").innerHTML=docs.map(d => d[0] == "s"
+        ? '<li><a class="series" href="'+escapeHtml(d[4])+'">'+escapeHtml(d[1])+'</a> <span class="meta">'+escapeHtml([d[2], d[3]].filter(x => x).join(", "))+'</span></li>'
+        : '<li><a href="'+escapeHtml(d[4])+'">'+escapeHtml(d[1])+'</a> <span class="meta">'+escapeHtml(d[2])+(d[3] ? " &mdash; "+escapeHtml(d[3]) : "")+'</span></li>').join("");
+}
+document.getElementById("q").addEventListener("input", async (e) => {
+    const serial=++latest;
+    const result=await search(e.target.value);
+    if (serial != latest) return;
+    current=result;
+    limit=200;
+    show();
+});
+document.getElementById("more").addEventListener("click", async () => {
+    const serial=latest;
+    const result=current;
+    limit+=200;
+    // Fetch chunks until there is enough to fill the page, or there are none left
+    while (result.more.length > 0 && result.ids.length < limit) {
+        const chunk=await fetchJson(result.more.shift(), {w: [], d: {}});
+        Object.assign(result.docs, chunk.d);
+        const seen=new Set(result.ids);
+        chunk.w.forEach(id => { if (!seen.has(id) && result.filter(id)) result.ids.push(id); });
+    }
+    if (serial == latest) show();
+});
+</script>
+</body>
+</html>
+""")
+
+def WriteSearchPage(filename: str) -> None:
+    with OpenOutput(filename) as f:
+        f.write(searchPage.substitute(stopWords=json.dumps(sorted(stopWords)), folds=json.dumps(folds)))
@@ -0,0 +1,125 @@
+from typing import List, Dict, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+import hashlib
+import html
+import os
+import re
+import unidecode
+
+from FanzineIssueSpecPackage import FanzineIssueInfo, FanzineSeriesInfo
+
+from Log import Log
+from HelpersPackage import UnicodeToHtml
+from FanacRecords import KeysOf
+from FanacOutput import WriteIfChanged
+
+# ====================================================================================
+# A summary page for each fanzine series: its issues, date range, page total, editor and country
+# The issues arrive already in alphabetical (and, within a series, date) order, so they are grouped into series in one pass.
+# The page templates are compiled once and shared by all the workers.  Each page goes through WriteIfChanged, so the
+#   pages of series which didn't change are left alone, and pages of series which have disappeared are deleted.
+
+pageTemplate=Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+</head>
+<body>
+<h1><a href="$dirURL">$title</a></h1>
+<p>$summary</p>
+<table border="1" cellpadding="5">
+<tr><th>Issue</th><th>Date</th><th>Pages</th></tr>
+$rows
+</table>
+<p><a href="index.html">All series</a></p>
+<p><small>$timestamp</small></p>
+</body>
+</html>
+""")
+rowTemplate=Template("""<tr><td><a href="$url">$name</a></td><td>$date</td><td>$pages</td></tr>""")
+indexTemplate=Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Fanzine series on fanac.org</title>
+</head>
+<body>
+<h1>Fanzine series on fanac.org</h1>
+<p>$count series</p>
+<ul>
+$rows
+</ul>
+<p><small>$timestamp</small></p>
+</body>
+</html>
+""")
+
+slugPattern=re.compile(r"[^A-Za-z0-9]+")
+
+
+# -------------------------------------------------------------------------
+# The file name of a series' page: a readable version of the name, plus a hash of the directory to keep same-named series apart
+def SeriesPageFilename(fsi: FanzineSeriesInfo) -> str:
+    slug=slugPattern.sub("_", unidecode.unidecode(fsi.SeriesName if fsi.SeriesName is not None else "")).strip("_")[:60]
+    return slug+"-"+hashlib.sha1(str(fsi.DirURL).encode("utf-8")).hexdigest()[:6]+".html"
+
+
+def DateText(fz: FanzineIssueInfo) -> str:
+    if fz.FIS is None:
+        return ""
+    return (fz.FIS.MonthText+" "+fz.FIS.YearText).strip()
+
+
+# Group the issues by series, keeping their order
+def GroupBySeries(fanacIssueList: List[FanzineIssueInfo]) -> List[Tuple[FanzineSeriesInfo, List[FanzineIssueInfo]]]:
+    groups: Dict[Tuple, Tuple[FanzineSeriesInfo, List[FanzineIssueInfo]]]={}
+    for fz in fanacIssueList:
+        if fz.Series is None:
+            continue
+        groups.setdefault((fz.Series.SeriesName, fz.Series.DirURL), (fz.Series, []))[1].append(fz)
+    return list(groups.values())
+
+
+# ====================================================================================
+# Render one series' page and write it if it has changed.  Returns True if it was written.
+def WriteSeriesPage(directory: str, fsi: FanzineSeriesInfo, issues: List[FanzineIssueInfo], timestamp: str) -> bool:
+    dated=[fz for fz in issues if KeysOf(fz).Year is not None]
+    pages=sum(fz.Pagecount for fz in issues)
+    summary=str(len(issues))+" issue"+("s" if len(issues) != 1 else "")+", "+"{:,}".format(pages)+" pages"
+    if len(dated) > 0:
+        first=min(dated, key=lambda fz: KeysOf(fz).DateKey)
+        last=max(dated, key=lambda fz: KeysOf(fz).DateKey)
+        summary+=",  "+DateText(first)+(" &ndash; "+DateText(last) if last is not first else "")
+    if fsi.Editor is not None and len(fsi.Editor) > 0:
+        summary+="<br>Edited by "+UnicodeToHtml(html.escape(fsi.Editor, quote=False))     # The editor text comes from the page entity-decoded
+    if fsi.Country is not None and len(fsi.Country) > 0:
+        summary+="<br>Country: "+UnicodeToHtml(fsi.Country)
+
+    rows="\n".join(rowTemplate.substitute(url=KeysOf(fz).ResolvedURL if KeysOf(fz).ResolvedURL is not None else "",
+                                          name=UnicodeToHtml(fz.IssueName), date=DateText(fz),
+                                          pages=str(fz.Pagecount) if fz.Pagecount > 0 else "") for fz in issues)
+    page=pageTemplate.substitute(title=UnicodeToHtml(fsi.SeriesName), dirURL=fsi.DirURL, summary=summary, rows=rows, timestamp=timestamp)
+    return WriteIfChanged(os.path.join(directory, SeriesPageFilename(fsi)), page)
+
+
+def WriteSeriesPages(directory: str, fanacIssueList: List[FanzineIssueInfo], timestamp: str, maxWorkers: int=8) -> None:
+    os.makedirs(directory, exist_ok=True)
+    groups=GroupBySeries(fanacIssueList)
+
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        changed=list(executor.map(lambda g: WriteSeriesPage(directory, g[0], g[1], timestamp), groups))
+
+    # The index of all the series pages
+    rows="\n".join('<li><a href="'+SeriesPageFilename(fsi)+'">'+UnicodeToHtml(fsi.SeriesName)+'</a></li>' for fsi, issues in groups)
+    WriteIfChanged(os.path.join(directory, "index.html"), indexTemplate.substitute(count="{:,}".format(len(groups)), rows=rows, timestamp=timestamp))
+
+    # Remove the pages of series which are gone
+    wanted=set(SeriesPageFilename(fsi) for fsi, issues in groups)
+    removed=0
+    for name in os.listdir(directory):
+        if name.endswith(".html") and name != "index.html" and name not in wanted:
+            os.remove(os.path.join(directory, name))
+            removed+=1
+    Log("WriteSeriesPages: "+str(len(groups))+" series pages, "+str(sum(changed))+" rewritten, "+str(removed)+" removed")
@@ -0,0 +1,188 @@
+from typing import List, Dict, Optional, Tuple
+import mmap
+import os
+import struct
+
+from FanzineIssueSpecPackage import FanzineIssueInfo
+
+from Log import Log
+from FanacRecords import IssueRecord, SeriesRecord, IssueToRecord, RecordToIssue
+
+# ====================================================================================
+# A compact binary snapshot of the crawl results, so the reports can be regenerated without re-crawling fanac.org
+#
+# The layout is
+#   Header          magic, version and the counts and offsets of the other sections
+#   String index    (nStrings+1) uint32 offsets into the string blob; string i is blob[index[i]:index[i+1]]
+#   String blob     All the distinct strings (series names, countries, editors, URLs, issue names, date and serial specs)
+#                   in UTF-8, each stored once
+#   Series table    nSeries fixed-width records
+#   Issue table     nIssues fixed-width records
+# All strings are referenced by their index in the string table and all the records are fixed width,
+#   so any record can be located directly from its number.
+
+snapshotMagic=b"FANACSNP"
+snapshotVersion=2
+
+headerStruct=struct.Struct("<8sHHIIIIII")     # magic, version, flags, nStrings, nSeries, nIssues, offStringIndex, offSeries, offIssues
+seriesStruct=struct.Struct("<IIII")           # SeriesName, DirURL, Editor, Country
+issueStruct=struct.Struct("<IIIIIIIIIiHBBiiiB")    # Series, SeriesName, IssueName, DirURL, PageName, Country, MonthText, DateSpec, SerialSpec,
+                                                    #   Pagecount, Year, Month, Day, Vol, Num, Whole, flags
+
+noString=0xFFFFFFFF         # String reference standing in for None
+noInt=-2**31                # Vol/Num/Whole value standing in for None
+flagNewszine=0x01
+
+
+# ====================================================================================
+# Accumulates strings and hands out their indexes, storing each distinct string just once
+class StringTable:
+    def __init__(self):
+        self._index: Dict[str, int]={}
+        self._strings: List[bytes]=[]
+
+    def Ref(self, s: Optional[str]) -> int:
+        if s is None:
+            return noString
+        i=self._index.get(s)
+        if i is None:
+            i=len(self._strings)
+            self._index[s]=i
+            self._strings.append(s.encode("utf-8"))
+        return i
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    # Return the offset index and the blob
+    def Pack(self) -> Tuple[bytes, bytes]:
+        offsets=[0]
+        for s in self._strings:
+            offsets.append(offsets[-1]+len(s))
+        return struct.pack("<"+str(len(offsets))+"I", *offsets), b"".join(self._strings)
+
+
+# The integer fields are packed into fixed widths.  A value which doesn't fit is stored as None: the issue's DateSpec and
+#   SerialSpec still hold what was actually read, so nothing is lost, and one odd value can't cost us the whole snapshot.
+def IntToField(i: Optional[int], none: int, low: int, high: int) -> int:
+    return none if i is None or i < low or i > high or i == none else i
+
+
+# ====================================================================================
+# Write the list of issues (and the series they point to) to a snapshot file
+def WriteSnapshot(filename: str, fanacIssueList: List[FanzineIssueInfo]) -> None:
+    Log("----Begin writing snapshot "+filename)
+    strings=StringTable()
+    seriesIndex: Dict[SeriesRecord, int]={}
+    seriesRecords=bytearray()
+    issueRecords=bytearray()
+
+    for fii in fanacIssueList:
+        rec=IssueToRecord(fii)
+        series=noString
+        if rec.Series is not None:
+            series=seriesIndex.get(rec.Series)
+            if series is None:
+                series=len(seriesIndex)
+                seriesIndex[rec.Series]=series
+                s=rec.Series
+                seriesRecords+=seriesStruct.pack(strings.Ref(s.SeriesName), strings.Ref(s.DirURL), strings.Ref(s.Editor), strings.Ref(s.Country))
+
+        issueRecords+=issueStruct.pack(series, strings.Ref(rec.SeriesName), strings.Ref(rec.IssueName), strings.Ref(rec.DirURL),
+                                       strings.Ref(rec.PageName), strings.Ref(rec.Country), strings.Ref(rec.MonthText),
+                                       strings.Ref(rec.DateSpec), strings.Ref(rec.SerialSpec), IntToField(rec.Pagecount, 0, 0, 2**31-1),
+                                       IntToField(rec.Year, 0, 0, 0xFFFF), IntToField(rec.Month, 0, 0, 0xFF), IntToField(rec.Day, 0, 0, 0xFF),
+                                       IntToField(rec.Vol, noInt, noInt, 2**31-1), IntToField(rec.Num, noInt, noInt, 2**31-1),
+                                       IntToField(rec.Whole, noInt, noInt, 2**31-1),
+                                       flagNewszine if rec.Newszine else 0)
+
+    stringIndex, stringBlob=strings.Pack()
+    offStringIndex=headerStruct.size
+    offSeries=offStringIndex+len(stringIndex)+len(stringBlob)
+    offIssues=offSeries+len(seriesRecords)
+    header=headerStruct.pack(snapshotMagic, snapshotVersion, 0, len(strings), len(seriesIndex), len(fanacIssueList), offStringIndex, offSeries, offIssues)
+
+    # Write to a temporary file and then move it into place so that a failure never leaves a half-written snapshot behind
+    temp=filename+".tmp"
+    with open(temp, "wb") as f:
+        f.write(header)
+        f.write(stringIndex)
+        f.write(stringBlob)
+        f.write(seriesRecords)
+        f.write(issueRecords)
+    os.replace(temp, filename)
+    Log("----Done writing snapshot: "+str(len(fanacIssueList))+" issues, "+str(len(seriesIndex))+" series, "+str(len(strings))+" strings")
+
+
+# ====================================================================================
+# Read-only, memory-mapped access to a snapshot file
+class Snapshot:
+    def __init__(self, filename: str):
+        self._file=open(filename, "rb")
+        self._map=mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.nStrings, self.nSeries, self.nIssues, self._offStringIndex, self._offSeries, self._offIssues=headerStruct.unpack_from(self._map, 0)
+        if magic != snapshotMagic:
+            self.Close()
+            raise ValueError("Snapshot: "+filename+" is not a snapshot file")
+        if version != snapshotVersion:
+            self.Close()
+            raise ValueError("Snapshot: "+filename+" is version "+str(version)+"; only version "+str(snapshotVersion)+" can be read")
+        self._offBlob=self._offStringIndex+4*(self.nStrings+1)
+        self._strings: Dict[int, str]={}
+        self._series: Dict[int, SeriesRecord]={}
+
+    def Close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+    def String(self, i: int) -> Optional[str]:
+        if i == noString:
+            return None
+        s=self._strings.get(i)
+        if s is None:
+            start, end=struct.unpack_from("<II", self._map, self._offStringIndex+4*i)
+            s=self._map[self._offBlob+start:self._offBlob+end].decode("utf-8")
+            self._strings[i]=s
+        return s
+
+    def Series(self, i: int) -> Optional[SeriesRecord]:
+        if i == noString:
+            return None
+        rec=self._series.get(i)
+        if rec is None:
+            name, dirURL, editor, country=seriesStruct.unpack_from(self._map, self._offSeries+i*seriesStruct.size)
+            rec=SeriesRecord(SeriesName=self.String(name), DirURL=self.String(dirURL), Editor=self.String(editor), Country=self.String(country))
+            self._series[i]=rec
+        return rec
+
+    def Issue(self, i: int) -> IssueRecord:
+        (series, seriesName, issueName, dirURL, pageName, country, monthText, dateSpec, serialSpec, pagecount,
+         year, month, day, vol, num, whole, flags)=issueStruct.unpack_from(self._map, self._offIssues+i*issueStruct.size)
+        return IssueRecord(SeriesName=self.String(seriesName), IssueName=self.String(issueName), DirURL=self.String(dirURL),
+                           PageName=self.String(pageName), Pagecount=pagecount, Country=self.String(country),
+                           Year=year if year != 0 else None, Month=month if month != 0 else None, Day=day if day != 0 else None,
+                           MonthText=self.String(monthText),
+                           Vol=vol if vol != noInt else None, Num=num if num != noInt else None, Whole=whole if whole != noInt else None,
+                           Newszine=(flags & flagNewszine) != 0, Series=self.Series(series),
+                           DateSpec=self.String(dateSpec), SerialSpec=self.String(serialSpec))
+
+    def Issues(self):
+        for i in range(self.nIssues):
+            yield self.Issue(i)
+
+
+# ====================================================================================
+# Read a snapshot back into a list of FanzineIssueInfo
+def ReadSnapshot(filename: str) -> List[FanzineIssueInfo]:
+    Log("----Begin reading snapshot "+filename)
+    seriesCache={}
+    with Snapshot(filename) as snap:
+        fanacIssueList=[RecordToIssue(rec, seriesCache) for rec in snap.Issues()]
+    Log("----Done reading snapshot: "+str(len(fanacIssueList))+" issues")
+    return fanacIssueList
@@ -0,0 +1,210 @@
+from typing import List, Dict, Optional, Tuple
+from collections import namedtuple
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import urllib.parse
+import mimetypes
+import threading
+import random
+import time
+import html
+import os
+
+# ====================================================================================
+# A local stand-in for www.fanac.org, for exercising the crawler without the live site
+# It serves a tree of files laid out the way the site is (fanzines/Classic_Fanzines.html, fanzines/<dir>/index.html, ...),
+#   either a recorded copy of the site (e.g., made with wget --mirror) or a synthetic tree made by BuildSyntheticSite().
+# A fault profile makes it misbehave the ways a real server does: slow responses, narrow bandwidth, errors, responses which
+#   never come, and slow-loris responses which dribble out a few bytes at a time.
+# Every request is recorded, so the harness (FanacLoadTest.py) can report on how the crawl coped.
+
+# The fault profile
+#   Latency, Jitter         Seconds before the response starts: Latency plus a uniform random amount up to Jitter
+#   Bandwidth               Bytes per second the body is sent at (0 means unlimited)
+#   ErrorRate               Fraction of requests answered with a 500 or 503
+#   TimeoutRate             Fraction of requests which get no response for TimeoutSeconds
+#   SlowLorisRate           Fraction of requests whose body is dribbled out over SlowLorisSeconds
+FaultProfile=namedtuple("FaultProfile", "Latency Jitter Bandwidth ErrorRate TimeoutRate TimeoutSeconds SlowLorisRate SlowLorisSeconds")
+
+faultProfiles: Dict[str, FaultProfile]={
+    "clean":        FaultProfile(0.0,  0.0,  0,       0.0,  0.0,  0.0,  0.0,  0.0),
+    "latency":      FaultProfile(0.2,  0.3,  0,       0.0,  0.0,  0.0,  0.0,  0.0),
+    "narrow":       FaultProfile(0.05, 0.05, 20000,   0.0,  0.0,  0.0,  0.0,  0.0),
+    "flaky":        FaultProfile(0.05, 0.05, 0,       0.1,  0.0,  0.0,  0.0,  0.0),
+    "timeouts":     FaultProfile(0.05, 0.05, 0,       0.0,  0.05, 5.0,  0.0,  0.0),
+    "slowloris":    FaultProfile(0.05, 0.05, 0,       0.0,  0.0,  0.0,  0.05, 10.0),
+    "hostile":      FaultProfile(0.3,  0.5,  50000,   0.05, 0.03, 5.0,  0.03, 10.0),
+}
+
+# One request served: the path, the status sent, the seconds from receiving the request until the response was done,
+#   the fault injected ("" if none), the body bytes sent, and whether the client went away before the response was complete
+RequestRecord=namedtuple("RequestRecord", "Path Status Seconds Fault Bytes Aborted")
+
+
+# ====================================================================================
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version="HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass    # The requests are recorded by the server instead
+
+    def do_GET(self):
+        server: StandInServer=self.server
+        start=time.monotonic()
+        fault=server.PickFault()
+        status=200
+        sent=0
+        aborted=False
+        try:
+            profile=server.Profile
+            delay=profile.Latency+server.Uniform(profile.Jitter)
+            if fault == "timeout":
+                delay+=profile.TimeoutSeconds
+            if delay > 0:
+                time.sleep(delay)
+
+            if fault == "error":
+                status=server.Choice([500, 503])
+                self.SendBody(status, b"<html><body>Server error</body></html>", "text/html", 0, 0)
+                return
+
+            body, contentType=server.Read(self.path)
+            if body is None:
+                status=404
+                self.SendBody(status, b"<html><body>Not found</body></html>", "text/html", 0, 0)
+                return
+            sent=self.SendBody(status, body, contentType, profile.Bandwidth, profile.SlowLorisSeconds if fault == "slowloris" else 0)
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            aborted=True
+            self.close_connection=True
+        finally:
+            server.RecordRequest(RequestRecord(self.path, status, time.monotonic()-start, fault, sent, aborted))
+
+    # Send the response, throttled to bandwidth bytes/second or, for a slow loris, spread over dribbleSeconds
+    # Returns the number of body bytes sent
+    def SendBody(self, status: int, body: bytes, contentType: str, bandwidth: int, dribbleSeconds: float) -> int:
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if dribbleSeconds > 0:
+            pieces=max(1, int(dribbleSeconds/0.5))
+            chunk, interval=max(1, len(body)//pieces+1), 0.5
+        elif bandwidth > 0:
+            chunk, interval=max(1, bandwidth//10), 0.1
+        else:
+            chunk, interval=len(body), 0
+        sent=0
+        while sent < len(body):
+            self.wfile.write(body[sent:sent+chunk])
+            self.wfile.flush()
+            sent+=len(body[sent:sent+chunk])
+            if interval > 0 and sent < len(body):
+                time.sleep(interval)
+        return sent
+
+
+# ====================================================================================
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads=True
+
+    def __init__(self, root: str, profile: FaultProfile, port: int=0, seed: int=1):
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        self.Root=os.path.abspath(root)
+        self.Profile=profile
+        self._random=random.Random(seed)
+        self._lock=threading.Lock()
+        self._thread: Optional[threading.Thread]=None
+        self.Requests: List[RequestRecord]=[]
+
+    @property
+    def URL(self) -> str:
+        return "http://127.0.0.1:"+str(self.server_address[1])
+
+    def Start(self) -> None:
+        self._thread=threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def Stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    # -------------------------------------------------------------------------
+    # The random choices are all made under the lock so that a given seed gives a repeatable run
+    def Uniform(self, limit: float) -> float:
+        with self._lock:
+            return self._random.uniform(0, limit) if limit > 0 else 0.0
+
+    def Choice(self, choices: List):
+        with self._lock:
+            return self._random.choice(choices)
+
+    def PickFault(self) -> str:
+        with self._lock:
+            r=self._random.random()
+        p=self.Profile
+        for fault, rate in (("error", p.ErrorRate), ("timeout", p.TimeoutRate), ("slowloris", p.SlowLorisRate)):
+            if r < rate:
+                return fault
+            r-=rate
+        return ""
+
+    def RecordRequest(self, rec: RequestRecord) -> None:
+        with self._lock:
+            self.Requests.append(rec)
+
+    # -------------------------------------------------------------------------
+    # Map a request path to a file in the tree and return its contents and content type, or (None, "") if there's no such file
+    # A directory (with or without the trailing "/") gets its index.html
+    def Read(self, path: str) -> Tuple[Optional[bytes], str]:
+        path=urllib.parse.unquote(urllib.parse.urlsplit(path).path)
+        filename=os.path.normpath(os.path.join(self.Root, path.lstrip("/")))
+        if filename != self.Root and not filename.startswith(self.Root+os.sep):
+            return None, ""
+        if os.path.isdir(filename):
+            filename=os.path.join(filename, "index.html")
+        if not os.path.isfile(filename):
+            return None, ""
+        with open(filename, "rb") as f:
+            body=f.read()
+        contentType=mimetypes.guess_type(filename)[0]
+        return body, contentType if contentType is not None else "application/octet-stream"
+
+
+# ====================================================================================
+# Build a synthetic fanac.org tree of seriesCount series of issuesPerSeries issues each in root
+# The pages follow the layouts the readers expect: a sortable table of series on the Classic page and an index table
+#   on each series' page.  Returns the total number of issues.
+monthNames=["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+
+def BuildSyntheticSite(root: str, seriesCount: int=200, issuesPerSeries: int=25, seed: int=1) -> int:
+    rnd=random.Random(seed)
+    fanzinesDir=os.path.join(root, "fanzines")
+    os.makedirs(fanzinesDir, exist_ok=True)
+
+    rows=[]
+    for i in range(seriesCount):
+        dirname="Synthetic_"+str(i+1).zfill(4)
+        title="Synthetic Fanzine "+str(i+1)
+        editor="Editor "+str(rnd.randint(1, seriesCount//3+1))
+        rows.append('<tr><td>'+str(i+1)+'</td><td><a href="'+dirname+'/"><b>'+html.escape(title)+'</b></a></td><td>'+editor+'</td></tr>')
+
+        year=rnd.randint(1930, 2010)
+        issueRows=[]
+        for j in range(issuesPerSeries):
+            month=(j % 12)+1
+            issueRows.append('<tr><td><a href="'+dirname+'-'+str(j+1).zfill(3)+'.pdf">'+html.escape(title)+' #'+str(j+1)+'</a></td>'
+                             '<td>'+str(year+j//12)+'</td><td>'+monthNames[month-1]+'</td><td>'+str(rnd.randint(4, 60))+'</td></tr>')
+        page=("<html><head><title>"+html.escape(title)+"</title></head><body>\n"
+              "<h1>"+html.escape(title)+"</h1>\n"
+              "<h2>"+editor+"<br>"+str(year)+"-"+str(year+(issuesPerSeries-1)//12)+"</h2>\n"
+              '<table border="1" cellpadding="5">\n<tr>\n<th>Issue</th>\n<th>Year</th>\n<th>Month</th>\n<th>Pages</th>\n</tr>\n'+
+              "\n".join(issueRows)+"\n</table>\n</body></html>\n")
+        os.makedirs(os.path.join(fanzinesDir, dirname), exist_ok=True)
+        with open(os.path.join(fanzinesDir, dirname, "index.html"), "w") as f:
+            f.write(page)
+
+    for name, tableRows in (("Classic_Fanzines.html", rows), ("Unusual_Items.html", [])):
+        with open(os.path.join(fanzinesDir, name), "w") as f:
+            f.write('<html><body>\n<table class="sortable">\n<tr><th>#</th><th>Title</th><th>Editor</th></tr>\n'+
+                    "\n".join(tableRows)+"\n</table>\n</body></html>\n")
+    return seriesCount*issuesPerSeries